@@ -2,20 +2,20 @@
 Admin configuration for audit app
 """
 from django.contrib import admin
+from apps.core.changelist import LargeTableAdminMixin, RecentDateFieldListFilter
+from apps.core.replicas import ReplicaChangeListMixin
 from .models import AuditLog, SecurityEvent
 
 
 @admin.register(AuditLog)
-class AuditLogAdmin(admin.ModelAdmin):
+class AuditLogAdmin(ReplicaChangeListMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'user', 'action', 'resource_type', 'resource_name',
         'severity', 'success', 'created_at'
     )
-    list_filter = ('action', 'resource_type', 'severity', 'success', 'created_at')
-    search_fields = (
-        'user__email', 'resource_name', 'description',
-        'ip_address', 'endpoint'
-    )
+    list_select_related = ('user',)
+    list_filter = (('created_at', RecentDateFieldListFilter), 'action', 'resource_type', 'severity', 'success')
+    search_fields = ('user__email', 'ip_address')
     readonly_fields = (
         'id', 'user', 'action', 'resource_type', 'resource_id',
         'resource_name', 'description', 'severity', 'ip_address',
@@ -56,16 +56,14 @@ class AuditLogAdmin(admin.ModelAdmin):
 
 
 @admin.register(SecurityEvent)
-class SecurityEventAdmin(admin.ModelAdmin):
+class SecurityEventAdmin(ReplicaChangeListMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'event_type', 'severity', 'user', 'ip_address',
         'is_resolved', 'created_at'
     )
-    list_filter = ('event_type', 'severity', 'is_resolved', 'created_at')
-    search_fields = (
-        'user__email', 'ip_address', 'description',
-        'endpoint', 'action_taken'
-    )
+    list_select_related = ('user',)
+    list_filter = (('created_at', RecentDateFieldListFilter), 'event_type', 'severity', 'is_resolved')
+    search_fields = ('user__email', 'ip_address')
     readonly_fields = (
         'id', 'event_type', 'severity', 'user', 'ip_address',
         'user_agent', 'endpoint', 'description',
@@ -90,7 +88,7 @@ class SecurityEventAdmin(admin.ModelAdmin):
         }),
     )
 
-    actions = ['mark_resolved']
+    actions = ['mark_resolved', 'unblock_ips']
 
     def mark_resolved(self, request, queryset):
         """Mark security events as resolved"""
@@ -103,6 +101,16 @@ class SecurityEventAdmin(admin.ModelAdmin):
 
     mark_resolved.short_description = 'Отметить как решенное'
 
+    def unblock_ips(self, request, queryset):
+        """Lift automatic blocks of the events' IP addresses"""
+        from .detection import detector
+        ip_addresses = set(queryset.values_list('ip_address', flat=True))
+        for ip_address in ip_addresses:
+            detector.unblock(ip_address)
+        self.message_user(request, f'{len(ip_addresses)} IP разблокировано')
+
+    unblock_ips.short_description = 'Разблокировать IP'
+
     def has_add_permission(self, request):
         return False
 
@@ -0,0 +1,250 @@
+"""
+Brute-force detection on failed logins, 2FA codes and scans
+
+Failures are counted in sliding windows of SECURITY_DETECTION_WINDOW
+seconds per client IP and per account, user or tag. A window is
+approximated from two fixed buckets (the current one plus the previous one
+weighted by how much of it still overlaps), kept in Redis and updated with
+one Lua script call. When a count reaches its rule's threshold, a single
+SecurityEvent is written for the incident; further failures in the same
+window only raise the count. Rules with block=True also block the client
+IP (apps.core.ip, X-Forwarded-For only as far as TRUSTED_PROXY_COUNT
+proxies wrote it) for SECURITY_BLOCK_SECONDS, enforced by SecurityBlockMiddleware before
+any other work is done for the request. Without Redis, counts and blocks
+are kept per process.
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from apps.core.ip import get_client_ip
+from apps.core.local_cache import LocalCache
+from apps.core.metrics import record_throttle_rejection
+from apps.core.redis import get_redis
+from .models import SecurityEvent
+
+logger = logging.getLogger(__name__)
+
+BLOCK_KEY = 'detect:block'
+
+# KEYS: current bucket, previous bucket, incident marker.
+# ARGV: window (s), weight of the previous bucket (per mille), threshold.
+# Returns {count, 1} when this failure opened an incident, else {count, 0}.
+_RECORD_SCRIPT = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 then
+  redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]) * 2)
+end
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local count = current + math.floor(previous * tonumber(ARGV[2]) / 1000)
+if count >= tonumber(ARGV[3]) and redis.call('SET', KEYS[3], '1', 'NX', 'EX', tonumber(ARGV[1])) then
+  return {count, 1}
+end
+return {count, 0}
+"""
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Threshold for failures of one kind per subject (ip, account, user or tag)"""
+
+    counter: str
+    subject: str
+    threshold_setting: str
+    event_type: str
+    severity: str
+    description: str
+    block: bool = False
+
+    @property
+    def threshold(self):
+        return getattr(settings, self.threshold_setting)
+
+
+RULES = (
+    Rule('login', 'account', 'SECURITY_FAILED_LOGIN_THRESHOLD', 'MULTIPLE_FAILED_LOGINS', 'WARNING',
+         'Неудачных входов в аккаунт'),
+    Rule('2fa', 'user', 'SECURITY_FAILED_LOGIN_THRESHOLD', 'MULTIPLE_FAILED_LOGINS', 'WARNING',
+         'Неверных кодов 2FA пользователя'),
+    # Logins and 2FA codes from one IP count together
+    Rule('auth', 'ip', 'SECURITY_BRUTE_FORCE_THRESHOLD', 'BRUTE_FORCE_ATTEMPT', 'DANGER',
+         'Неудачных входов и кодов 2FA с IP', block=True),
+    Rule('scan', 'tag', 'SECURITY_FAILED_SCAN_THRESHOLD', 'UNAUTHORIZED_ACCESS', 'WARNING',
+         'Неудачных сканирований метки'),
+    Rule('scan', 'ip', 'SECURITY_SCAN_BLOCK_THRESHOLD', 'SUSPICIOUS_IP', 'DANGER',
+         'Неудачных сканирований с IP', block=True),
+    Rule('throttled', 'ip', 'SECURITY_RATE_LIMIT_THRESHOLD', 'RATE_LIMIT_EXCEEDED', 'INFO',
+         'Ответов 429 для IP'),
+)
+
+_RULES = {(rule.counter, rule.subject): rule for rule in RULES}
+
+
+class _LocalWindows:
+    """Per-process counters and blocks used without Redis"""
+
+    def __init__(self, max_size=10000):
+        self.counts = LocalCache(max_size)
+        self.incidents = LocalCache(max_size)
+        self.blocks = LocalCache(max_size)
+
+    def record(self, keys, window, weight, threshold):
+        current_key, previous_key, incident_key = keys
+        # LocalCache locks per call; a lost increment under contention is acceptable here
+        current = (self.counts.get(current_key) or 0) + 1
+        self.counts.set(current_key, current, timeout=window * 2)
+        count = current + (self.counts.get(previous_key) or 0) * weight // 1000
+        if count >= threshold and self.incidents.get(incident_key) is None:
+            self.incidents.set(incident_key, 1, timeout=window)
+            return count, True
+        return count, False
+
+
+class Detector:
+    """Sliding-window failure counters, incident events and IP blocks"""
+
+    def __init__(self):
+        self._local = _LocalWindows()
+        # Block state read from Redis, reused for a moment to keep requests off Redis
+        self._seen = LocalCache(10000)
+
+    def record(self, request, counter, subjects, user=None):
+        """Count one failure of counter for each (subject, value) in subjects"""
+        ip_address = get_client_ip(request)
+        for subject, value in subjects.items():
+            rule = _RULES.get((counter, subject))
+            if rule is None or value in (None, ''):
+                continue
+            try:
+                count, opened = self._count(rule, str(value))
+            except Exception:
+                logger.exception('Failure detection failed for %s/%s', counter, subject)
+                continue
+            if opened:
+                self._open_incident(rule, str(value), count, request, ip_address, user)
+
+    def _count(self, rule, value):
+        window = settings.SECURITY_DETECTION_WINDOW
+        now = time.time()
+        bucket = int(now // window)
+        # Share of the previous bucket that still lies inside the sliding window
+        weight = int((1 - (now % window) / window) * 1000)
+        prefix = f'detect:{rule.counter}:{rule.subject}:{value}'
+        keys = [f'{prefix}:{bucket}', f'{prefix}:{bucket - 1}', f'{prefix}:incident']
+
+        client = get_redis()
+        if client is not None:
+            try:
+                count, opened = client.register_script(_RECORD_SCRIPT)(
+                    keys=keys, args=[window, weight, rule.threshold]
+                )
+                return int(count), bool(opened)
+            except Exception as e:
+                logger.warning('Failure counter unavailable, counting locally: %s', e)
+        return self._local.record(keys, window, weight, rule.threshold)
+
+    def _open_incident(self, rule, value, count, request, ip_address, user):
+        window = settings.SECURITY_DETECTION_WINDOW
+        action_taken = ''
+        if rule.block and settings.SECURITY_AUTO_BLOCK:
+            self.block(value, settings.SECURITY_BLOCK_SECONDS)
+            action_taken = f'IP заблокирован на {settings.SECURITY_BLOCK_SECONDS} с'
+        try:
+            SecurityEvent.objects.create(
+                event_type=rule.event_type,
+                severity=rule.severity,
+                user=user,
+                ip_address=ip_address,
+                user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
+                endpoint=request.path[:255],
+                description=f'{rule.description}: {count} за {window} с',
+                additional_data={
+                    'rule': f'{rule.counter}/{rule.subject}',
+                    rule.subject: value,
+                    'count': count,
+                    'threshold': rule.threshold,
+                    'window_seconds': window,
+                },
+                action_taken=action_taken
+            )
+        except Exception:
+            logger.exception('Could not record security event for %s/%s', rule.counter, rule.subject)
+
+    def block(self, ip_address, seconds):
+        until = int(time.time()) + seconds
+        client = get_redis()
+        if client is not None:
+            try:
+                client.set(f'{BLOCK_KEY}:{ip_address}', until, ex=seconds)
+            except Exception as e:
+                logger.warning('Could not store IP block: %s', e)
+        self._local.blocks.set(ip_address, until, timeout=seconds)
+        self._seen.set(ip_address, until, timeout=seconds)
+
+    def blocked_until(self, ip_address):
+        """Unix time the IP is blocked until, or None"""
+        until = self._seen.get(ip_address)
+        if until is None:
+            until = self._local.blocks.get(ip_address) or 0
+            client = get_redis()
+            if client is not None:
+                try:
+                    until = int(client.get(f'{BLOCK_KEY}:{ip_address}') or 0)
+                except Exception as e:
+                    logger.warning('Could not read IP block: %s', e)
+            self._seen.set(ip_address, until, timeout=settings.SECURITY_BLOCK_LOCAL_TIMEOUT)
+        return until if until > time.time() else None
+
+    def unblock(self, ip_address):
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(f'{BLOCK_KEY}:{ip_address}')
+            except Exception as e:
+                logger.warning('Could not remove IP block: %s', e)
+        self._local.blocks.delete(ip_address)
+        self._seen.delete(ip_address)
+
+
+detector = Detector()
+
+
+def record_failed_login(request, email):
+    detector.record(request, 'login', {'account': (email or '').strip().lower()})
+    detector.record(request, 'auth', {'ip': get_client_ip(request)})
+
+
+def record_failed_2fa(request, user_id, user=None):
+    detector.record(request, '2fa', {'user': user_id}, user=user)
+    detector.record(request, 'auth', {'ip': get_client_ip(request)})
+
+
+def record_failed_scan(request, tag=None):
+    """tag: tag_uid or tag id the scan was for, if known"""
+    detector.record(request, 'scan', {'tag': tag, 'ip': get_client_ip(request)})
+
+
+class SecurityBlockMiddleware(MiddlewareMixin):
+    """Refuses blocked client IPs up front and counts 429 responses per IP"""
+
+    def process_request(self, request):
+        until = detector.blocked_until(get_client_ip(request))
+        if until is None:
+            return None
+        request.security_blocked = True
+        record_throttle_rejection('security_block')
+        response = JsonResponse(
+            {'error': 'Слишком много неудачных попыток. Доступ временно ограничен'},
+            status=429
+        )
+        response['Retry-After'] = '%d' % max(1, until - time.time())
+        return response
+
+    def process_response(self, request, response):
+        if response.status_code == 429 and not getattr(request, 'security_blocked', False):
+            detector.record(request, 'throttled', {'ip': get_client_ip(request)})
+        return response
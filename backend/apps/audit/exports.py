@@ -0,0 +1,322 @@
+"""
+Streaming CSV/XLSX exports of log tables
+
+Export views reuse the filtering of the matching list view and read rows
+with values_list().iterator(), i.e. a server-side cursor on PostgreSQL, or
+in keyset-ordered chunks when server-side cursors are disabled for PgBouncer.
+CSV is streamed as it is produced; XLSX is written by openpyxl in
+write-only mode to a temporary file. XLSX exports over
+EXPORT_XLSX_SYNC_MAX_ROWS rows, and any export requested with
+background=true, run as a Celery job whose file is kept under EXPORT_ROOT
+(outside MEDIA_ROOT, never served by nginx) and fetched from
+/api/audit/exports/<job id>/. Cell values are cleaned of characters XLSX
+cannot hold and quoted when a spreadsheet would read them as a formula.
+"""
+import csv
+import json
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connections
+from django.db.models import Q
+from django.http import FileResponse, QueryDict, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.module_loading import import_string
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+
+FORMATS = ('csv', 'xlsx')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Characters a spreadsheet takes as the start of a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def export_storage():
+    """Private storage of background export files; only ExportJobView hands them out"""
+    return FileSystemStorage(location=settings.EXPORT_ROOT, base_url=None)
+
+
+def _job_key(job_id):
+    return f'audit:export_job:{job_id}'
+
+
+def _cell(value):
+    """Plain value for a CSV or XLSX cell"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (uuid.UUID, Decimal, date)):
+        return str(value)
+    if isinstance(value, str):
+        return _text_cell(value)
+    return value
+
+
+def _text_cell(value):
+    # User agents and request bodies are client input: openpyxl refuses control
+    # characters, and a leading =, +, - or @ would be evaluated as a formula
+    value = ILLEGAL_CHARACTERS_RE.sub('', value)
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() returns what it was given"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(headers, rows):
+    """CSV lines for the header row and every data row; BOM first for Excel"""
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def write_xlsx(headers, rows, fileobj, title='Export'):
+    """Write an XLSX workbook to fileobj without holding the rows in memory"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(headers)
+    count = 0
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+        count += 1
+    workbook.save(fileobj)
+    return count
+
+
+def _parse_bound(value, end=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        moment = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class _JobRequest:
+    """The parts of a request that export querysets read, rebuilt in a worker"""
+
+    def __init__(self, user, query_string):
+        self.user = user
+        self.query_params = QueryDict(query_string)
+
+
+class ExportMixin:
+    """
+    Export view on top of a list view
+
+    GET ?output=csv|xlsx, optional date_from/date_to (dates or datetimes)
+    bounding export_ordering_field, plus the list view's own filters.
+    """
+
+    export_name = None
+    export_columns = ()
+    export_ordering_field = 'created_at'
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'csv')
+        if output not in FORMATS:
+            raise ValidationError({'output': f'Допустимые значения: {", ".join(FORMATS)}'})
+
+        queryset = self.get_export_queryset()
+        background = request.query_params.get('background', '').lower() == 'true'
+        if output == 'xlsx' and not background:
+            background = queryset.count() > settings.EXPORT_XLSX_SYNC_MAX_ROWS
+
+        if background:
+            job = start_export_job(self, output)
+            return Response(job, status=status.HTTP_202_ACCEPTED)
+
+        filename = f'{self.export_name}-{timezone.localtime():%Y%m%d-%H%M%S}.{output}'
+        headers = [header for header, _ in self.export_columns]
+        rows = self.export_rows(queryset)
+
+        if output == 'csv':
+            response = StreamingHttpResponse(stream_csv(headers, rows), content_type=CONTENT_TYPES['csv'])
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        fileobj = tempfile.TemporaryFile()
+        write_xlsx(headers, rows, fileobj, title=self.export_name)
+        fileobj.seek(0)
+        return FileResponse(fileobj, as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+
+    def get_export_queryset(self):
+        queryset = self.get_queryset()
+        if hasattr(self, 'get_read_alias'):
+            # List views served from a replica export from one too
+            queryset = queryset.using(self.get_read_alias())
+        field = self.export_ordering_field
+
+        for param, lookup, end in (('date_from', 'gte', False), ('date_to', 'lte', True)):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            bound = _parse_bound(value, end=end)
+            if bound is None:
+                raise ValidationError({param: 'Неверный формат даты'})
+            queryset = queryset.filter(**{f'{field}__{lookup}': bound})
+
+        return queryset.order_by(field, 'id')
+
+    def export_rows(self, queryset):
+        lookups = [lookup for _, lookup in self.export_columns]
+        if connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+            return _keyset_rows(queryset, lookups, self.export_ordering_field, settings.EXPORT_CHUNK_SIZE)
+        return queryset.values_list(*lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def _keyset_rows(queryset, lookups, field, chunk_size):
+    """
+    Rows in (field, id) order, fetched chunk by chunk with keyset conditions
+
+    Used when server-side cursors are disabled (PgBouncer transaction
+    pooling): iterator() would then load the whole result at once.
+    """
+    rows = queryset.order_by(field, 'id').values_list(*lookups, field, 'id')
+    last = None
+    while True:
+        batch = rows
+        if last is not None:
+            batch = rows.filter(Q(**{f'{field}__gt': last[0]}) | Q(**{field: last[0], 'id__gt': last[1]}))
+        batch = list(batch[:chunk_size])
+        for row in batch:
+            yield row[:-2]
+        if len(batch) < chunk_size:
+            return
+        last = batch[-1][-2:]
+
+
+def start_export_job(view, output):
+    """Queue an export of the view's current request and return its job record"""
+    from .tasks import run_export
+
+    job_id = str(uuid.uuid4())
+    job = {
+        'id': job_id,
+        'status': 'PENDING',
+        'output': output,
+        'view': f'{type(view).__module__}.{type(view).__qualname__}',
+        'user_id': str(view.request.user.id),
+        'query': view.request.query_params.urlencode(),
+        'filename': f'{view.export_name}-{timezone.localtime():%Y%m%d-%H%M%S}.{output}',
+    }
+    cache.set(_job_key(job_id), job, timeout=settings.EXPORT_JOB_TTL)
+    run_export.delay(job_id)
+    return _public(job)
+
+
+def get_export_job(job_id, user):
+    """Job record if it exists and belongs to user, else None"""
+    job = cache.get(_job_key(job_id))
+    if job is None or job['user_id'] != str(user.id):
+        return None
+    return job
+
+
+def _public(job):
+    data = {'id': job['id'], 'status': job['status'], 'output': job['output'], 'filename': job['filename']}
+    if job['status'] == 'READY':
+        data['rows'] = job['rows']
+        data['url'] = reverse('audit:export-job', args=[job['id']]) + '?download=true'
+    if job['status'] == 'FAILED':
+        data['error'] = job.get('error', '')
+    return data
+
+
+def export_job_response(job, download=False):
+    """Status of a job, or its file once ready and download is requested"""
+    if download and job['status'] == 'READY':
+        return FileResponse(
+            export_storage().open(job['path'], 'rb'),
+            as_attachment=True,
+            filename=job['filename'],
+            content_type=CONTENT_TYPES[job['output']]
+        )
+    return Response(_public(job))
+
+
+def build_export(job_id):
+    """Run a queued export job and store its file"""
+    job = cache.get(_job_key(job_id))
+    if job is None or job['status'] != 'PENDING':
+        return
+
+    job['status'] = 'RUNNING'
+    cache.set(_job_key(job_id), job, timeout=settings.EXPORT_JOB_TTL)
+
+    try:
+        user = get_user_model().objects.get(id=job['user_id'])
+        view = import_string(job['view'])()
+        view.request = _JobRequest(user, job['query'])
+        view.args, view.kwargs = (), {}
+        # Permissions may have changed since the job was queued
+        if not all(permission.has_permission(view.request, view) for permission in view.get_permissions()):
+            raise PermissionDenied()
+
+        queryset = view.get_export_queryset()
+        headers = [header for header, _ in view.export_columns]
+        rows = view.export_rows(queryset)
+
+        with tempfile.TemporaryFile() as fileobj:
+            if job['output'] == 'csv':
+                count = 0
+                for line in stream_csv(headers, rows):
+                    fileobj.write(line.encode('utf-8'))
+                    count += 1
+                count -= 1
+            else:
+                count = write_xlsx(headers, rows, fileobj, title=view.export_name)
+            fileobj.seek(0)
+            path = export_storage().save(f'{job_id}.{job["output"]}', File(fileobj))
+    except Exception as e:
+        job.update(status='FAILED', error=str(e))
+        cache.set(_job_key(job_id), job, timeout=settings.EXPORT_JOB_TTL)
+        raise
+
+    job.update(status='READY', path=path, rows=count)
+    cache.set(_job_key(job_id), job, timeout=settings.EXPORT_JOB_TTL)
+
+
+def purge_exports(max_age):
+    """Delete export files older than max_age seconds; returns how many"""
+    storage = export_storage()
+    if not storage.exists(''):
+        return 0
+
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    removed = 0
+    for name in storage.listdir('')[1]:
+        if storage.get_modified_time(name) < cutoff:
+            storage.delete(name)
+            removed += 1
+    return removed
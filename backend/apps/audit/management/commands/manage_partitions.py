@@ -0,0 +1,49 @@
+"""
+Pre-create future log partitions and detach expired ones
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.audit.partitioning import PARTITIONED_TABLES, ensure_partitions, detach_partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly partitions and detach partitions past retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=settings.LOG_PARTITION_MONTHS_AHEAD,
+            help='How many future months to pre-create'
+        )
+        parser.add_argument(
+            '--retain-months',
+            type=int,
+            default=settings.LOG_PARTITION_RETENTION_MONTHS,
+            help='Detach partitions older than this many months (0 keeps everything)'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop detached partitions instead of keeping them as archive tables'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Partitioning requires PostgreSQL, nothing to do'))
+            return
+
+        for table in PARTITIONED_TABLES:
+            created = ensure_partitions(table, options['months_ahead'])
+            for name in created:
+                self.stdout.write(f'Created {name}')
+
+            if options['retain_months']:
+                detached = detach_partitions(table, options['retain_months'], drop=options['drop'])
+                for name in detached:
+                    action = 'Dropped' if options['drop'] else 'Archived'
+                    self.stdout.write(f'{action} {name}')
+
+        self.stdout.write(self.style.SUCCESS('Partitions are up to date'))
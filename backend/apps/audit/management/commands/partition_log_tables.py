@@ -0,0 +1,64 @@
+"""
+Convert the log tables to monthly range partitions
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.audit.partitioning import PARTITIONED_TABLES, convert_to_partitioned, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Copy audit_logs, security_events and nfc_access_logs into partitioned tables in batches and swap them in'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tables',
+            nargs='*',
+            help=f'Tables to convert (default: {", ".join(PARTITIONED_TABLES)})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows copied per transaction'
+        )
+        parser.add_argument(
+            '--catch-up-minutes',
+            type=int,
+            default=60,
+            help='Rows this much older than the start of the copy are checked again at the swap'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=settings.LOG_PARTITION_MONTHS_AHEAD,
+            help='How many future months to pre-create'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Partitioning requires PostgreSQL, nothing to do'))
+            return
+
+        tables = options['tables'] or list(PARTITIONED_TABLES)
+        unknown = set(tables) - set(PARTITIONED_TABLES)
+        if unknown:
+            raise CommandError(f'Unknown tables: {", ".join(sorted(unknown))}')
+
+        for table in tables:
+            if is_partitioned(table):
+                self.stdout.write(f'{table} is already partitioned')
+                continue
+            self.stdout.write(f'Converting {table}...')
+            copied = convert_to_partitioned(
+                table,
+                PARTITIONED_TABLES[table],
+                months_ahead=options['months_ahead'],
+                batch_size=options['batch_size'],
+                catch_up=timedelta(minutes=options['catch_up_minutes']),
+                progress=lambda count, table=table: self.stdout.write(f'  {table}: {count} rows copied')
+            )
+            self.stdout.write(self.style.SUCCESS(f'{table} converted, {copied} rows'))
@@ -1,9 +1,14 @@
 """
 Audit middleware for automatic logging
 """
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
-from .models import AuditLog
+from apps.core.ip import get_client_ip
+from .sinks import get_audit_sink
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class AuditLogMiddleware(MiddlewareMixin):
@@ -27,6 +32,11 @@ class AuditLogMiddleware(MiddlewareMixin):
         'secret_key', 'api_key'
     ]
 
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Note views that read their own upload (audit_request_body = False)"""
+        view = getattr(view_func, 'view_class', view_func)
+        request._audit_request_body = getattr(view, 'audit_request_body', True)
+
     def process_response(self, request, response):
         """Log the request after processing"""
 
@@ -48,11 +58,14 @@ class AuditLogMiddleware(MiddlewareMixin):
         }
         action = action_map.get(request.method, 'OTHER')
 
+        if action == 'READ' and not settings.AUDIT_LOG_READS:
+            return response
+
         # Get user
         user = request.user if request.user.is_authenticated else None
 
-        # Get request data (sanitized)
-        request_data = self._get_request_data(request)
+        # Get request data (sanitized); streamed uploads would be buffered whole by request.body
+        request_data = self._get_request_data(request) if getattr(request, '_audit_request_body', True) else {}
 
         # Determine resource type from path
         resource_type = self._determine_resource_type(request.path)
@@ -70,15 +83,16 @@ class AuditLogMiddleware(MiddlewareMixin):
         # Get error message if failed
         error_message = ''
         if not success:
-            try:
-                error_data = json.loads(response.content.decode('utf-8'))
-                error_message = str(error_data)
-            except:
+            # DRF responses still carry the parsed payload; don't re-parse the body
+            error_data = getattr(response, 'data', None)
+            if error_data is not None:
+                error_message = str(self._plain_errors(error_data))
+            else:
                 error_message = f'HTTP {response.status_code}'
 
-        # Create audit log entry (async would be better)
+        # Hand the entry to the audit sink (buffered by default)
         try:
-            AuditLog.objects.create(
+            get_audit_sink().emit(dict(
                 user=user,
                 action=action,
                 resource_type=resource_type,
@@ -91,10 +105,10 @@ class AuditLogMiddleware(MiddlewareMixin):
                 new_value=request_data if action in ['CREATE', 'UPDATE'] else None,
                 success=success,
                 error_message=error_message
-            )
-        except Exception as e:
+            ))
+        except Exception:
             # Don't break the request if audit logging fails
-            print(f"Audit logging failed: {e}")
+            logger.exception('Audit logging failed')
 
         return response
 
@@ -116,6 +130,16 @@ class AuditLogMiddleware(MiddlewareMixin):
             pass
         return {}
 
+    def _plain_errors(self, data):
+        """Convert DRF ErrorDetail values to plain strings"""
+        if isinstance(data, dict):
+            return {k: self._plain_errors(v) for k, v in data.items()}
+        if isinstance(data, list):
+            return [self._plain_errors(v) for v in data]
+        if isinstance(data, str):
+            return str(data)
+        return data
+
     def _sanitize_data(self, data):
         """Remove sensitive fields from data"""
         if isinstance(data, dict):
@@ -138,9 +162,4 @@ class AuditLogMiddleware(MiddlewareMixin):
 
     def _get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip
+        return get_client_ip(request)
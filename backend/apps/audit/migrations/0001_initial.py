@@ -0,0 +1,73 @@
+# Generated by Django 4.2.9 on 2026-10-18 01:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecurityEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('event_type', models.CharField(choices=[('FAILED_LOGIN', 'Неудачный вход'), ('MULTIPLE_FAILED_LOGINS', 'Множественные неудачные входы'), ('SUSPICIOUS_IP', 'Подозрительный IP'), ('RATE_LIMIT_EXCEEDED', 'Превышен лимит запросов'), ('INVALID_TOKEN', 'Невалидный токен'), ('UNAUTHORIZED_ACCESS', 'Несанкционированный доступ'), ('BRUTE_FORCE_ATTEMPT', 'Попытка брутфорса'), ('SQL_INJECTION_ATTEMPT', 'Попытка SQL инъекции'), ('XSS_ATTEMPT', 'Попытка XSS атаки'), ('OTHER', 'Другое')], max_length=50, verbose_name='Тип события')),
+                ('severity', models.CharField(choices=[('INFO', 'Информация'), ('WARNING', 'Предупреждение'), ('DANGER', 'Опасность'), ('CRITICAL', 'Критическое')], default='WARNING', max_length=20, verbose_name='Важность')),
+                ('ip_address', models.GenericIPAddressField(verbose_name='IP адрес')),
+                ('user_agent', models.CharField(blank=True, max_length=500, verbose_name='User Agent')),
+                ('endpoint', models.CharField(blank=True, max_length=255, verbose_name='Endpoint')),
+                ('description', models.TextField(verbose_name='Описание')),
+                ('additional_data', models.JSONField(blank=True, null=True, verbose_name='Дополнительные данные')),
+                ('action_taken', models.TextField(blank=True, verbose_name='Принятые меры')),
+                ('is_resolved', models.BooleanField(default=False, verbose_name='Решено')),
+                ('resolved_at', models.DateTimeField(blank=True, null=True, verbose_name='Время решения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Создано')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='security_events', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Событие безопасности',
+                'verbose_name_plural': 'События безопасности',
+                'db_table': 'security_events',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['event_type', '-created_at'], name='security_ev_event_t_33b3e5_idx'), models.Index(fields=['severity', '-created_at'], name='security_ev_severit_768a26_idx'), models.Index(fields=['ip_address', '-created_at'], name='security_ev_ip_addr_48a73a_idx'), models.Index(fields=['is_resolved', '-created_at'], name='security_ev_is_reso_abc463_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('CREATE', 'Создание'), ('UPDATE', 'Обновление'), ('DELETE', 'Удаление'), ('READ', 'Чтение'), ('LOGIN', 'Вход'), ('LOGOUT', 'Выход'), ('REGISTER', 'Регистрация'), ('PASSWORD_CHANGE', 'Смена пароля'), ('2FA_ENABLE', '2FA включен'), ('2FA_DISABLE', '2FA отключен'), ('NFC_REGISTER', 'Регистрация NFC метки'), ('NFC_SCAN', 'Сканирование NFC метки'), ('NFC_REVOKE', 'Отзыв NFC метки'), ('EMERGENCY_ACCESS', 'Экстренный доступ'), ('OTHER', 'Другое')], max_length=50, verbose_name='Действие')),
+                ('resource_type', models.CharField(choices=[('USER', 'Пользователь'), ('PROFILE', 'Профиль'), ('ALLERGY', 'Аллергия'), ('DISEASE', 'Заболевание'), ('MEDICATION', 'Медикамент'), ('CONTACT', 'Контакт'), ('NOTE', 'Заметка'), ('NFC_TAG', 'NFC метка'), ('SYSTEM', 'Система')], max_length=50, verbose_name='Тип ресурса')),
+                ('resource_id', models.CharField(blank=True, max_length=255, verbose_name='ID ресурса')),
+                ('resource_name', models.CharField(blank=True, max_length=255, verbose_name='Название ресурса')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('severity', models.CharField(choices=[('LOW', 'Низкий'), ('MEDIUM', 'Средний'), ('HIGH', 'Высокий'), ('CRITICAL', 'Критический')], default='LOW', max_length=20, verbose_name='Важность')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='IP адрес')),
+                ('user_agent', models.CharField(blank=True, max_length=500, verbose_name='User Agent')),
+                ('endpoint', models.CharField(blank=True, max_length=255, verbose_name='API Endpoint')),
+                ('method', models.CharField(blank=True, max_length=10, verbose_name='HTTP метод')),
+                ('old_value', models.JSONField(blank=True, null=True, verbose_name='Старое значение')),
+                ('new_value', models.JSONField(blank=True, null=True, verbose_name='Новое значение')),
+                ('success', models.BooleanField(default=True, verbose_name='Успешно')),
+                ('error_message', models.TextField(blank=True, verbose_name='Сообщение об ошибке')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Создан')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_logs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Лог аудита',
+                'verbose_name_plural': 'Логи аудита',
+                'db_table': 'audit_logs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='audit_logs_user_id_6193b2_idx'), models.Index(fields=['action', '-created_at'], name='audit_logs_action_bcaa71_idx'), models.Index(fields=['resource_type', '-created_at'], name='audit_logs_resourc_066d36_idx'), models.Index(fields=['severity', '-created_at'], name='audit_logs_severit_a4af98_idx'), models.Index(fields=['success', '-created_at'], name='audit_logs_success_54b53e_idx')],
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@ Audit models for NFC Medical Platform
 """
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 
@@ -91,7 +92,8 @@ class AuditLog(models.Model):
     success = models.BooleanField(default=True, verbose_name='Успешно')
     error_message = models.TextField(blank=True, verbose_name='Сообщение об ошибке')
 
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан', db_index=True)
+    # Set when the entry is emitted, not when the buffered sink inserts it
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Создан', db_index=True)
 
     class Meta:
         db_table = 'audit_logs'
@@ -0,0 +1,299 @@
+"""
+Monthly range partitioning for append-only log tables (PostgreSQL only)
+
+Partitions are named <table>_pYYYYMM and cover one calendar month (UTC).
+A <table>_default partition catches rows outside the pre-created range;
+when a partition is created for a month that already has rows there, they
+are moved into the new partition.
+Detached partitions are kept as standalone archive_<table>_pYYYYMM tables
+unless dropping is requested.
+"""
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import DatabaseError, transaction
+from django.db import connection as default_connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# table -> partition key
+PARTITIONED_TABLES = {
+    'audit_logs': 'created_at',
+    'security_events': 'created_at',
+    'nfc_access_logs': 'accessed_at',
+}
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def is_partitioned(table, connection=None):
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table pt '
+            'JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table, connection=None):
+    """Monthly partitions of a table as {month_start: partition_name}"""
+    connection = connection or default_connection
+    pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})(\d{{2}})$')
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)',
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            partitions[month] = name
+    return partitions
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def create_partition(table, month, connection=None):
+    """
+    Create the partition for month
+
+    PostgreSQL refuses a new partition while the default partition holds
+    rows in its range, so those rows are moved into it: the default
+    partition is detached, the partition created, the rows moved and the
+    default attached again, all in one transaction.
+    """
+    connection = connection or default_connection
+    qn = connection.ops.quote_name
+    name = partition_name(table, month)
+    bounds = [month, add_months(month, 1)]
+    default = default_partition_name(table)
+    column = PARTITIONED_TABLES.get(table)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if column is None or not _has_rows_in_range(cursor, qn, default, column, bounds):
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {qn(name)} '
+                f'PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)',
+                bounds
+            )
+            return
+
+        cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}')
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)',
+            bounds
+        )
+        cursor.execute(
+            f'WITH moved AS ('
+            f'  DELETE FROM {qn(default)} WHERE {qn(column)} >= %s AND {qn(column)} < %s RETURNING *'
+            f') INSERT INTO {qn(table)} SELECT * FROM moved',
+            bounds
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT')
+    logger.info('Partition %s created with %d rows moved from %s', name, moved, default)
+
+
+def _has_rows_in_range(cursor, qn, default, column, bounds):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [default])
+    if not cursor.fetchone()[0]:
+        return False
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE {qn(column)} >= %s AND {qn(column)} < %s)',
+        bounds
+    )
+    return cursor.fetchone()[0]
+
+
+def ensure_partitions(table, months_ahead, connection=None):
+    """Create partitions from the current month up to months_ahead; returns created names"""
+    connection = connection or default_connection
+    if not is_partitioned(table, connection):
+        return []
+
+    existing = list_partitions(table, connection)
+    current = month_start(timezone.now())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        try:
+            create_partition(table, month, connection)
+        except DatabaseError:
+            # Keep going: one blocked month must not stop the later ones
+            logger.exception(
+                'Could not create partition %s of %s for [%s, %s)',
+                partition_name(table, month), table, month.date(), add_months(month, 1).date()
+            )
+            continue
+        created.append(partition_name(table, month))
+    return created
+
+
+def detach_partitions(table, retain_months, drop=False, connection=None):
+    """Detach (and archive or drop) partitions older than retain_months; returns their names"""
+    connection = connection or default_connection
+    if not is_partitioned(table, connection):
+        return []
+
+    qn = connection.ops.quote_name
+    cutoff = add_months(month_start(timezone.now()), -retain_months)
+    detached = []
+
+    for month, name in sorted(list_partitions(table, connection).items()):
+        if month >= cutoff:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {qn(name)}')
+            else:
+                cursor.execute(f'ALTER TABLE {qn(name)} RENAME TO {qn("archive_" + name)}')
+        detached.append(name)
+        logger.info('Partition %s detached from %s', name, table)
+
+    return detached
+
+
+def convert_to_partitioned(table, column, months_ahead=3, batch_size=10000, catch_up=timedelta(hours=1),
+                           connection=None, progress=None):
+    """
+    Rebuild an existing table as a partitioned table, keeping its rows,
+    indexes and foreign keys. Returns the number of rows copied.
+
+    The rows are copied in batches into <table>_new, committing each one,
+    while the application keeps writing to the old table. Only the swap
+    locks the old table against writes: rows from the last catch_up before
+    the copy started that are still missing are copied, then the tables are
+    renamed and the old one dropped. Buffered log writers insert rows with
+    slightly older timestamps, hence the margin. The primary key becomes
+    (id, <column>) because PostgreSQL requires the partition key in every
+    unique constraint. progress(copied) is called after every batch.
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql' or is_partitioned(table, connection):
+        return 0
+
+    qn = connection.ops.quote_name
+    new = f'{table}_new'
+    started = timezone.now()
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT current_schema()')
+        schema = cursor.fetchone()[0]
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = %s '
+            'AND indexname NOT IN ('
+            '  SELECT conname FROM pg_constraint '
+            "  WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+            [table, table]
+        )
+        indexes = cursor.fetchall()
+
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f'SELECT min({qn(column)}) FROM {qn(table)}')
+        oldest = cursor.fetchone()[0] or started
+
+        # Left over from an interrupted run: start again
+        cursor.execute(f'DROP TABLE IF EXISTS {qn(new)}')
+        cursor.execute(
+            f'CREATE TABLE {qn(new)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({qn(column)})'
+        )
+        month = month_start(oldest)
+        last = add_months(month_start(started), months_ahead)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE {qn(partition_name(table, month))} '
+                f'PARTITION OF {qn(new)} FOR VALUES FROM (%s) TO (%s)',
+                [month, add_months(month, 1)]
+            )
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(new)} DEFAULT')
+        cursor.execute(f'ALTER TABLE {qn(new)} ADD CONSTRAINT {qn(new + "_pkey")} PRIMARY KEY ("id", {qn(column)})')
+
+    copied = 0
+    position = None
+    while True:
+        # Keyset over (column, id); every batch commits on its own
+        after = f'WHERE {qn(column)} >= %s AND ({qn(column)}, "id") > (%s, %s)' if position else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH batch AS ('
+                f'  SELECT * FROM {qn(table)} {after} ORDER BY {qn(column)}, "id" LIMIT %s'
+                f'), copied AS (INSERT INTO {qn(new)} SELECT * FROM batch) '
+                f'SELECT {qn(column)}, "id", count(*) OVER () FROM batch ORDER BY {qn(column)} DESC, "id" DESC LIMIT 1',
+                [*((position[0], *position) if position else ()), batch_size]
+            )
+            row = cursor.fetchone()
+        if row is None:
+            break
+        position = row[:2]
+        copied += row[2]
+        if progress:
+            progress(copied)
+
+    with connection.cursor() as cursor:
+        # The old indexes keep their names until the swap; build the new ones under temporary names
+        for name, definition in indexes:
+            cursor.execute(
+                definition.replace(f' INDEX {name} ON ', f' INDEX {qn(name[:59] + "_new")} ON ', 1)
+                .replace(f' ON {schema}.{table} USING ', f' ON {qn(schema)}.{qn(new)} USING ', 1)
+            )
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(new)} ADD CONSTRAINT {qn(name)} {definition}')
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Reads go on; writers wait for the commit and then reach the new table
+        cursor.execute(f'LOCK TABLE {qn(table)} IN EXCLUSIVE MODE')
+        cursor.execute(
+            f'INSERT INTO {qn(new)} SELECT * FROM {qn(table)} o WHERE o.{qn(column)} >= %s '
+            f'AND NOT EXISTS (SELECT 1 FROM {qn(new)} n WHERE n."id" = o."id" AND n.{qn(column)} = o.{qn(column)})',
+            [started - catch_up]
+        )
+        copied += cursor.rowcount
+        cursor.execute(f'DROP TABLE {qn(table)}')
+        cursor.execute(f'ALTER TABLE {qn(new)} RENAME TO {qn(table)}')
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME CONSTRAINT {qn(new + "_pkey")} TO {qn(table + "_pkey")}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {qn(name[:59] + "_new")} RENAME TO {qn(name)}')
+
+    logger.info('Table %s converted to monthly partitions with %d rows', table, copied)
+    return copied
@@ -19,7 +19,8 @@ class AuditLogSerializer(serializers.ModelSerializer):
             'old_value', 'new_value', 'success', 'error_message',
             'created_at'
         )
-        read_only_fields = '__all__'
+        read_only_fields = fields
+        select_related = ('user',)
 
 
 class SecurityEventSerializer(serializers.ModelSerializer):
@@ -35,4 +36,5 @@ class SecurityEventSerializer(serializers.ModelSerializer):
             'additional_data', 'action_taken', 'is_resolved',
             'resolved_at', 'created_at'
         )
-        read_only_fields = '__all__'
+        read_only_fields = fields
+        select_related = ('user',)
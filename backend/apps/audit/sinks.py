@@ -0,0 +1,62 @@
+"""
+Audit sinks for NFC Medical Platform
+
+The audit middleware hands every entry to the sink configured in
+settings.AUDIT_SINK instead of writing AuditLog rows itself.
+"""
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from apps.core.buffer import BatchWriter
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class BaseAuditSink:
+    """Receives audit entries as dicts of AuditLog field values"""
+
+    def emit(self, entry):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class DatabaseAuditSink(BaseAuditSink):
+    """Writes each entry synchronously on the request path"""
+
+    def emit(self, entry):
+        AuditLog.objects.create(**entry)
+
+
+class BufferedAuditSink(BaseAuditSink):
+    """Batches entries and writes them with bulk_create from a background thread"""
+
+    def __init__(self):
+        self.writer = BatchWriter(AuditLog, overflow=settings.AUDIT_SINK_OVERFLOW)
+
+    def emit(self, entry):
+        self.writer.add(AuditLog(**entry))
+
+    def flush(self):
+        self.writer.flush()
+
+    def stats(self):
+        return self.writer.stats()
+
+
+_sink = None
+
+
+def get_audit_sink():
+    """Configured audit sink, created once per process"""
+    global _sink
+    if _sink is None:
+        _sink = import_string(settings.AUDIT_SINK)()
+    return _sink
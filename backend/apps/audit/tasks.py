@@ -0,0 +1,26 @@
+"""
+Celery tasks for audit app
+"""
+from celery import shared_task
+from django.conf import settings
+from django.core.management import call_command
+
+from . import exports
+
+
+@shared_task(ignore_result=True)
+def manage_partitions():
+    """Pre-create next months' log partitions and detach expired ones"""
+    call_command('manage_partitions')
+
+
+@shared_task(ignore_result=True)
+def run_export(job_id):
+    """Build the file of a background export"""
+    exports.build_export(job_id)
+
+
+@shared_task(ignore_result=True)
+def purge_exports():
+    """Delete export files whose jobs have expired"""
+    exports.purge_exports(settings.EXPORT_JOB_TTL)
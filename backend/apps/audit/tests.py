@@ -0,0 +1,201 @@
+"""
+Tests for the audit list endpoints, exports, failure detection and partitioning
+"""
+import io
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from apps.core.testing import LOCMEM_CACHES, ConstantQueriesMixin
+from . import exports
+from .detection import SecurityBlockMiddleware, detector, record_failed_scan
+from .models import AuditLog, SecurityEvent
+from .partitioning import is_partitioned, list_partitions
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, AUDIT_LOG_READS=False)
+class ListQueryCountTests(ConstantQueriesMixin, TestCase):
+    """Queries of the audit list endpoints do not grow with the number of rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', password='pw', first_name='Анна', last_name='Смирнова',
+            role='ADMIN', is_staff=True
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.created = 0
+
+    def next_user(self):
+        self.created += 1
+        return User.objects.create_user(
+            email=f'user{self.created}@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+
+    def add_audit_logs(self, count, user=None):
+        for _ in range(count):
+            AuditLog.objects.create(
+                user=user or self.next_user(), action='UPDATE', resource_type='PROFILE',
+                description='Обновление профиля'
+            )
+
+    def test_audit_logs(self):
+        self.assertConstantQueries('/api/audit/logs/', self.add_audit_logs)
+
+    def test_security_events(self):
+        def add_rows(count):
+            for _ in range(count):
+                SecurityEvent.objects.create(
+                    user=self.next_user(), event_type='FAILED_LOGIN', severity='WARNING',
+                    ip_address='127.0.0.1', description='Неверный пароль'
+                )
+        self.assertConstantQueries('/api/audit/security-events/', add_rows)
+
+    def test_my_logs(self):
+        self.assertConstantQueries('/api/audit/my-logs/', lambda count: self.add_audit_logs(count, self.admin))
+
+
+HOSPITAL = '203.0.113.10'
+ATTACKER = '198.51.100.66'
+NGINX = '172.18.0.5'
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, TRUSTED_PROXY_COUNT=1, SECURITY_AUTO_BLOCK=True,
+    SECURITY_SCAN_BLOCK_THRESHOLD=3, SECURITY_FAILED_SCAN_THRESHOLD=100
+)
+class ScanBlockTests(TestCase):
+    """IP blocks land on the address nginx saw, not on one named in X-Forwarded-For"""
+
+    def tearDown(self):
+        for ip_address in (HOSPITAL, ATTACKER, NGINX):
+            detector.unblock(ip_address)
+
+    def scan_request(self, x_forwarded_for):
+        return RequestFactory().post(
+            '/api/nfc/scan/', REMOTE_ADDR=NGINX, HTTP_X_FORWARDED_FOR=x_forwarded_for
+        )
+
+    def test_forged_header_blocks_the_sender(self):
+        for _ in range(3):
+            # nginx appends the attacker's real address to the forged value
+            record_failed_scan(self.scan_request(f'{HOSPITAL}, {ATTACKER}'))
+
+        self.assertIsNone(detector.blocked_until(HOSPITAL))
+        self.assertIsNotNone(detector.blocked_until(ATTACKER))
+        self.assertEqual(SecurityEvent.objects.get().ip_address, ATTACKER)
+
+        middleware = SecurityBlockMiddleware(lambda request: None)
+        self.assertIsNone(middleware.process_request(self.scan_request(HOSPITAL)))
+        self.assertEqual(middleware.process_request(self.scan_request(f'{HOSPITAL}, {ATTACKER}')).status_code, 429)
+
+
+class ExportCellTests(TestCase):
+    """Client-controlled values cannot break a workbook or run as formulas"""
+
+    def test_control_characters_are_dropped(self):
+        fileobj = io.BytesIO()
+        exports.write_xlsx(['user_agent'], [['curl\x00/8\x1b[0m'], [{'note': 'a\x07b'}]], fileobj)
+        fileobj.seek(0)
+        values = [row[0] for row in load_workbook(fileobj).active.iter_rows(values_only=True)]
+        self.assertEqual(values, ['user_agent', 'curl/8[0m', '{"note": "a\\u0007b"}'])
+
+    def test_formulas_are_quoted(self):
+        for value in ('=HYPERLINK("http://x")', '+1', '-2+3', '@SUM(A1)'):
+            with self.subTest(value=value):
+                self.assertEqual(exports._cell(value), "'" + value)
+        self.assertEqual(exports._cell('plain'), 'plain')
+        self.assertEqual(exports._cell(-5), -5)
+        line = list(exports.stream_csv(['description'], [['=1+1']]))[1]
+        self.assertEqual(line.strip(), "'=1+1")
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, AUDIT_LOG_READS=False)
+class ExportJobTests(TestCase):
+    """Background export files are private and only served by the job view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', password='pw', first_name='Анна', last_name='Смирнова',
+            role='ADMIN', is_staff=True
+        )
+        AuditLog.objects.create(user=cls.admin, action='UPDATE', resource_type='PROFILE', description='=cmd')
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(EXPORT_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_job_file_is_outside_media_root(self):
+        with mock.patch('apps.audit.tasks.run_export') as task:
+            response = self.client.get('/api/audit/logs/export/?output=csv&background=true')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['id']
+        task.delay.assert_called_once_with(job_id)
+        exports.build_export(job_id)
+
+        self.assertTrue((Path(self.root) / f'{job_id}.csv').exists())
+        self.assertFalse((Path(settings.MEDIA_ROOT) / 'exports' / f'{job_id}.csv').exists())
+
+        response = self.client.get(f'/api/audit/exports/{job_id}/?download=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("'=cmd", b''.join(response.streaming_content).decode('utf-8'))
+
+        self.assertEqual(exports.purge_exports(0), 1)
+        self.assertFalse((Path(self.root) / f'{job_id}.csv').exists())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Partitioning requires PostgreSQL')
+@override_settings(LOG_BUFFER_ENABLED=False)
+class PartitionLogTablesTests(TestCase):
+    """partition_log_tables copies the rows in batches and swaps the tables"""
+
+    def test_convert(self):
+        user = User.objects.create_user(
+            email='user@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+        now = timezone.now()
+        AuditLog.objects.bulk_create([
+            AuditLog(user=user, action='LOGIN', resource_type='user', created_at=now - timedelta(days=days))
+            for days in range(0, 100, 4)
+        ])
+        self.assertFalse(is_partitioned('audit_logs'))
+        # Outside the test transaction the command runs in autocommit, with foreign keys already checked
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        call_command('partition_log_tables', 'audit_logs', '--batch-size', '7', stdout=io.StringIO())
+
+        self.assertTrue(is_partitioned('audit_logs'))
+        self.assertGreaterEqual(len(list_partitions('audit_logs')), 4)
+        self.assertEqual(AuditLog.objects.count(), 25)
+        # Indexes and foreign keys came along under their old names
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'audit_logs'")
+            indexes = {row[0] for row in cursor.fetchall()}
+            cursor.execute("SELECT contype FROM pg_constraint WHERE conrelid = 'audit_logs'::regclass")
+            constraints = sorted(row[0] for row in cursor.fetchall())
+        self.assertIn('audit_logs_pkey', indexes)
+        self.assertFalse([name for name in indexes if name.endswith('_new')])
+        self.assertEqual(len(indexes), len(AuditLog._meta.indexes) + 3)  # pkey, created_at, user_id
+        self.assertEqual(constraints, ['f', 'p'])
@@ -4,14 +4,22 @@ URLs for audit app
 from django.urls import path
 from .views import (
     AuditLogListView,
+    AuditLogExportView,
     SecurityEventListView,
+    SecurityEventExportView,
+    ExportJobView,
     MyAuditLogListView,
+    AuditSinkStatsView,
 )
 
 app_name = 'audit'
 
 urlpatterns = [
     path('logs/', AuditLogListView.as_view(), name='audit-log-list'),
+    path('logs/export/', AuditLogExportView.as_view(), name='audit-log-export'),
     path('security-events/', SecurityEventListView.as_view(), name='security-event-list'),
+    path('security-events/export/', SecurityEventExportView.as_view(), name='security-event-export'),
+    path('exports/<uuid:job_id>/', ExportJobView.as_view(), name='export-job'),
     path('my-logs/', MyAuditLogListView.as_view(), name='my-audit-log-list'),
+    path('sink-stats/', AuditSinkStatsView.as_view(), name='audit-sink-stats'),
 ]
@@ -1,16 +1,26 @@
 """
 Views for audit app
 """
+from django.http import Http404
 from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from apps.core.buffer import writer_stats
+from apps.core.mixins import QueryHintsMixin
+from apps.core.pagination import KeysetPagination
+from apps.core.replicas import ReplicaReadMixin
+from .exports import ExportMixin, export_job_response, get_export_job
 from .models import AuditLog, SecurityEvent
 from .serializers import AuditLogSerializer, SecurityEventSerializer
+from .sinks import get_audit_sink
 
 
-class AuditLogListView(generics.ListAPIView):
+class AuditLogListView(ReplicaReadMixin, QueryHintsMixin, generics.ListAPIView):
     """List audit logs (admin only)"""
 
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = AuditLog.objects.all()
@@ -43,11 +53,12 @@ class AuditLogListView(generics.ListAPIView):
         return queryset
 
 
-class SecurityEventListView(generics.ListAPIView):
+class SecurityEventListView(ReplicaReadMixin, QueryHintsMixin, generics.ListAPIView):
     """List security events (admin only)"""
 
     serializer_class = SecurityEventSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = SecurityEvent.objects.all()
@@ -70,11 +81,80 @@ class SecurityEventListView(generics.ListAPIView):
         return queryset
 
 
-class MyAuditLogListView(generics.ListAPIView):
+class AuditLogExportView(ExportMixin, AuditLogListView):
+    """Export audit logs as CSV or XLSX (admin only)"""
+
+    export_name = 'audit_logs'
+    export_columns = (
+        ('created_at', 'created_at'),
+        ('user', 'user__email'),
+        ('action', 'action'),
+        ('resource_type', 'resource_type'),
+        ('resource_id', 'resource_id'),
+        ('resource_name', 'resource_name'),
+        ('description', 'description'),
+        ('severity', 'severity'),
+        ('ip_address', 'ip_address'),
+        ('user_agent', 'user_agent'),
+        ('endpoint', 'endpoint'),
+        ('method', 'method'),
+        ('success', 'success'),
+        ('error_message', 'error_message'),
+        ('old_value', 'old_value'),
+        ('new_value', 'new_value'),
+    )
+
+
+class SecurityEventExportView(ExportMixin, SecurityEventListView):
+    """Export security events as CSV or XLSX (admin only)"""
+
+    export_name = 'security_events'
+    export_columns = (
+        ('created_at', 'created_at'),
+        ('event_type', 'event_type'),
+        ('severity', 'severity'),
+        ('user', 'user__email'),
+        ('ip_address', 'ip_address'),
+        ('user_agent', 'user_agent'),
+        ('endpoint', 'endpoint'),
+        ('description', 'description'),
+        ('additional_data', 'additional_data'),
+        ('action_taken', 'action_taken'),
+        ('is_resolved', 'is_resolved'),
+        ('resolved_at', 'resolved_at'),
+    )
+
+
+class ExportJobView(APIView):
+    """Status of a background export, or its file with ?download=true"""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_export_job(job_id, request.user)
+        if job is None:
+            raise Http404
+        return export_job_response(job, download=request.query_params.get('download', '').lower() == 'true')
+
+
+class MyAuditLogListView(QueryHintsMixin, generics.ListAPIView):
     """List current user's audit logs"""
 
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return AuditLog.objects.filter(user=self.request.user)
+
+
+class AuditSinkStatsView(APIView):
+    """Queue depth and drop counters of this worker's buffered writers (admin only)"""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'sink': type(get_audit_sink()).__name__,
+            'writers': writer_stats(),
+        })
@@ -4,11 +4,12 @@ Admin configuration for authentication app
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
+from apps.core.replicas import ReplicaChangeListMixin
 from .models import User, RefreshToken
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ReplicaChangeListMixin, BaseUserAdmin):
     """Custom User admin"""
 
     list_display = ('email', 'get_full_name', 'role', 'is_active', 'is_verified', 'date_joined')
@@ -35,13 +36,13 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(RefreshToken)
-class RefreshTokenAdmin(admin.ModelAdmin):
+class RefreshTokenAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     """RefreshToken admin"""
 
     list_display = ('user', 'is_active', 'created_at', 'expires_at', 'ip_address')
     list_filter = ('is_active', 'created_at', 'expires_at')
     search_fields = ('user__email', 'ip_address', 'device_info')
-    readonly_fields = ('user', 'token', 'created_at', 'expires_at', 'device_info', 'ip_address')
+    readonly_fields = ('user', 'token_hash', 'created_at', 'expires_at', 'device_info', 'ip_address')
 
     def has_add_permission(self, request):
         return False
@@ -0,0 +1,90 @@
+"""
+Principal cache for JWT authentication
+
+An authenticated request needs only a few user columns (PRINCIPAL_FIELDS).
+They are cached per user id and version for AUTH_PRINCIPAL_CACHE_TIMEOUT
+seconds in Redis and AUTH_PRINCIPAL_LOCAL_TIMEOUT seconds in the worker.
+Saving a user bumps the version. Other workers may keep a copy for up to
+the local timeout.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.core.local_cache import LocalCache
+from apps.core.metrics import record_cache_lookup
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_FIELDS = ('id', 'role', 'is_active', 'is_staff', 'is_superuser', 'two_factor_enabled')
+
+_LOADED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname in PRINCIPAL_FIELDS]
+
+_local = LocalCache(settings.AUTH_PRINCIPAL_LOCAL_MAX_SIZE)
+
+
+def _version_key(user_id):
+    return f'auth:principal:version:{user_id}'
+
+
+def _principal_key(user_id, version):
+    return f'auth:principal:{user_id}:{version}'
+
+
+def _initial_version():
+    # Time-based so an evicted counter never points back at a stale principal
+    return int(time.time() * 1000)
+
+
+def _principal(values):
+    """User instance with only PRINCIPAL_FIELDS loaded; other fields load on first access"""
+    data = dict(zip(PRINCIPAL_FIELDS, values))
+    # from_db() takes values in model field order
+    return User.from_db(DEFAULT_DB_ALIAS, _LOADED_FIELDS, [data[name] for name in _LOADED_FIELDS])
+
+
+def get_user_principal(user_id):
+    """User with the principal fields for user_id, or None if there is no such user"""
+    user_id = str(user_id)
+    values = _local.get(user_id)
+    if values is not None:
+        record_cache_lookup('user_principal', 'local')
+        return _principal(values)
+
+    try:
+        version = cache.get_or_set(_version_key(user_id), _initial_version, timeout=None)
+        values = cache.get(_principal_key(user_id, version))
+    except Exception as e:
+        logger.warning('Principal cache read failed: %s', e)
+        version = None
+
+    record_cache_lookup('user_principal', 'shared' if values is not None else 'miss')
+    if values is None:
+        values = User.objects.filter(id=user_id).values_list(*PRINCIPAL_FIELDS).first()
+        if values is None:
+            return None
+        if version is not None:
+            try:
+                cache.set(_principal_key(user_id, version), values, timeout=settings.AUTH_PRINCIPAL_CACHE_TIMEOUT)
+            except Exception as e:
+                logger.warning('Principal cache write failed: %s', e)
+
+    _local.set(user_id, values, settings.AUTH_PRINCIPAL_LOCAL_TIMEOUT)
+    return _principal(values)
+
+
+def invalidate_user_principal(user_id):
+    """Drop the cached principal, e.g. after a role change, deactivation or password change"""
+    user_id = str(user_id)
+    _local.delete(user_id)
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # Counter was never set or has been evicted
+        cache.set(_version_key(user_id), _initial_version(), timeout=None)
+    except Exception as e:
+        logger.warning('Principal cache invalidation failed: %s', e)
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-18 05:20
+
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def hash_tokens(apps, schema_editor):
+    RefreshToken = apps.get_model('authentication', 'RefreshToken')
+    batch = []
+    for token in RefreshToken.objects.only('id', 'token').iterator(chunk_size=1000):
+        token.token_hash = hashlib.sha256(token.token.encode()).hexdigest()
+        batch.append(token)
+        if len(batch) >= 1000:
+            RefreshToken.objects.bulk_update(batch, ['token_hash'])
+            batch = []
+    if batch:
+        RefreshToken.objects.bulk_update(batch, ['token_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(hash_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='refreshtoken',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='refreshtoken',
+            index=models.Index(fields=['user', 'is_active'], name='refresh_tokens_user_active'),
+        ),
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='refresh_tokens', to='authentication.user'),
+        ),
+        migrations.AddIndex(
+            model_name='refreshtoken',
+            index=models.Index(fields=['expires_at'], name='refresh_tokens_expires_at'),
+        ),
+    ]
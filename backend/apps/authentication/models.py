@@ -4,6 +4,8 @@ Authentication models for NFC Medical Platform
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.utils import timezone
+from datetime import datetime, timezone as dt_timezone
+import hashlib
 import uuid
 
 
@@ -93,6 +95,14 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Return short name"""
         return self.first_name
 
+    def refresh_from_db(self, using=None, fields=None):
+        # Users authenticated from the principal cache carry only a few fields;
+        # touching any other one loads the rest of the row at once
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields)
+
     @property
     def is_patient(self):
         return self.role == 'PATIENT'
@@ -106,12 +116,62 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.role in ['ADMIN', 'SUPER_ADMIN']
 
 
+def hash_token(token):
+    """Fixed-width key under which a refresh token is stored"""
+    return hashlib.sha256(str(token).encode()).hexdigest()
+
+
+class RefreshTokenManager(models.Manager):
+    """Refresh tokens are stored and looked up by SHA-256 hash only"""
+
+    def record(self, user, refresh, ip_address=None, device_info=''):
+        """Store an issued simplejwt RefreshToken; expires with the token itself"""
+        return self.create(
+            user=user,
+            token_hash=hash_token(refresh),
+            expires_at=datetime.fromtimestamp(refresh['exp'], tz=dt_timezone.utc),
+            ip_address=ip_address,
+            device_info=device_info
+        )
+
+    def for_token(self, token):
+        return self.filter(token_hash=hash_token(token))
+
+    def deactivate_expired(self, batch_size=1000):
+        """Deactivate expired active tokens in batches; returns how many"""
+        return self._in_batches(
+            self.filter(is_active=True, expires_at__lte=timezone.now()),
+            lambda batch: batch.update(is_active=False),
+            batch_size
+        )
+
+    def delete_expired(self, expired_before, batch_size=1000):
+        """Delete tokens that expired before the given time in batches; returns how many"""
+        return self._in_batches(
+            self.filter(expires_at__lt=expired_before),
+            lambda batch: batch.delete()[0],
+            batch_size
+        )
+
+    def _in_batches(self, queryset, apply, batch_size):
+        # Short transactions: each batch is selected by primary key, then updated or deleted
+        total = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            total += apply(self.filter(id__in=ids))
+            if len(ids) < batch_size:
+                return total
+
+
 class RefreshToken(models.Model):
     """Model for storing refresh tokens"""
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens')
-    token = models.CharField(max_length=500, unique=True)
+    # Indexed by refresh_tokens_user_active below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens', db_index=False)
+    token_hash = models.CharField(max_length=64, unique=True)
 
     is_active = models.BooleanField(default=True)
 
@@ -122,11 +182,18 @@ class RefreshToken(models.Model):
     device_info = models.CharField(max_length=255, blank=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
 
+    objects = RefreshTokenManager()
+
     class Meta:
         db_table = 'refresh_tokens'
         verbose_name = 'Refresh Token'
         verbose_name_plural = 'Refresh Tokens'
         ordering = ['-created_at']
+        indexes = [
+            # Active sessions of a user (logout everywhere, password change)
+            models.Index(fields=['user', 'is_active'], name='refresh_tokens_user_active'),
+            models.Index(fields=['expires_at'], name='refresh_tokens_expires_at'),
+        ]
 
     def __str__(self):
         return f"Token for {self.user.email} - {self.id}"
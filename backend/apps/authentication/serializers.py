@@ -4,6 +4,7 @@ Serializers for authentication app
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from apps.audit.detection import record_failed_login
 from .models import User
 
 
@@ -54,9 +55,12 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if email and password:
-            user = authenticate(request=self.context.get('request'), username=email, password=password)
+            request = self.context.get('request')
+            user = authenticate(request=request, username=email, password=password)
 
             if not user:
+                if request is not None:
+                    record_failed_login(request, email)
                 raise serializers.ValidationError('Неверные учетные данные')
 
             if not user.is_active:
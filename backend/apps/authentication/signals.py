@@ -0,0 +1,19 @@
+"""
+Signals for authentication app
+
+Committed changes to a user (role, activation, 2FA, password) drop the
+cached principal used by JWT authentication.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_user_principal
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_principal(sender, instance, **kwargs):
+    user_id = instance.id
+    transaction.on_commit(lambda: invalidate_user_principal(user_id))
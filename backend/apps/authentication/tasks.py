@@ -0,0 +1,22 @@
+"""
+Celery tasks for authentication app
+"""
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RefreshToken
+
+
+@shared_task(ignore_result=True)
+def purge_refresh_tokens():
+    """Deactivate expired refresh tokens and delete those past the retention period"""
+    batch_size = settings.REFRESH_TOKEN_PURGE_BATCH_SIZE
+    deactivated = RefreshToken.objects.deactivate_expired(batch_size=batch_size)
+    deleted = RefreshToken.objects.delete_expired(
+        timezone.now() - timedelta(days=settings.REFRESH_TOKEN_RETENTION_DAYS),
+        batch_size=batch_size
+    )
+    return {'deactivated': deactivated, 'deleted': deleted}
@@ -0,0 +1,40 @@
+"""
+Throttles for password and one-time code checks
+
+Attempts are limited per client IP and, to slow down credential stuffing
+and code guessing spread over many addresses, per account.
+"""
+from apps.core.throttling import GCRAThrottle
+
+
+class LoginRateThrottle(GCRAThrottle):
+    """Login and 2FA verification attempts per client IP"""
+
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        return self.key_for(self.get_ident(request))
+
+
+class LoginAccountThrottle(GCRAThrottle):
+    """Login attempts per email address"""
+
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return self.key_for(email.strip().lower())
+
+
+class TwoFactorRateThrottle(GCRAThrottle):
+    """2FA code attempts per user"""
+
+    scope = 'two_factor'
+
+    def get_cache_key(self, request, view):
+        user_id = request.data.get('user_id') if hasattr(request.data, 'get') else None
+        if not isinstance(user_id, str) or not user_id:
+            return None
+        return self.key_for(user_id.lower())
@@ -6,12 +6,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken as JWTRefreshToken
 from django.utils import timezone
-from datetime import timedelta
 from django_otp.plugins.otp_totp.models import TOTPDevice
 import qrcode
 import io
 import base64
 
+from apps.audit.detection import record_failed_2fa
+from apps.core.ip import get_client_ip
 from .models import User, RefreshToken
 from .serializers import (
     UserSerializer,
@@ -21,6 +22,7 @@ from .serializers import (
     TwoFactorEnableSerializer,
     TwoFactorVerifySerializer
 )
+from .throttling import LoginAccountThrottle, LoginRateThrottle, TwoFactorRateThrottle
 
 
 class RegisterView(generics.CreateAPIView):
@@ -45,6 +47,7 @@ class LoginView(APIView):
     """User login"""
 
     permission_classes = (permissions.AllowAny,)
+    throttle_classes = (LoginRateThrottle, LoginAccountThrottle)
     serializer_class = LoginSerializer
 
     def post(self, request):
@@ -66,10 +69,9 @@ class LoginView(APIView):
         refresh = JWTRefreshToken.for_user(user)
 
         # Save refresh token to database
-        refresh_token = RefreshToken.objects.create(
-            user=user,
-            token=str(refresh),
-            expires_at=timezone.now() + timedelta(days=1),
+        refresh_token = RefreshToken.objects.record(
+            user,
+            refresh,
             ip_address=self.get_client_ip(request),
             device_info=request.META.get('HTTP_USER_AGENT', '')
         )
@@ -86,12 +88,7 @@ class LoginView(APIView):
 
     def get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        return get_client_ip(request)
 
 
 class RefreshTokenView(APIView):
@@ -107,11 +104,11 @@ class RefreshTokenView(APIView):
 
         try:
             # Verify token in database
-            db_token = RefreshToken.objects.get(token=refresh_token, is_active=True)
+            db_token = RefreshToken.objects.for_token(refresh_token).get(is_active=True)
 
             if db_token.is_expired:
                 db_token.is_active = False
-                db_token.save()
+                db_token.save(update_fields=['is_active'])
                 return Response({'error': 'Token истек'}, status=status.HTTP_401_UNAUTHORIZED)
 
             # Generate new access token
@@ -137,13 +134,8 @@ class LogoutView(APIView):
         refresh_token = request.data.get('refresh')
 
         if refresh_token:
-            try:
-                # Deactivate refresh token
-                token = RefreshToken.objects.get(token=refresh_token, user=request.user)
-                token.is_active = False
-                token.save()
-            except RefreshToken.DoesNotExist:
-                pass
+            # Deactivate refresh token
+            RefreshToken.objects.for_token(refresh_token).filter(user=request.user).update(is_active=False)
 
         return Response({'message': 'Успешный выход'}, status=status.HTTP_200_OK)
 
@@ -237,6 +229,7 @@ class TwoFactorVerifyView(APIView):
     """Verify 2FA code during login"""
 
     permission_classes = (permissions.AllowAny,)
+    throttle_classes = (LoginRateThrottle, TwoFactorRateThrottle)
 
     def post(self, request):
         serializer = TwoFactorVerifySerializer(data=request.data)
@@ -254,10 +247,9 @@ class TwoFactorVerifyView(APIView):
                 refresh = JWTRefreshToken.for_user(user)
 
                 # Save refresh token to database
-                RefreshToken.objects.create(
-                    user=user,
-                    token=str(refresh),
-                    expires_at=timezone.now() + timedelta(days=1),
+                RefreshToken.objects.record(
+                    user,
+                    refresh,
                     ip_address=self.get_client_ip(request),
                     device_info=request.META.get('HTTP_USER_AGENT', '')
                 )
@@ -272,16 +264,13 @@ class TwoFactorVerifyView(APIView):
                     'user': UserSerializer(user).data
                 }, status=status.HTTP_200_OK)
             else:
+                record_failed_2fa(request, user_id, user=user)
                 return Response({'error': 'Неверный код'}, status=status.HTTP_400_BAD_REQUEST)
 
         except (User.DoesNotExist, TOTPDevice.DoesNotExist):
+            record_failed_2fa(request, user_id)
             return Response({'error': 'Пользователь или устройство не найдено'}, status=status.HTTP_404_NOT_FOUND)
 
     def get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        return get_client_ip(request)
@@ -0,0 +1,40 @@
+"""
+Fire-and-forget work for async views
+
+run_detached() starts a blocking callable in a worker thread and returns
+immediately; the request does not wait for it and failures are only logged.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Strong references so pending tasks are not garbage collected
+_tasks = set()
+
+
+def _call(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    finally:
+        # Executor threads are reused; don't leave a connection open in them
+        close_old_connections()
+
+
+def _done(task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('Background task failed', exc_info=task.exception())
+
+
+def run_detached(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in a thread without awaiting it; needs a running event loop"""
+    task = asyncio.get_running_loop().create_task(
+        sync_to_async(_call, thread_sensitive=False)(func, args, kwargs)
+    )
+    _tasks.add(task)
+    task.add_done_callback(_done)
+    return task
@@ -0,0 +1,232 @@
+"""
+Buffered bulk writers for append-only tables
+
+A BatchWriter accepts unsaved model instances on the request path and
+inserts them from a background thread with bulk_create, flushing every
+LOG_BUFFER_FLUSH_SIZE records or LOG_BUFFER_FLUSH_INTERVAL seconds,
+whichever comes first.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_writers = []
+
+# Sentinel asking the flusher thread to write what it holds and exit
+_STOP = object()
+
+
+class BatchWriter:
+    """Bounded in-process queue flushed to the database with bulk_create"""
+
+    # What to do with a record when the queue is full
+    OVERFLOW_WRITE = 'write'  # insert synchronously on the caller's thread
+    OVERFLOW_DROP = 'drop'  # discard and count it
+
+    def __init__(self, model, overflow=OVERFLOW_WRITE):
+        self.model = model
+        self.overflow = overflow
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.overflowed = 0
+        self.dropped = 0
+        self.failed = 0
+
+        _writers.append(self)
+
+    @property
+    def name(self):
+        return self.model._meta.db_table
+
+    @property
+    def flush_size(self):
+        return settings.LOG_BUFFER_FLUSH_SIZE
+
+    @property
+    def flush_interval(self):
+        return settings.LOG_BUFFER_FLUSH_INTERVAL
+
+    def add(self, obj):
+        """Queue an unsaved instance for insertion"""
+        if not settings.LOG_BUFFER_ENABLED:
+            self._write([obj])
+            return
+
+        if not self.offer(obj):
+            self._handle_overflow(obj)
+
+    def offer(self, obj):
+        """Queue an instance without ever writing on the caller's thread; False if not queued"""
+        if not settings.LOG_BUFFER_ENABLED:
+            return False
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(obj)
+        except queue.Full:
+            return False
+        self.enqueued += 1
+        return True
+
+    def flush(self):
+        """Write everything queued so far on the calling thread"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.flush_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def close(self, timeout=5):
+        """Stop the flusher thread, then write whatever is still queued"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                self._thread.join(timeout)
+            except queue.Full:
+                pass
+        self.flush()
+
+    @property
+    def queue_depth(self):
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'enqueued': self.enqueued,
+            'flushed': self.flushed,
+            'overflowed': self.overflowed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _handle_overflow(self, obj):
+        self.overflowed += 1
+        if self.overflow == self.OVERFLOW_DROP:
+            self.dropped += 1
+            return
+        # Durable fallback: the record is written, just not asynchronously
+        self._write([obj])
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            # Fresh queue after a fork: the parent's thread does not exist here
+            if self._pid != pid:
+                self._queue = queue.Queue(maxsize=settings.LOG_BUFFER_MAX_SIZE)
+                self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f'batch-writer-{self.name}',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # The flusher owns its own connection; recycle it like a request would
+            close_old_connections()
+            self._write(batch)
+            close_old_connections()
+            if stopping:
+                return
+
+    def prepare(self, batch):
+        """Hook for subclasses, run before each batch is inserted"""
+
+    def _write(self, batch):
+        try:
+            self.prepare(batch)
+            self.model.objects.bulk_create(batch, batch_size=self.flush_size)
+            self.flushed += len(batch)
+        except Exception:
+            logger.exception('Bulk insert into %s failed, retrying row by row', self.name)
+            self._write_rows(batch)
+
+    def _write_rows(self, batch):
+        # One bad row (e.g. a tag deleted before the flush) must not lose the batch
+        for obj in batch:
+            try:
+                obj.save(force_insert=True)
+                self.flushed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception('Insert into %s failed, record lost', self.name)
+
+
+def flush_all():
+    """Flush every writer in this process"""
+    for writer in _writers:
+        try:
+            writer.flush()
+        except Exception:
+            logger.exception('Flushing %s failed', writer.name)
+
+
+def close_all():
+    """Stop every writer in this process, writing all pending records"""
+    for writer in _writers:
+        try:
+            writer.close()
+        except Exception:
+            logger.exception('Closing %s failed', writer.name)
+
+
+def writer_stats():
+    return {writer.name: writer.stats() for writer in _writers}
+
+
+atexit.register(close_all)
@@ -0,0 +1,31 @@
+"""
+Client IP address behind trusted reverse proxies
+"""
+import ipaddress
+
+from django.conf import settings
+
+
+def get_client_ip(request):
+    """
+    Address of the client that sent the request
+
+    X-Forwarded-For is only trusted as far as our own proxies wrote it: with
+    TRUSTED_PROXY_COUNT = N the client is the Nth address from the right,
+    the one the outermost trusted proxy appended. Anything left of it was
+    sent by the client. Without proxies, without the header or with an
+    address that does not parse, REMOTE_ADDR is used.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR') or '127.0.0.1'
+    proxies = settings.TRUSTED_PROXY_COUNT
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    addresses = [address.strip() for address in x_forwarded_for.split(',') if address.strip()]
+    if proxies <= 0 or not addresses:
+        return remote_addr
+
+    address = addresses[-min(proxies, len(addresses))]
+    try:
+        ipaddress.ip_address(address)
+    except ValueError:
+        return remote_addr
+    return address
@@ -0,0 +1,45 @@
+"""
+Small in-process cache for hot lookups
+
+Entries expire on their own and are never invalidated across workers, so
+callers keep timeouts to a few seconds and use the shared cache behind it.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """Bounded LRU map with per-entry expiry, local to the worker process"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
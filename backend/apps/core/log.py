@@ -0,0 +1,328 @@
+"""
+Non-blocking structured logging
+
+configure() (LOGGING_CONFIG) applies LOGGING and then puts the root
+handlers behind a QueueLogHandler: the calling thread only tags the record
+with the current request (request_id, user_id, url_name) and queues it, and
+a listener thread formats and writes it. When the queue is full the record
+is dropped rather than waited on. INFO and lower records can be sampled per
+request with LOG_INFO_SAMPLE_RATE.
+
+RequestLogMiddleware assigns the request id (X-Request-ID) and writes one
+line per request with its duration. SharedRotatingFileHandler lets every
+gunicorn worker append to one file and rotate it by size or age without
+two processes rotating at once.
+"""
+import copy
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject, empty
+
+from apps.core.metrics import record_log_drop
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated between processes
+    fcntl = None
+
+request_logger = logging.getLogger('apps.requests')
+
+_request = ContextVar('log_request', default=None)
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_CONTEXT_ATTRS = ('request_id', 'user_id', 'url_name')
+# django.request passes the request object itself; request_id and url_name already identify it
+_SKIPPED_ATTRS = _RECORD_ATTRS | {'request'}
+
+_traceback_formatter = logging.Formatter()
+
+
+def configure(config):
+    """LOGGING_CONFIG callable: dictConfig, then queue the root handlers"""
+    logging.config.dictConfig(config)
+    root = logging.getLogger()
+    handlers = [handler for handler in root.handlers if not isinstance(handler, QueueLogHandler)]
+    if not handlers:
+        return
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueLogHandler(handlers, settings.LOG_QUEUE_SIZE))
+
+
+def close_queues():
+    """Write everything queued by this process and stop its listener threads"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueLogHandler):
+            handler.stop()
+
+
+def current_request_id():
+    request = _request.get()
+    return getattr(request, 'request_id', None)
+
+
+def _user_id(request):
+    user = request.__dict__.get('user')
+    # Never authenticate from inside a log call
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return None
+    return str(user.pk) if user.is_authenticated else None
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds request_id, user_id and url_name of the current request to each record"""
+
+    def filter(self, record):
+        request = _request.get()
+        if request is None:
+            for name in _CONTEXT_ATTRS:
+                if not hasattr(record, name):
+                    setattr(record, name, None)
+            return True
+        if not hasattr(record, 'request_id'):
+            record.request_id = request.request_id
+        if not hasattr(record, 'user_id'):
+            record.user_id = _user_id(request)
+        if not hasattr(record, 'url_name'):
+            match = getattr(request, 'resolver_match', None)
+            record.url_name = match.view_name if match else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps INFO and lower records of LOG_INFO_SAMPLE_RATE of the requests.
+
+    The choice follows the request id, so a request keeps all its records or
+    none; records outside a request are sampled one by one.
+    """
+
+    def filter(self, record):
+        rate = settings.LOG_INFO_SAMPLE_RATE
+        if record.levelno > logging.INFO or rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            keep = zlib.crc32(request_id.encode()) % 10000 < rate * 10000
+        else:
+            keep = random.random() < rate
+        if not keep:
+            record_log_drop('sampled')
+        return keep
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """QueueHandler with a bounded queue and its own listener per process"""
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(None)
+        self.targets = list(handlers)
+        self.queue_size = queue_size
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.addFilter(RequestContextFilter())
+        self.addFilter(SamplingFilter())
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            record_log_drop('queue_full')
+
+    def prepare(self, record):
+        # Resolve the message and traceback here; args and exc_info may not be safe to share
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid and self._listener is not None:
+            return
+
+        with self._lock:
+            if self._pid == pid and self._listener is not None:
+                return
+            # Fresh queue after a fork: the parent's listener thread does not exist here
+            self.queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = pid
+            self._listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+
+    def stop(self):
+        with self._lock:
+            if self._listener is None or self._pid != os.getpid():
+                return
+            listener, self._listener = self._listener, None
+        try:
+            listener.stop()
+        except queue.Full:
+            # No room for the stop sentinel; the daemon thread ends with the process
+            pass
+
+    def close(self):
+        self.stop()
+        for handler in self.targets:
+            handler.close()
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        for name in _CONTEXT_ATTRS:
+            data[name] = getattr(record, name, None)
+        for name, value in record.__dict__.items():
+            if name not in _SKIPPED_ATTRS and name not in data:
+                data[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SharedRotatingFileHandler(logging.FileHandler):
+    """
+    Appends to one file from many processes and rotates it by size or age.
+
+    Before each write the handler reopens the file if another process has
+    rotated it. A due rotation is done under an exclusive lock on
+    "<filename>.lock" and re-checked there, so only one process renames
+    the files. rotate_hours are aligned to UTC (24 rotates at midnight UTC).
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=5, rotate_hours=0, encoding='utf-8'):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, mode='a', encoding=encoding, delay=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.interval = rotate_hours * 3600
+        self._inode = None
+
+    def emit(self, record):
+        try:
+            message = self.format(record) + self.terminator
+            stat = self._stat()
+            if self.stream is not None and (stat is None or stat.st_ino != self._inode):
+                self._close_stream()
+            if self._rotation_due(stat, len(message)):
+                self._rotate(len(message))
+                self._close_stream()
+            if self.stream is None:
+                self.stream = self._open()
+                self._inode = os.fstat(self.stream.fileno()).st_ino
+            self.stream.write(message)
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _stat(self):
+        try:
+            return os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return None
+
+    def _rotation_due(self, stat, size):
+        if stat is None or stat.st_size == 0:
+            return False
+        if self.max_bytes and stat.st_size + size > self.max_bytes:
+            return True
+        # The file holds records of an earlier period; whoever writes first in a period rotates
+        return bool(self.interval) and stat.st_mtime // self.interval < time.time() // self.interval
+
+    def _rotate(self, size):
+        with open(self.baseFilename + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have rotated while we waited
+            if not self._rotation_due(self._stat(), size):
+                return
+            if self.backup_count <= 0:
+                os.remove(self.baseFilename)
+                return
+            for number in range(self.backup_count - 1, 0, -1):
+                source = f'{self.baseFilename}.{number}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.baseFilename}.{number + 1}')
+            os.replace(self.baseFilename, f'{self.baseFilename}.1')
+
+    def _close_stream(self):
+        # Nothing is open before this process's first write (delay=True)
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = None
+        self._inode = None
+
+
+class RequestLogMiddleware(MiddlewareMixin):
+    """Assigns X-Request-ID, exposes the request to log records and logs each request with its duration"""
+
+    def process_request(self, request):
+        incoming = request.META.get('HTTP_X_REQUEST_ID', '')
+        request.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        request._log_start = time.perf_counter()
+        _request.set(request)
+
+    def process_response(self, request, response):
+        request_id = getattr(request, 'request_id', None)
+        if request_id is None:
+            return response
+        response['X-Request-ID'] = request_id
+        request_logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - request._log_start) * 1000, 1),
+            }
+        )
+        return response
+
+
+def _clear_request(**kwargs):
+    # After the response is closed, so django.request's own log line still gets the context.
+    # Not reset(): under ASGI each call runs in its own copy of the context
+    _request.set(None)
+
+
+request_finished.connect(_clear_request, dispatch_uid='apps.core.log.clear_request')
@@ -0,0 +1,151 @@
+"""
+Prometheus metrics
+
+MetricsMiddleware records latency, response size and database queries per
+URL name; the scan path, throttles and caches add their own counters.
+metrics_view serves everything in the Prometheus text format at /metrics
+to scrapers sending METRICS_TOKEN; without a token the endpoint is off.
+
+Under gunicorn every worker has its own counters. With
+PROMETHEUS_MULTIPROC_DIR set (before the workers start), prometheus_client
+keeps them in files in that directory and /metrics adds up all workers;
+gunicorn.conf.py clears the directory when the server starts. It must be a
+real environment variable (docker-compose.yml sets it on a tmpfs): the
+.env file is only read by settings, after the workers have started.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by URL name',
+    ['view', 'method', 'status']
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Response body size by URL name',
+    ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries per request by URL name',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+DB_TIME = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database queries per request by URL name',
+    ['view']
+)
+THROTTLE_REJECTIONS = Counter(
+    'throttle_rejections_total',
+    'Requests refused by a throttle',
+    ['scope']
+)
+NFC_SCANS = Counter(
+    'nfc_scans_total',
+    'NFC scans by outcome (NFCAccessLog status)',
+    ['status']
+)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total',
+    'Cache lookups by cache and the tier that answered (local, shared or miss)',
+    ['cache', 'result']
+)
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total',
+    'Log records not written, by reason (sampled or queue_full)',
+    ['reason']
+)
+
+UNMATCHED_VIEW = '<unmatched>'
+METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+def record_cache_lookup(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def record_scan_outcome(status):
+    NFC_SCANS.labels(status).inc()
+
+
+def record_throttle_rejection(scope):
+    THROTTLE_REJECTIONS.labels(scope or '').inc()
+
+
+def record_log_drop(reason):
+    LOG_RECORDS_DROPPED.labels(reason).inc()
+
+
+class _QueryTimer:
+    """execute_wrapper counting queries and their time on one connection"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Times each request and counts its database queries; outermost middleware"""
+
+    def process_request(self, request):
+        request._metrics_start = time.perf_counter()
+        request._metrics_timer = timer = _QueryTimer()
+        for connection in connections.all():
+            connection.execute_wrappers.append(timer)
+
+    def process_response(self, request, response):
+        start = getattr(request, '_metrics_start', None)
+        if start is None:
+            return response
+        timer = request._metrics_timer
+        for connection in connections.all():
+            if timer in connection.execute_wrappers:
+                connection.execute_wrappers.remove(timer)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNMATCHED_VIEW
+        method = request.method if request.method in METHODS else 'OTHER'
+        REQUEST_LATENCY.labels(view, method, f'{response.status_code // 100}xx').observe(
+            time.perf_counter() - start
+        )
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+        DB_QUERIES.labels(view).observe(timer.count)
+        DB_TIME.labels(view).observe(timer.duration)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs "Authorization: Bearer <METRICS_TOKEN>", not served without a token"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        # The backend port is published; an open endpoint would expose every route and counter
+        raise Http404
+    if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,43 @@
+"""
+View and serializer mixins shared across apps
+
+Serializers declare the relations their fields read in Meta:
+
+    class Meta:
+        select_related = ('nfc_tag', 'accessed_by')
+        prefetch_related = ('allergies',)
+
+and QueryHintsMixin applies them to every queryset the view serializes,
+so a list costs the same number of queries whatever its length.
+"""
+
+
+def apply_query_hints(queryset, serializer_class):
+    """Add the serializer's select_related/prefetch_related hints to a queryset"""
+    meta = getattr(serializer_class, 'Meta', None)
+    select_related = getattr(meta, 'select_related', ())
+    prefetch_related = getattr(meta, 'prefetch_related', ())
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class QueryHintsMixin:
+    """Generic view mixin applying serializer query hints after filtering"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return apply_query_hints(queryset, self.get_serializer_class())
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin accepting fields=[...] to leave out unrequested fields"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -0,0 +1,19 @@
+"""
+Access to the raw Redis client behind the default cache
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis():
+    """Raw redis-py client for CACHES['default'], or None if it isn't Redis"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except NotImplementedError:
+        # Cache backend is not django-redis (e.g. locmem in development)
+        return None
+    except Exception as e:
+        logger.warning('Redis client unavailable: %s', e)
+        return None
@@ -0,0 +1,115 @@
+"""
+Read replica routing
+
+Replicas are configured with DB_REPLICA_HOSTS and get the aliases
+replica_1, replica_2, ... Nothing reads from them implicitly: read-heavy
+views opt in with ReplicaReadMixin, admin classes with
+ReplicaChangeListMixin, and the scan path with NFC_SCAN_USE_REPLICAS.
+After a user's successful write the user is pinned to the primary for
+DB_REPLICA_PIN_SECONDS, so their own changes are visible despite
+replication lag. ReplicaRouter sends every write to the primary, including
+saves of instances that were loaded from a replica.
+"""
+import logging
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+REPLICA_PREFIX = 'replica_'
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def _pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def pin_to_primary(user):
+    """Serve the user's reads from the primary for DB_REPLICA_PIN_SECONDS"""
+    try:
+        cache.set(_pin_key(user.pk), 1, timeout=settings.DB_REPLICA_PIN_SECONDS)
+    except Exception as e:
+        logger.warning('Replica pin write failed: %s', e)
+
+
+def is_pinned(user):
+    if user is None or not user.is_authenticated:
+        return False
+    try:
+        return cache.get(_pin_key(user.pk)) is not None
+    except Exception as e:
+        # Unknown: reading from the primary is always correct
+        logger.warning('Replica pin read failed: %s', e)
+        return True
+
+
+def read_alias(user=None):
+    """A replica alias for a read on behalf of user, or the primary if none applies"""
+    aliases = replica_aliases()
+    if not aliases or is_pinned(user):
+        return DEFAULT_DB_ALIAS
+    return random.choice(aliases)
+
+
+class ReplicaRouter:
+    """Writes and migrations go to the primary; replicas hold the same data"""
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return not db.startswith(REPLICA_PREFIX)
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """Pin users to the primary after a successful unsafe request"""
+
+    def process_response(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not replica_aliases():
+            return response
+        # DRF sets request.user on the underlying request after token authentication
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user)
+        return response
+
+
+class ReplicaReadMixin:
+    """Generic view mixin serving safe requests' queryset (and exports) from a replica"""
+
+    def get_read_alias(self):
+        if getattr(self.request, 'method', 'GET') not in SAFE_METHODS:
+            return DEFAULT_DB_ALIAS
+        return read_alias(self.request.user)
+
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(queryset).using(self.get_read_alias())
+
+
+class ReplicaChangeListMixin:
+    """ModelAdmin mixin serving changelist pages (not actions or change forms) from a replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        request.replica_read = request.method in SAFE_METHODS
+        return super().changelist_view(request, extra_context)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if getattr(request, 'replica_read', False):
+            return queryset.using(read_alias(request.user))
+        return queryset
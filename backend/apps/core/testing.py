@@ -0,0 +1,40 @@
+"""
+Test helpers shared across apps
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Per-process cache for tests; without Redis the Redis-only paths fall back as in development
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class ConstantQueriesMixin:
+    """
+    TestCase mixin checking that a list endpoint runs as many queries for 2N rows as for N
+
+    A missing select_related/prefetch_related hint (see apps.core.mixins)
+    shows up as extra queries per row. self.client must be an authenticated
+    APIClient; add_rows(n) creates n more rows the endpoint lists.
+    """
+
+    def assertConstantQueries(self, url, add_rows, rows=3):
+        add_rows(rows)
+        first, listed = self._list_queries(url)
+        self.assertGreaterEqual(listed, rows)
+
+        add_rows(rows)
+        second, relisted = self._list_queries(url)
+        self.assertEqual(relisted, listed + rows)
+
+        self.assertEqual(
+            len(first), len(second),
+            f'{url}: {len(first)} queries for {listed} rows, {len(second)} for {relisted}:\n' + '\n'.join(second)
+        )
+
+    def _list_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        results = data['results'] if isinstance(data, dict) else data
+        return [query['sql'] for query in context.captured_queries], len(results)
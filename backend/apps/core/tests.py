@@ -0,0 +1,106 @@
+"""
+Tests for shared request, throttling and logging helpers
+"""
+import logging
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.request import Request
+
+from .ip import get_client_ip
+from .log import SharedRotatingFileHandler
+from .metrics import metrics_view
+from .throttling import AnonRateThrottle
+
+
+class ClientIPTests(SimpleTestCase):
+    """Only the proxies we run may name the client"""
+
+    def ip(self, x_forwarded_for=None, remote_addr='10.0.0.2'):
+        extra = {'REMOTE_ADDR': remote_addr}
+        if x_forwarded_for is not None:
+            extra['HTTP_X_FORWARDED_FOR'] = x_forwarded_for
+        return get_client_ip(RequestFactory().get('/', **extra))
+
+    @override_settings(TRUSTED_PROXY_COUNT=0)
+    def test_without_proxies_header_is_ignored(self):
+        self.assertEqual(self.ip('203.0.113.7'), '10.0.0.2')
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_address_appended_by_proxy(self):
+        self.assertEqual(self.ip('203.0.113.7'), '203.0.113.7')
+        # Whatever the client sent comes first; nginx appends the real peer
+        self.assertEqual(self.ip('198.51.100.1, 203.0.113.7'), '203.0.113.7')
+
+    @override_settings(TRUSTED_PROXY_COUNT=2)
+    def test_two_proxies(self):
+        self.assertEqual(self.ip('198.51.100.1, 203.0.113.7, 10.0.0.5'), '203.0.113.7')
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_missing_or_garbage_header(self):
+        self.assertEqual(self.ip(), '10.0.0.2')
+        self.assertEqual(self.ip(''), '10.0.0.2')
+        self.assertEqual(self.ip('not-an-ip'), '10.0.0.2')
+
+
+@override_settings(TRUSTED_PROXY_COUNT=1)
+class ThrottleIdentTests(SimpleTestCase):
+    """Per-IP throttle buckets follow the trusted client IP"""
+
+    def test_forged_header_keeps_the_bucket(self):
+        throttle = AnonRateThrottle()
+        keys = {
+            throttle.get_cache_key(Request(RequestFactory().get(
+                '/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR=f'{forged}, 203.0.113.7'
+            )), None)
+            for forged in ('198.51.100.1', '198.51.100.2', 'junk')
+        }
+        self.assertEqual(keys, {'throttle:anon:203.0.113.7'})
+
+
+class SharedRotatingFileHandlerTests(SimpleTestCase):
+    """Rotation of a file another process has already filled"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'app.log')
+
+    def emit(self, handler, message):
+        handler.emit(logging.LogRecord('test', logging.INFO, __file__, 0, message, None, None))
+
+    def test_first_write_rotates_an_oversized_file(self):
+        with open(self.filename, 'w') as existing:
+            existing.write('x' * 100 + '\n')
+        handler = SharedRotatingFileHandler(self.filename, max_bytes=50, backup_count=2)
+        self.addCleanup(handler.close)
+        with mock.patch.object(handler, 'handleError') as handle_error:
+            self.emit(handler, 'after restart')
+        handle_error.assert_not_called()
+
+        with open(self.filename) as current:
+            self.assertEqual(current.read(), 'after restart\n')
+        self.assertTrue(os.path.exists(self.filename + '.1'))
+
+
+class MetricsViewTests(SimpleTestCase):
+    """/metrics is only served to scrapers sending METRICS_TOKEN"""
+
+    def scrape(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return metrics_view(RequestFactory().get('/metrics', **headers))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_not_served_without_token(self):
+        with self.assertRaises(Http404):
+            self.scrape()
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape('Bearer wrong').status_code, 403)
+        self.assertEqual(self.scrape('Bearer secret').status_code, 200)
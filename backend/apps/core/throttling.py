@@ -0,0 +1,182 @@
+"""
+Rate limiting with GCRA (generic cell rate algorithm)
+
+Each throttle key holds a single "theoretical arrival time" in Redis,
+updated by one Lua script call, so limits are exact across workers and a
+request costs one round trip. A rate of N/period allows bursts of up to N
+requests and then one request every period/N. Per-IP limits key on
+apps.core.ip.get_client_ip, so a forged X-Forwarded-For opens no new bucket.
+
+The throttle client uses THROTTLE_REDIS_TIMEOUT as its socket timeout.
+When Redis errors or times out, throttling switches to a per-process
+limiter for THROTTLE_REDIS_RETRY_INTERVAL seconds instead of failing
+requests or waiting on Redis; limits are then per worker.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from apps.core.ip import get_client_ip
+from apps.core.local_cache import LocalCache
+from apps.core.metrics import record_throttle_rejection
+from apps.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: throttle key. ARGV: emission interval (ms), burst, cost (0 only checks).
+# Returns 0 when allowed (and recorded), otherwise the wait in ms.
+_GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+  tat = now
+end
+local wait = tat + interval * math.max(cost, 1) - interval * burst - now
+if wait > 0 then
+  return wait
+end
+if cost > 0 then
+  local new_tat = tat + interval * cost
+  redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+end
+return 0
+"""
+
+
+class _LocalLimiter:
+    """Per-process GCRA used while Redis is unavailable"""
+
+    def __init__(self, max_size=10000):
+        self._tats = LocalCache(max_size)
+        self._lock = threading.Lock()
+
+    def check(self, key, interval, burst, cost):
+        with self._lock:
+            now = int(time.monotonic() * 1000)
+            tat = max(self._tats.get(key) or now, now)
+            wait = tat + interval * max(cost, 1) - interval * burst - now
+            if wait > 0:
+                return wait
+            if cost > 0:
+                new_tat = tat + interval * cost
+                self._tats.set(key, new_tat, timeout=(new_tat - now) / 1000)
+            return 0
+
+
+class _Limiter:
+    """Shared GCRA in Redis with a short timeout and a local fallback"""
+
+    def __init__(self):
+        self._local = _LocalLimiter()
+        self._client = None
+        self._base_client = None
+        self._down_until = 0.0
+
+    def check(self, key, interval, burst, cost=1):
+        """0 if the request fits the limit (recorded unless cost is 0), otherwise the wait in ms"""
+        if time.monotonic() >= self._down_until:
+            client = self._get_client()
+            if client is not None:
+                try:
+                    return int(client.register_script(_GCRA_SCRIPT)(keys=[key], args=[interval, burst, cost]))
+                except Exception as e:
+                    logger.warning('Throttle check failed, using local limits: %s', e)
+                    self._down_until = time.monotonic() + settings.THROTTLE_REDIS_RETRY_INTERVAL
+        return self._local.check(key, interval, burst, cost)
+
+    def _get_client(self):
+        base = get_redis()
+        if base is None:
+            return None
+        if base is not self._base_client:
+            self._base_client = base
+            self._client = self._with_timeout(base)
+        return self._client
+
+    def _with_timeout(self, client):
+        # Own pool on the same server so the short timeout applies to throttle calls only
+        try:
+            from redis import ConnectionPool, Redis
+            pool = client.connection_pool
+            kwargs = dict(pool.connection_kwargs)
+            kwargs['socket_timeout'] = settings.THROTTLE_REDIS_TIMEOUT
+            kwargs['socket_connect_timeout'] = settings.THROTTLE_REDIS_TIMEOUT
+            return Redis(connection_pool=ConnectionPool(connection_class=pool.connection_class, **kwargs))
+        except Exception as e:
+            logger.warning('Throttle client without timeout: %s', e)
+            return client
+
+
+limiter = _Limiter()
+
+
+class GCRAThrottle(SimpleRateThrottle):
+    """
+    SimpleRateThrottle backed by the GCRA limiter.
+
+    Subclasses set scope (a key of DEFAULT_THROTTLE_RATES) and
+    get_cache_key(); a key of None skips the throttle.
+    """
+
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    # 0 only checks the limit; something else must record the requests
+    cost = 1
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self._wait_ms = limiter.check(self.key, *self.parameters(), cost=self.cost)
+        if self._wait_ms:
+            record_throttle_rejection(self.scope)
+            return False
+        return True
+
+    def parameters(self):
+        """(emission interval in ms, burst) for the configured rate"""
+        interval = max(1, round(self.duration * 1000 / self.num_requests))
+        return interval, self.num_requests
+
+    def wait(self):
+        return math.ceil(self._wait_ms / 1000)
+
+    def key_for(self, ident):
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_ident(self, request):
+        # DRF's own get_ident returns the whole X-Forwarded-For header without NUM_PROXIES
+        return get_client_ip(request)
+
+
+class AnonIPThrottle(GCRAThrottle):
+    """Anonymous requests per client IP; authenticated users are not limited by it"""
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.key_for(self.get_ident(request))
+
+
+class AnonRateThrottle(AnonIPThrottle):
+    scope = 'anon'
+
+
+class UserRateThrottle(GCRAThrottle):
+    """Authenticated requests per user, anonymous ones per client IP"""
+
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return self.key_for(request.user.pk)
+        return self.key_for(self.get_ident(request))
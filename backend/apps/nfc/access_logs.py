@@ -0,0 +1,70 @@
+"""
+Buffered writers for NFC access logs
+
+Scan requests only enqueue their NFCAccessLog / NFCEmergencyAccess rows;
+the inserts happen in batches off the request path. Emergency data is
+stored once per distinct content in NFCEmergencySnapshot and referenced
+by hash. The *_nowait variants are for async views and never write on
+the event loop thread.
+"""
+from apps.core.background import run_detached
+from apps.core.buffer import BatchWriter
+from apps.core.metrics import record_scan_outcome
+from .models import NFCAccessLog, NFCEmergencyAccess, NFCEmergencySnapshot
+
+
+class EmergencyAccessWriter(BatchWriter):
+    """Inserts the snapshots a batch references ahead of the accesses"""
+
+    def prepare(self, batch):
+        snapshots = {}
+        for access in batch:
+            if access.snapshot_id and access.snapshot_id not in snapshots:
+                snapshots[access.snapshot_id] = access.snapshot
+        if snapshots:
+            NFCEmergencySnapshot.objects.bulk_create(snapshots.values(), ignore_conflicts=True)
+
+
+access_log_writer = BatchWriter(NFCAccessLog)
+emergency_access_writer = EmergencyAccessWriter(NFCEmergencyAccess)
+
+
+def _emergency_access(data_accessed, fields):
+    access = NFCEmergencyAccess(**fields)
+    if data_accessed:
+        access.snapshot = NFCEmergencySnapshot.for_data(data_accessed)
+    return access
+
+
+def _offer(writer, obj):
+    # Never touch the database from the event loop: a record that cannot be
+    # queued is written from a worker thread instead
+    if not writer.offer(obj):
+        run_detached(writer.add, obj)
+
+
+def _count_scan(fields):
+    if fields.get('access_type') == 'SCAN':
+        record_scan_outcome(fields.get('status'))
+
+
+def log_access(**fields):
+    """Queue an NFCAccessLog record"""
+    _count_scan(fields)
+    access_log_writer.add(NFCAccessLog(**fields))
+
+
+def log_emergency_access(data_accessed=None, **fields):
+    """Queue an NFCEmergencyAccess record referencing a snapshot of data_accessed"""
+    emergency_access_writer.add(_emergency_access(data_accessed, fields))
+
+
+def log_access_nowait(**fields):
+    """log_access() for async views"""
+    _count_scan(fields)
+    _offer(access_log_writer, NFCAccessLog(**fields))
+
+
+def log_emergency_access_nowait(data_accessed=None, **fields):
+    """log_emergency_access() for async views"""
+    _offer(emergency_access_writer, _emergency_access(data_accessed, fields))
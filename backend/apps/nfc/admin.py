@@ -2,17 +2,26 @@
 Admin configuration for NFC app
 """
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
+from apps.core.changelist import LargeTableAdminMixin, RecentDateFieldListFilter
+from apps.core.replicas import ReplicaChangeListMixin
 from .models import NFCTag, NFCAccessLog, NFCEmergencyAccess
+from .resolution import invalidate_tags
+from .revocation import publish_tag_status
+
+REVOKE_BATCH_SIZE = 1000
 
 
 @admin.register(NFCTag)
-class NFCTagAdmin(admin.ModelAdmin):
+class NFCTagAdmin(ReplicaChangeListMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'tag_uid', 'user', 'status', 'scan_count',
         'last_scanned_at', 'registered_at'
     )
+    list_select_related = ('user',)
     list_filter = ('status', 'tag_type', 'registered_at')
-    search_fields = ('tag_uid', 'user__email', 'user__first_name', 'user__last_name')
+    search_fields = ('tag_uid', 'user__email')
     readonly_fields = (
         'registered_at', 'last_scanned_at', 'scan_count',
         'created_at', 'updated_at', 'revoked_at'
@@ -39,29 +48,39 @@ class NFCTagAdmin(admin.ModelAdmin):
     actions = ['revoke_tags']
 
     def revoke_tags(self, request, queryset):
-        """Revoke selected tags"""
-        count = 0
-        for tag in queryset:
-            if tag.is_active:
-                tag.revoke(reason='Revoked by admin')
-                count += 1
-
-        self.message_user(request, f'{count} метка(и) отозвана(ы)')
+        """Revoke selected active tags with set-based updates"""
+        now = timezone.now()
+        with transaction.atomic():
+            tags = list(
+                queryset.select_related(None).select_for_update()
+                .filter(status='ACTIVE').values_list('id', 'tag_uid')
+            )
+            for start in range(0, len(tags), REVOKE_BATCH_SIZE):
+                NFCTag.objects.filter(
+                    id__in=[tag_id for tag_id, _ in tags[start:start + REVOKE_BATCH_SIZE]]
+                ).update(status='REVOKED', revoked_at=now, revoked_reason='Revoked by admin', updated_at=now)
+            # update() sends no signals: drop cached resolutions and publish the revocations here
+            transaction.on_commit(lambda: self._after_revoke(tags))
+
+        self.message_user(request, f'{len(tags)} метка(и) отозвана(ы)')
+
+    def _after_revoke(self, tags):
+        invalidate_tags([tag_uid for _, tag_uid in tags])
+        for tag_id, tag_uid in tags:
+            publish_tag_status(tag_id, 'REVOKED', tag_uid)
 
     revoke_tags.short_description = 'Отозвать выбранные метки'
 
 
 @admin.register(NFCAccessLog)
-class NFCAccessLogAdmin(admin.ModelAdmin):
+class NFCAccessLogAdmin(ReplicaChangeListMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'nfc_tag', 'accessed_by', 'access_type',
         'status', 'ip_address', 'accessed_at'
     )
-    list_filter = ('access_type', 'status', 'accessed_at')
-    search_fields = (
-        'nfc_tag__tag_uid', 'accessed_by__email',
-        'ip_address', 'error_message'
-    )
+    list_select_related = ('nfc_tag__user', 'accessed_by')
+    list_filter = (('accessed_at', RecentDateFieldListFilter), 'access_type', 'status')
+    search_fields = ('nfc_tag__tag_uid', 'accessed_by__email', 'ip_address')
     readonly_fields = (
         'nfc_tag', 'accessed_by', 'access_type', 'status',
         'ip_address', 'user_agent', 'device_info',
@@ -94,20 +113,18 @@ class NFCAccessLogAdmin(admin.ModelAdmin):
 
 
 @admin.register(NFCEmergencyAccess)
-class NFCEmergencyAccessAdmin(admin.ModelAdmin):
+class NFCEmergencyAccessAdmin(ReplicaChangeListMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         'nfc_tag', 'medical_worker', 'accessed_at',
         'ip_address'
     )
-    list_filter = ('accessed_at',)
-    search_fields = (
-        'nfc_tag__tag_uid', 'medical_worker__email',
-        'ip_address', 'access_notes'
-    )
+    list_select_related = ('nfc_tag__user', 'medical_worker')
+    list_filter = (('accessed_at', RecentDateFieldListFilter),)
+    search_fields = ('nfc_tag__tag_uid', 'medical_worker__email', 'ip_address')
     readonly_fields = (
         'nfc_tag', 'medical_worker', 'accessed_at',
         'ip_address', 'device_info', 'latitude',
-        'longitude', 'data_accessed', 'access_notes'
+        'longitude', 'snapshot', 'accessed_data', 'access_notes'
     )
 
     fieldsets = (
@@ -121,7 +138,7 @@ class NFCEmergencyAccessAdmin(admin.ModelAdmin):
             'fields': ('latitude', 'longitude')
         }),
         ('Данные', {
-            'fields': ('data_accessed', 'access_notes')
+            'fields': ('snapshot', 'accessed_data', 'access_notes')
         }),
         ('Время', {
             'fields': ('accessed_at',)
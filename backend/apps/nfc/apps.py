@@ -5,3 +5,6 @@ class NfcConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.nfc'
     verbose_name = 'NFC Метки'
+
+    def ready(self):
+        from . import signals  # noqa: F401
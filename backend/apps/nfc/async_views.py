@@ -0,0 +1,202 @@
+"""
+Async views for the emergency scan path
+
+Same requests and responses as NFCTagScanView and NFCEmergencyDataView,
+for ASGI workers (enabled with NFC_ASYNC_SCAN). Tag resolution and the
+emergency profile payload use the async ORM and cache calls; scan
+counters and access logs are fire-and-forget and never hold the response.
+DRF views are sync only, so authentication, throttling (with the sync
+views' throttle classes) and body parsing run in a single thread hop.
+"""
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions, serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from apps.audit.detection import record_failed_scan
+from apps.core.background import run_detached
+from apps.core.ip import get_client_ip
+from apps.profiles.cache import aget_emergency_profile_data
+from .access_logs import log_access_nowait, log_emergency_access_nowait
+from .counters import record_scan
+from .resolution import aresolve_tag, aresolve_tag_id
+from .serializers import NFCTagScanSerializer
+from .throttling import EMERGENCY_THROTTLES, SCAN_THROTTLES, TagEnumerationThrottle, scanned_tag
+from .tokens import record_rejected_scan
+
+
+def _response(data, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def _error_response(exc):
+    headers = {}
+    if isinstance(exc, exceptions.Throttled) and exc.wait is not None:
+        headers['Retry-After'] = '%d' % exc.wait
+    if isinstance(exc, (exceptions.AuthenticationFailed, exceptions.NotAuthenticated)):
+        headers['WWW-Authenticate'] = 'Bearer realm="api"'
+    if isinstance(exc, exceptions.ValidationError):
+        data = serializers.as_serializer_error(exc)
+    elif isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    return _response(data, exc.status_code, headers)
+
+
+def _initial(request, throttle_classes, view_kwargs, parse_body):
+    """DRF request with the user authenticated, throttles checked and (optionally) the body parsed"""
+    request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    request.user
+    # Throttles only look at the view's URL kwargs
+    view = SimpleNamespace(kwargs=view_kwargs)
+    for throttle in throttle_classes:
+        throttle = throttle()
+        if not throttle.allow_request(request, view):
+            raise exceptions.Throttled(throttle.wait())
+    if parse_body:
+        request.data
+    return request
+
+
+def _log_access(request, nfc_tag_id, log_status, error_message=''):
+    log_access_nowait(
+        nfc_tag_id=nfc_tag_id,
+        accessed_by=request.user if request.user.is_authenticated else None,
+        access_type='SCAN',
+        status=log_status,
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        error_message=error_message
+    )
+
+
+async def scan_tag(request):
+    """Scan NFC tag and get emergency medical data"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        request = await sync_to_async(_initial)(request, SCAN_THROTTLES, {}, True)
+    except exceptions.APIException as e:
+        return _error_response(e)
+
+    serializer = NFCTagScanSerializer(data=request.data, context={'defer_tag_lookup': True})
+    try:
+        serializer.is_valid(raise_exception=True)
+        attrs = serializer.validated_data
+        if attrs.get('claims'):
+            tag = await aresolve_tag_id(attrs['claims'].tag_id)
+        else:
+            tag = await aresolve_tag(attrs['tag_uid'])
+        tag = serializer.check_tag(tag, attrs)
+    except serializers.ValidationError as e:
+        run_detached(record_failed_scan, request, scanned_tag(request.data))
+        if serializer.token_rejected:
+            # Forged or corrupted tokens are only counted, not logged one by one
+            run_detached(
+                record_rejected_scan,
+                get_client_ip(request),
+                'invalid_signature',
+                request.META.get('HTTP_USER_AGENT', '')
+            )
+        else:
+            _log_access(request, None, 'FAILED', str(e))
+        return _error_response(e)
+
+    run_detached(record_scan, tag.id)
+
+    if not tag.has_profile:
+        _log_access(request, tag.id, 'FAILED', 'Medical profile not found')
+        return _response({'error': 'Медицинский профиль не найден'}, status.HTTP_404_NOT_FOUND)
+
+    if not tag.is_public:
+        _log_access(request, tag.id, 'DENIED', 'Profile is private')
+        return _response({'error': 'Пользователь отключил экстренный доступ'}, status.HTTP_403_FORBIDDEN)
+
+    profile_data = await aget_emergency_profile_data(tag.profile_id)
+
+    _log_access(request, tag.id, 'SUCCESS')
+    log_emergency_access_nowait(
+        nfc_tag_id=tag.id,
+        medical_worker=request.user if request.user.is_authenticated else None,
+        ip_address=get_client_ip(request),
+        device_info=request.META.get('HTTP_USER_AGENT', ''),
+        latitude=attrs.get('latitude'),
+        longitude=attrs.get('longitude'),
+        data_accessed=profile_data
+    )
+
+    return _response({
+        'profile': profile_data,
+        'message': 'Успешный доступ к экстренным медицинским данным'
+    })
+
+
+async def emergency_data(request, tag_uid):
+    """Get emergency medical data by NFC tag UID (for QR code access)"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    try:
+        request = await sync_to_async(_initial)(request, EMERGENCY_THROTTLES, {'tag_uid': tag_uid}, False)
+    except exceptions.APIException as e:
+        return _error_response(e)
+
+    tag = await aresolve_tag(tag_uid)
+    if tag is None:
+        run_detached(TagEnumerationThrottle.record_miss, request)
+        run_detached(record_failed_scan, request, tag_uid)
+        return _error_response(exceptions.NotFound())
+
+    if not tag.is_active:
+        _log_access(request, tag.id, 'DENIED', 'Tag is not active')
+        return _response({'error': 'NFC tag inactive'}, status.HTTP_403_FORBIDDEN)
+
+    run_detached(record_scan, tag.id)
+
+    if not tag.has_profile:
+        _log_access(request, tag.id, 'FAILED', 'Medical profile not found')
+        return _response({'error': 'Profile not found'}, status.HTTP_404_NOT_FOUND)
+
+    if not tag.is_public:
+        _log_access(request, tag.id, 'DENIED', 'Profile is private')
+        return _response({'error': 'Access denied'}, status.HTTP_403_FORBIDDEN)
+
+    profile_data = await aget_emergency_profile_data(tag.profile_id)
+
+    _log_access(request, tag.id, 'SUCCESS')
+    log_emergency_access_nowait(
+        nfc_tag_id=tag.id,
+        medical_worker=request.user if request.user.is_authenticated else None,
+        ip_address=get_client_ip(request),
+        device_info=request.META.get('HTTP_USER_AGENT', ''),
+        data_accessed=profile_data
+    )
+
+    return _response({
+        'user': {'full_name': tag.get_user_full_name(), 'first_name': tag.user_first_name, 'last_name': tag.user_last_name},
+        'profile': profile_data,
+        'tag': {'name': 'Tag ' + tag.tag_uid[:8], 'uid': str(tag.tag_uid)},
+        'allergies': profile_data.get('allergies', []),
+        'diseases': profile_data.get('chronic_diseases', []),
+        'medications': profile_data.get('medications', []),
+        'emergency_contacts': profile_data.get('emergency_contacts', []),
+    })
+
+
+# Like APIView: token authenticated, no session CSRF. csrf_exempt() itself
+# would wrap the coroutine in a sync function.
+scan_tag.csrf_exempt = True
+emergency_data.csrf_exempt = True
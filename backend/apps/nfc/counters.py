@@ -0,0 +1,152 @@
+"""
+Scan counters for NFC tags
+
+Scans increment a Redis hash (tag id -> pending scans) and raise a sorted
+set score (tag id -> latest scan time) instead of updating the nfc_tags
+row. flush_scan_counters() periodically folds the pending values into
+nfc_tags with batched UPDATEs in one transaction.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.redis import get_redis
+from .models import NFCTag
+
+logger = logging.getLogger(__name__)
+
+SCAN_COUNTS_KEY = 'nfc:scan_counts'
+LAST_SCANNED_KEY = 'nfc:last_scanned'
+
+FLUSH_CHUNK_SIZE = 1000
+
+
+def record_scan(tag_id, scanned_at=None):
+    """Count one scan of a tag"""
+    scanned_at = scanned_at or timezone.now()
+
+    client = get_redis()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hincrby(SCAN_COUNTS_KEY, str(tag_id), 1)
+            pipe.zadd(LAST_SCANNED_KEY, {str(tag_id): scanned_at.timestamp()}, gt=True)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.warning('Scan counter write failed, updating row directly: %s', e)
+
+    NFCTag.objects.filter(id=tag_id).update(
+        last_scanned_at=scanned_at,
+        scan_count=F('scan_count') + 1
+    )
+
+
+def pending_scans(tag_ids):
+    """Unflushed (scan_count delta, last_scanned_at) per tag id"""
+    tag_ids = [str(tag_id) for tag_id in tag_ids]
+    client = get_redis()
+    if client is None or not tag_ids:
+        return {}
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hmget(SCAN_COUNTS_KEY, tag_ids)
+        pipe.zmscore(LAST_SCANNED_KEY, tag_ids)
+        counts, timestamps = pipe.execute()
+    except Exception as e:
+        logger.warning('Scan counter read failed: %s', e)
+        return {}
+
+    pending = {}
+    for tag_id, count, ts in zip(tag_ids, counts, timestamps):
+        if count is None and ts is None:
+            continue
+        pending[tag_id] = (int(count or 0), _from_timestamp(ts))
+    return pending
+
+
+def flush_scan_counters():
+    """Move pending scan counts from Redis into nfc_tags; returns tags updated"""
+    client = get_redis()
+    if client is None:
+        return 0
+
+    # Read and clear atomically so concurrent scans land in the next flush
+    pipe = client.pipeline(transaction=True)
+    pipe.hgetall(SCAN_COUNTS_KEY)
+    pipe.zrange(LAST_SCANNED_KEY, 0, -1, withscores=True)
+    pipe.delete(SCAN_COUNTS_KEY, LAST_SCANNED_KEY)
+    counts, timestamps, _ = pipe.execute()
+
+    rows = {}
+    for tag_id, count in counts.items():
+        rows[tag_id.decode()] = [int(count), None]
+    for tag_id, ts in timestamps:
+        rows.setdefault(tag_id.decode(), [0, None])[1] = _from_timestamp(ts)
+
+    if not rows:
+        return 0
+
+    try:
+        # All chunks or none, so a restore never re-adds scans already counted
+        with transaction.atomic():
+            _apply(rows)
+    except Exception:
+        _restore(client, rows)
+        raise
+
+    return len(rows)
+
+
+def _apply(rows):
+    items = list(rows.items())
+
+    if connection.vendor != 'postgresql':
+        for tag_id, (delta, last_scanned_at) in items:
+            updates = {'scan_count': F('scan_count') + delta}
+            if last_scanned_at is not None:
+                updates['last_scanned_at'] = last_scanned_at
+            NFCTag.objects.filter(id=tag_id).update(**updates)
+        return
+
+    table = NFCTag._meta.db_table
+    for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+        chunk = items[start:start + FLUSH_CHUNK_SIZE]
+        values = ', '.join(['(%s::uuid, %s::integer, %s::timestamptz)'] * len(chunk))
+        params = []
+        for tag_id, (delta, last_scanned_at) in chunk:
+            params.extend([tag_id, delta, last_scanned_at])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} AS t '
+                f'SET scan_count = t.scan_count + v.delta, '
+                f'last_scanned_at = GREATEST(t.last_scanned_at, v.last_scanned_at) '
+                f'FROM (VALUES {values}) AS v(id, delta, last_scanned_at) '
+                f'WHERE t.id = v.id',
+                params
+            )
+
+
+def _restore(client, rows):
+    """Put increments back after a failed flush so they are not lost"""
+    try:
+        pipe = client.pipeline(transaction=False)
+        for tag_id, (delta, last_scanned_at) in rows.items():
+            if delta:
+                pipe.hincrby(SCAN_COUNTS_KEY, tag_id, delta)
+            if last_scanned_at is not None:
+                pipe.zadd(LAST_SCANNED_KEY, {tag_id: last_scanned_at.timestamp()}, gt=True)
+        pipe.execute()
+    except Exception:
+        logger.exception('Could not restore %d pending scan counters', len(rows))
+
+
+def _from_timestamp(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(float(ts), tz=dt_timezone.utc)
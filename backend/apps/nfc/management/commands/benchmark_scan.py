@@ -0,0 +1,125 @@
+"""
+Measure scan endpoint latency with and without persistent DB connections
+"""
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from apps.authentication.models import User
+from apps.core.buffer import close_all
+from apps.nfc.models import NFCTag, NFCAccessLog, compute_checksum
+from apps.nfc.views import NFCTagScanView
+from apps.profiles.models import MedicalProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Send scan requests through the full Django request cycle and report latency '
+        'for CONN_MAX_AGE=0 and for the configured persistent connection settings. '
+        'A throwaway user, profile and tag are created and removed afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per mode')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per mode')
+        parser.add_argument(
+            '--conn-max-age',
+            type=int,
+            help='CONN_MAX_AGE for the persistent run (default: the configured value, or 600 if that is 0)'
+        )
+
+    def handle(self, *args, **options):
+        persistent_age = options['conn_max_age']
+        if persistent_age is None:
+            persistent_age = connection.settings_dict['CONN_MAX_AGE'] or 600
+
+        user, tag = self._create_fixture()
+        # Scans must not be throttled while measuring
+        throttle_classes = NFCTagScanView.throttle_classes
+        NFCTagScanView.throttle_classes = []
+        try:
+            for label, age in (('CONN_MAX_AGE=0', 0), (f'CONN_MAX_AGE={persistent_age}', persistent_age)):
+                latencies, connects = self._run(tag, age, options['warmup'], options['requests'])
+                self._report(label, latencies, connects)
+        finally:
+            NFCTagScanView.throttle_classes = throttle_classes
+            close_all()
+            NFCAccessLog.objects.filter(nfc_tag=tag).delete()
+            user.delete()
+
+    def _create_fixture(self):
+        user = User.objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex[:12]}@example.invalid',
+            password=None,
+            first_name='Benchmark',
+            last_name='Scan'
+        )
+        MedicalProfile.objects.create(user=user, is_public=True)
+        tag_uid = f'BENCH-{uuid.uuid4().hex}'
+        public_key_id = str(uuid.uuid4())
+        tag = NFCTag.objects.create(
+            user=user,
+            tag_uid=tag_uid,
+            public_key_id=public_key_id,
+            checksum=compute_checksum(f'{tag_uid}{public_key_id}')
+        )
+        return user, tag
+
+    def _run(self, tag, conn_max_age, warmup, requests):
+        connection.close()
+        original_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+        connects = []
+
+        def count_connect(sender, **kwargs):
+            connects.append(1)
+
+        connection_created.connect(count_connect)
+        try:
+            handler = WSGIHandler()
+            factory = RequestFactory()
+            host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+            body = {'tag_uid': tag.tag_uid, 'public_key_id': tag.public_key_id, 'checksum': tag.checksum}
+
+            latencies = []
+            for number in range(warmup + requests):
+                if number == warmup:
+                    connects.clear()
+                environ = factory.post(
+                    '/api/nfc/scan/', body, content_type='application/json', secure=True, HTTP_HOST=host
+                ).environ
+                started = time.perf_counter()
+                response = handler(environ, lambda status, headers, exc_info=None: None)
+                b''.join(response)
+                # Fires request_finished, which closes or keeps the connection
+                response.close()
+                if number >= warmup:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f'Scan returned {response.status_code}')
+        finally:
+            connection_created.disconnect(count_connect)
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = original_age
+
+        return latencies, len(connects)
+
+    def _report(self, label, latencies, connects):
+        latencies = sorted(latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        self.stdout.write(
+            f'{label:<20} mean {statistics.mean(latencies):7.2f} ms  '
+            f'p50 {percentile(0.5):7.2f} ms  p95 {percentile(0.95):7.2f} ms  '
+            f'p99 {percentile(0.99):7.2f} ms  new connections {connects}'
+        )
@@ -0,0 +1,51 @@
+"""
+Move inline emergency access data into deduplicated snapshots
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.nfc.models import NFCEmergencyAccess, NFCEmergencySnapshot
+
+
+class Command(BaseCommand):
+    help = 'Replace inline NFCEmergencyAccess.data_accessed copies with references to shared snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Accesses converted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = NFCEmergencyAccess.objects.filter(snapshot__isnull=True).exclude(data_accessed={}).order_by('id')
+
+        moved = 0
+        last_id = None
+        while True:
+            batch = pending if last_id is None else pending.filter(id__gt=last_id)
+            rows = list(batch.values_list('id', 'data_accessed')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            snapshots = {}
+            accesses = []
+            for access_id, data in rows:
+                snapshot = NFCEmergencySnapshot.for_data(data)
+                snapshots.setdefault(snapshot.content_hash, snapshot)
+                accesses.append(NFCEmergencyAccess(id=access_id, snapshot_id=snapshot.content_hash, data_accessed={}))
+
+            with transaction.atomic():
+                NFCEmergencySnapshot.objects.bulk_create(snapshots.values(), ignore_conflicts=True)
+                NFCEmergencyAccess.objects.bulk_update(accesses, ['snapshot', 'data_accessed'])
+
+            moved += len(rows)
+            self.stdout.write(f'Moved {moved} accesses')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} accesses moved, {NFCEmergencySnapshot.objects.count()} distinct snapshots stored. '
+            f'Run VACUUM FULL nfc_emergency_accesses to return the freed space to the OS.'
+        ))
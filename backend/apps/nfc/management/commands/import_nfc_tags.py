@@ -0,0 +1,82 @@
+"""
+Register NFC tags in bulk from a CSV or JSON file
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.authentication.models import User
+from apps.nfc.provisioning import FORMATS, ProvisioningError, provision_tags, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Register NFC tags from CSV (tag_uid, tag_type, user_email columns) or JSON '
+        '(one object per line or an array) and write one NDJSON result per row'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or - for stdin')
+        parser.add_argument(
+            '--format',
+            dest='input_format',
+            choices=FORMATS,
+            help='Input format (default: from the file extension, json for stdin)'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the owner for rows without user_email'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write results here instead of stdout'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Rows inserted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['input_format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+
+        owner = None
+        if options['user']:
+            owner = User.objects.filter(email=options['user']).first()
+            if owner is None:
+                raise CommandError(f'User {options["user"]} not found')
+
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else self.stdout
+
+        created = failed = 0
+        try:
+            results = provision_tags(
+                read_rows(source, input_format),
+                owner=owner,
+                allow_other_owners=True,
+                chunk_size=options['chunk_size'],
+                log_fields={'ip_address': '127.0.0.1', 'user_agent': 'manage.py import_nfc_tags'}
+            )
+            for result in results:
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                if result['status'] == 'created':
+                    created += 1
+                else:
+                    failed += 1
+        except ProvisioningError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if options['output']:
+                output.close()
+
+        summary = f'{created} tags registered, {failed} rows rejected'
+        if failed:
+            self.stderr.write(self.style.WARNING(summary))
+        else:
+            self.stderr.write(self.style.SUCCESS(summary))
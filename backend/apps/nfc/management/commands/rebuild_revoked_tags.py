@@ -0,0 +1,21 @@
+"""
+Reseed the shared revoked tag set from the database
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.redis import get_redis
+from apps.nfc.models import NFCTag
+from apps.nfc.revocation import seed
+
+
+class Command(BaseCommand):
+    help = 'Replace the revoked tag set in Redis with the inactive tags stored in the database'
+
+    def handle(self, *args, **options):
+        client = get_redis()
+        if client is None:
+            raise CommandError('The default cache is not Redis; the revoked tag set is disabled')
+
+        seed(client, force=True)
+        count = NFCTag.objects.exclude(status='ACTIVE').count()
+        self.stdout.write(self.style.SUCCESS(f'Revoked tag set rebuilt with {count} tags'))
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.9 on 2026-10-18 01:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NFCTag',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tag_uid', models.CharField(max_length=255, unique=True, verbose_name='UID метки')),
+                ('tag_type', models.CharField(default='NTAG215', max_length=50, verbose_name='Тип метки')),
+                ('public_key_id', models.CharField(max_length=255, unique=True, verbose_name='ID публичного ключа')),
+                ('checksum', models.CharField(max_length=255, verbose_name='Контрольная сумма')),
+                ('status', models.CharField(choices=[('ACTIVE', 'Активна'), ('REVOKED', 'Отозвана'), ('LOST', 'Утеряна'), ('REPLACED', 'Заменена')], default='ACTIVE', max_length=20, verbose_name='Статус')),
+                ('registered_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата регистрации')),
+                ('last_scanned_at', models.DateTimeField(blank=True, null=True, verbose_name='Последнее сканирование')),
+                ('scan_count', models.PositiveIntegerField(default=0, verbose_name='Количество сканирований')),
+                ('revoked_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отзыва')),
+                ('revoked_reason', models.TextField(blank=True, verbose_name='Причина отзыва')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nfc_tags', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'NFC Метка',
+                'verbose_name_plural': 'NFC Метки',
+                'db_table': 'nfc_tags',
+                'ordering': ['-registered_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NFCEmergencyAccess',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('accessed_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Время доступа')),
+                ('ip_address', models.GenericIPAddressField(verbose_name='IP адрес')),
+                ('device_info', models.CharField(blank=True, max_length=255, verbose_name='Информация об устройстве')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Широта')),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Долгота')),
+                ('data_accessed', models.JSONField(default=dict, verbose_name='Данные, к которым получен доступ')),
+                ('access_notes', models.TextField(blank=True, verbose_name='Заметки о доступе')),
+                ('medical_worker', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emergency_accesses', to=settings.AUTH_USER_MODEL, verbose_name='Медработник')),
+                ('nfc_tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emergency_accesses', to='nfc.nfctag', verbose_name='NFC Метка')),
+            ],
+            options={
+                'verbose_name': 'Экстренный доступ через NFC',
+                'verbose_name_plural': 'Экстренные доступы через NFC',
+                'db_table': 'nfc_emergency_accesses',
+                'ordering': ['-accessed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NFCAccessLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('access_type', models.CharField(choices=[('SCAN', 'Сканирование'), ('REGISTER', 'Регистрация'), ('REVOKE', 'Отзыв')], max_length=20, verbose_name='Тип доступа')),
+                ('status', models.CharField(choices=[('SUCCESS', 'Успешно'), ('FAILED', 'Неудачно'), ('DENIED', 'Отклонено')], max_length=20, verbose_name='Статус')),
+                ('ip_address', models.GenericIPAddressField(verbose_name='IP адрес')),
+                ('user_agent', models.CharField(blank=True, max_length=500, verbose_name='User Agent')),
+                ('device_info', models.CharField(blank=True, max_length=255, verbose_name='Информация об устройстве')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Широта')),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Долгота')),
+                ('error_message', models.TextField(blank=True, verbose_name='Сообщение об ошибке')),
+                ('accessed_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Время доступа')),
+                ('accessed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='nfc_accesses', to=settings.AUTH_USER_MODEL, verbose_name='Доступ получил')),
+                ('nfc_tag', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='access_logs', to='nfc.nfctag', verbose_name='NFC Метка')),
+            ],
+            options={
+                'verbose_name': 'Лог доступа к NFC',
+                'verbose_name_plural': 'Логи доступа к NFC',
+                'db_table': 'nfc_access_logs',
+                'ordering': ['-accessed_at'],
+                'indexes': [models.Index(fields=['nfc_tag', '-accessed_at'], name='nfc_access__nfc_tag_37537a_idx'), models.Index(fields=['accessed_by', '-accessed_at'], name='nfc_access__accesse_7faaf3_idx'), models.Index(fields=['ip_address', '-accessed_at'], name='nfc_access__ip_addr_657623_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,14 @@
+# Converting nfc_access_logs to monthly range partitions copies every row, so
+# it is no longer done here during migrate: run
+# "python manage.py partition_log_tables" (see docs/DEPLOYMENT.md).
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nfc', '0001_initial'),
+    ]
+
+    operations = []
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nfc', '0002_partition_access_logs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nfcaccesslog',
+            index=models.Index(fields=['-accessed_at', '-id'], name='nfc_access__accesse_31a81c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nfcemergencyaccess',
+            index=models.Index(fields=['nfc_tag', '-accessed_at'], name='nfc_emergen_nfc_tag_8cd41b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nfcemergencyaccess',
+            index=models.Index(fields=['-accessed_at', '-id'], name='nfc_emergen_accesse_f7f34e_idx'),
+        ),
+    ]
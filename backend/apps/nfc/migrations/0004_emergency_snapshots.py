@@ -0,0 +1,37 @@
+# Generated by Django 4.2.9 on 2026-10-18 01:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nfc', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NFCEmergencySnapshot',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Хеш содержимого')),
+                ('data', models.JSONField(verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Снимок экстренных данных',
+                'verbose_name_plural': 'Снимки экстренных данных',
+                'db_table': 'nfc_emergency_snapshots',
+            },
+        ),
+        migrations.AlterField(
+            model_name='nfcemergencyaccess',
+            name='data_accessed',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Данные, к которым получен доступ'),
+        ),
+        migrations.AddField(
+            model_name='nfcemergencyaccess',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='accesses', to='nfc.nfcemergencysnapshot', verbose_name='Снимок данных'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nfc', '0004_emergency_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='nfcaccesslog',
+            name='access_type',
+            field=models.CharField(choices=[('SCAN', 'Сканирование'), ('REGISTER', 'Регистрация'), ('REVOKE', 'Отзыв'), ('REISSUE', 'Перевыпуск ключа')], max_length=20, verbose_name='Тип доступа'),
+        ),
+    ]
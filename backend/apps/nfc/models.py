@@ -1,12 +1,31 @@
 """
 NFC models for NFC Medical Platform
 """
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 import uuid
 import hashlib
 import hmac
+import json
+
+
+def compute_checksum(data):
+    """HMAC-SHA256 checksum of tag data"""
+    secret = settings.NFC_ENCRYPTION_KEY.encode()
+    return hmac.new(secret, data.encode(), hashlib.sha256).hexdigest()
+
+
+def checksum_matches(data, checksum):
+    """Constant-time comparison of tag data against a stored checksum"""
+    return hmac.compare_digest(compute_checksum(data), checksum)
+
+
+def snapshot_hash(data):
+    """SHA-256 of the canonical JSON form of emergency data"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, cls=DjangoJSONEncoder)
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
 
 class NFCTag(models.Model):
@@ -70,21 +89,25 @@ class NFCTag(models.Model):
 
     def verify_checksum(self, data):
         """Verify checksum using HMAC"""
-        secret = settings.NFC_ENCRYPTION_KEY.encode()
-        expected_checksum = hmac.new(secret, data.encode(), hashlib.sha256).hexdigest()
-        return hmac.compare_digest(expected_checksum, self.checksum)
+        return checksum_matches(data, self.checksum)
 
     def generate_checksum(self, data):
         """Generate checksum using HMAC"""
-        secret = settings.NFC_ENCRYPTION_KEY.encode()
-        return hmac.new(secret, data.encode(), hashlib.sha256).hexdigest()
+        return compute_checksum(data)
 
     def revoke(self, reason=''):
         """Revoke the NFC tag"""
         self.status = 'REVOKED'
         self.revoked_at = timezone.now()
         self.revoked_reason = reason
-        self.save()
+        # Don't overwrite scan statistics updated concurrently by the scan path
+        self.save(update_fields=['status', 'revoked_at', 'revoked_reason', 'updated_at'])
+
+    def reissue_key(self):
+        """New public key id and checksum; payloads and tokens written before stop verifying"""
+        self.public_key_id = str(uuid.uuid4())
+        self.checksum = compute_checksum(f"{self.tag_uid}{self.public_key_id}")
+        self.save(update_fields=['public_key_id', 'checksum', 'updated_at'])
 
 
 class NFCAccessLog(models.Model):
@@ -94,6 +117,7 @@ class NFCAccessLog(models.Model):
         ('SCAN', 'Сканирование'),
         ('REGISTER', 'Регистрация'),
         ('REVOKE', 'Отзыв'),
+        ('REISSUE', 'Перевыпуск ключа'),
     )
 
     STATUS_CHOICES = (
@@ -154,7 +178,8 @@ class NFCAccessLog(models.Model):
     # Error info
     error_message = models.TextField(blank=True, verbose_name='Сообщение об ошибке')
 
-    accessed_at = models.DateTimeField(auto_now_add=True, verbose_name='Время доступа')
+    # Set when the record is queued, not when the buffered writer inserts it
+    accessed_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Время доступа')
 
     class Meta:
         db_table = 'nfc_access_logs'
@@ -165,12 +190,34 @@ class NFCAccessLog(models.Model):
             models.Index(fields=['nfc_tag', '-accessed_at']),
             models.Index(fields=['accessed_by', '-accessed_at']),
             models.Index(fields=['ip_address', '-accessed_at']),
+            models.Index(fields=['-accessed_at', '-id']),
         ]
 
     def __str__(self):
         return f"{self.get_access_type_display()} - {self.get_status_display()} at {self.accessed_at}"
 
 
+class NFCEmergencySnapshot(models.Model):
+    """Emergency data as seen during an access, stored once per distinct content"""
+
+    content_hash = models.CharField(max_length=64, primary_key=True, verbose_name='Хеш содержимого')
+    data = models.JSONField(verbose_name='Данные')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+
+    class Meta:
+        db_table = 'nfc_emergency_snapshots'
+        verbose_name = 'Снимок экстренных данных'
+        verbose_name_plural = 'Снимки экстренных данных'
+
+    def __str__(self):
+        return f"Snapshot {self.content_hash[:12]}"
+
+    @classmethod
+    def for_data(cls, data):
+        """Unsaved snapshot of data, addressed by its content hash"""
+        return cls(content_hash=snapshot_hash(data), data=data)
+
+
 class NFCEmergencyAccess(models.Model):
     """Emergency access to medical profile via NFC"""
 
@@ -190,7 +237,8 @@ class NFCEmergencyAccess(models.Model):
     )
 
     # Access details
-    accessed_at = models.DateTimeField(auto_now_add=True, verbose_name='Время доступа')
+    # Set when the record is queued, not when the buffered writer inserts it
+    accessed_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Время доступа')
     ip_address = models.GenericIPAddressField(verbose_name='IP адрес')
     device_info = models.CharField(max_length=255, blank=True, verbose_name='Информация об устройстве')
 
@@ -210,8 +258,17 @@ class NFCEmergencyAccess(models.Model):
         verbose_name='Долгота'
     )
 
-    # Accessed data snapshot (JSON)
-    data_accessed = models.JSONField(default=dict, verbose_name='Данные, к которым получен доступ')
+    # Accessed data snapshot, shared by every access that saw the same data
+    snapshot = models.ForeignKey(
+        NFCEmergencySnapshot,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='accesses',
+        verbose_name='Снимок данных'
+    )
+    # Inline copy, only on rows not yet moved to snapshots by dedupe_emergency_snapshots
+    data_accessed = models.JSONField(default=dict, blank=True, verbose_name='Данные, к которым получен доступ')
 
     # Notes
     access_notes = models.TextField(blank=True, verbose_name='Заметки о доступе')
@@ -221,6 +278,17 @@ class NFCEmergencyAccess(models.Model):
         verbose_name = 'Экстренный доступ через NFC'
         verbose_name_plural = 'Экстренные доступы через NFC'
         ordering = ['-accessed_at']
+        indexes = [
+            models.Index(fields=['nfc_tag', '-accessed_at']),
+            models.Index(fields=['-accessed_at', '-id']),
+        ]
+
+    @property
+    def accessed_data(self):
+        """Emergency data shown during this access"""
+        if self.snapshot_id:
+            return self.snapshot.data
+        return self.data_accessed
 
     def __str__(self):
         worker_name = self.medical_worker.get_full_name() if self.medical_worker else 'Unknown'
@@ -0,0 +1,221 @@
+"""
+Bulk NFC tag provisioning
+
+Rows come from a CSV or JSON stream and are registered in chunks: one
+query finds already registered UIDs, one resolves owners, checksums are
+computed before insert, and tags and their REGISTER access logs are written
+with bulk_create. A result is yielded per row, including the data to write
+on the tag for every created one.
+"""
+import csv
+import itertools
+import json
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from apps.authentication.models import User
+from .models import NFCTag, NFCAccessLog, compute_checksum
+from .resolution import invalidate_tags
+from .tokens import issue_scan_token
+
+FORMATS = ('csv', 'json')
+
+MAX_TAG_UID_LENGTH = NFCTag._meta.get_field('tag_uid').max_length
+MAX_TAG_TYPE_LENGTH = NFCTag._meta.get_field('tag_type').max_length
+DEFAULT_TAG_TYPE = NFCTag._meta.get_field('tag_type').default
+
+
+class ProvisioningError(Exception):
+    """The input stream itself cannot be read"""
+
+
+def read_rows(lines, format):
+    """
+    Yield row dicts from an iterable of text lines
+
+    JSON input is either one object per line or a single array. An array is
+    parsed whole, so callers bound the input size (the bulk view checks
+    Content-Length against NFC_BULK_REGISTER_MAX_BYTES).
+    """
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or 'tag_uid' not in reader.fieldnames:
+            raise ProvisioningError('В CSV нет столбца tag_uid')
+        yield from reader
+        return
+
+    lines = iter(lines)
+    for line in lines:
+        if not line.strip():
+            continue
+        if line.lstrip().startswith('['):
+            try:
+                rows = json.loads(line + ''.join(lines))
+            except ValueError as e:
+                raise ProvisioningError(f'Неверный JSON: {e}')
+            yield from rows
+            return
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ProvisioningError(f'Неверный JSON: {e}')
+
+
+def decode_lines(chunks):
+    """Text lines from an iterable of UTF-8 byte lines"""
+    for number, chunk in enumerate(chunks):
+        try:
+            line = chunk.decode('utf-8')
+        except UnicodeDecodeError:
+            raise ProvisioningError('Данные должны быть в кодировке UTF-8')
+        yield line.lstrip('\ufeff') if number == 0 else line
+
+
+class _Row:
+    """One input row on its way through a chunk"""
+
+    def __init__(self, number, data):
+        self.number = number
+        self.data = data if isinstance(data, dict) else {}
+        self.errors = {} if isinstance(data, dict) else {'row': 'Ожидается объект'}
+        self.tag_uid = str(self.data.get('tag_uid') or '').strip()
+        self.tag_type = str(self.data.get('tag_type') or '').strip() or DEFAULT_TAG_TYPE
+        self.user_email = str(self.data.get('user_email') or '').strip()
+        self.owner_id = None
+        self.tag = None
+
+    def result(self):
+        if self.errors:
+            return {'row': self.number, 'tag_uid': self.tag_uid, 'status': 'error', 'errors': self.errors}
+        return {
+            'row': self.number,
+            'tag_uid': self.tag_uid,
+            'status': 'created',
+            'nfc_data': {
+                'tag_id': str(self.tag.id),
+                'public_key_id': self.tag.public_key_id,
+                'checksum': self.tag.checksum,
+                'token': issue_scan_token(self.tag.id, self.tag.public_key_id),
+            },
+        }
+
+
+def provision_tags(rows, owner=None, allow_other_owners=False, chunk_size=500, max_rows=None, log_fields=None):
+    """
+    Register tags from row dicts and yield one result dict per row
+
+    Rows carry tag_uid, optional tag_type and, when allow_other_owners is
+    set, optional user_email; tags without one belong to owner. Owners
+    must have a medical profile, as for single registration. log_fields
+    are passed to every REGISTER NFCAccessLog.
+    """
+    default_owner = None
+    if owner is not None:
+        default_owner = (owner.id, User.objects.filter(id=owner.id, medical_profile__isnull=False).exists())
+    log_fields = log_fields or {}
+
+    seen = set()
+    numbered = enumerate(rows, start=1)
+    if max_rows is not None:
+        numbered = itertools.islice(numbered, max_rows + 1)
+
+    while True:
+        chunk = [_Row(number, data) for number, data in itertools.islice(numbered, chunk_size)]
+        if not chunk:
+            return
+
+        if max_rows is not None and chunk[-1].number > max_rows:
+            yield from _register_chunk(chunk[:-1], seen, owner, default_owner, allow_other_owners, log_fields)
+            yield {'row': chunk[-1].number, 'status': 'error', 'errors': {'row': f'Не более {max_rows} строк за запрос'}}
+            return
+
+        yield from _register_chunk(chunk, seen, owner, default_owner, allow_other_owners, log_fields)
+
+
+def _register_chunk(chunk, seen, owner, default_owner, allow_other_owners, log_fields):
+    for row in chunk:
+        if row.errors:
+            continue
+        if not row.tag_uid:
+            row.errors['tag_uid'] = 'Обязательное поле.'
+        elif len(row.tag_uid) > MAX_TAG_UID_LENGTH:
+            row.errors['tag_uid'] = f'Не более {MAX_TAG_UID_LENGTH} символов'
+        elif row.tag_uid in seen:
+            row.errors['tag_uid'] = 'Метка повторяется во входных данных'
+        else:
+            seen.add(row.tag_uid)
+        if len(row.tag_type) > MAX_TAG_TYPE_LENGTH:
+            row.errors['tag_type'] = f'Не более {MAX_TAG_TYPE_LENGTH} символов'
+        if row.user_email and not allow_other_owners and (owner is None or row.user_email != owner.email):
+            row.errors['user_email'] = 'Можно регистрировать метки только для себя'
+
+    _resolve_owners(chunk, default_owner)
+
+    pending = [row for row in chunk if not row.errors]
+    if pending:
+        _reject_registered(pending)
+
+    while pending:
+        pending = [row for row in pending if not row.errors]
+        for row in pending:
+            public_key_id = str(uuid.uuid4())
+            row.tag = NFCTag(
+                id=uuid.uuid4(),
+                user_id=row.owner_id,
+                tag_uid=row.tag_uid,
+                tag_type=row.tag_type,
+                public_key_id=public_key_id,
+                checksum=compute_checksum(f'{row.tag_uid}{public_key_id}'),
+            )
+        try:
+            with transaction.atomic():
+                NFCTag.objects.bulk_create([row.tag for row in pending])
+                NFCAccessLog.objects.bulk_create([
+                    NFCAccessLog(nfc_tag_id=row.tag.id, access_type='REGISTER', status='SUCCESS', **log_fields)
+                    for row in pending
+                ])
+        except IntegrityError:
+            # Registered concurrently since the check; drop those rows and retry the rest
+            if not _reject_registered(pending):
+                raise
+            continue
+        break
+
+    pending = [row for row in chunk if row.tag is not None and not row.errors]
+    # bulk_create skips signals; drop cached "unknown tag" answers for the new UIDs
+    tag_uids = [row.tag_uid for row in pending]
+    transaction.on_commit(lambda: invalidate_tags(tag_uids))
+
+    for row in chunk:
+        yield row.result()
+
+
+def _resolve_owners(chunk, default_owner):
+    emails = {row.user_email for row in chunk if row.user_email and not row.errors}
+    owners = {}
+    if emails:
+        for user_id, email, profile_id in User.objects.filter(email__in=emails).values_list(
+            'id', 'email', 'medical_profile__id'
+        ):
+            owners[email] = (user_id, profile_id is not None)
+
+    for row in chunk:
+        if row.errors:
+            continue
+        found = owners.get(row.user_email) if row.user_email else default_owner
+        if found is None:
+            row.errors['user_email'] = 'Пользователь не найден' if row.user_email else 'Обязательное поле.'
+        elif not found[1]:
+            row.errors['user_email'] = 'Сначала создайте медицинский профиль'
+        else:
+            row.owner_id = found[0]
+
+
+def _reject_registered(rows):
+    """Mark rows whose tag_uid is already registered; True if any were"""
+    registered = set(NFCTag.objects.filter(tag_uid__in=[row.tag_uid for row in rows]).values_list('tag_uid', flat=True))
+    for row in rows:
+        if row.tag_uid in registered:
+            row.errors['tag_uid'] = 'Эта метка уже зарегистрирована'
+    return bool(registered)
@@ -0,0 +1,330 @@
+"""
+Tag resolution for the NFC scan path
+
+Resolves a tag_uid to everything the scan endpoints need (tag status,
+checksum, owner and profile visibility) in a single query, memoized in a
+short-lived in-process map backed by the shared Redis cache. Inactive tags
+are answered from the revoked tag set and unknown UIDs are remembered for
+NFC_UNKNOWN_TAG_TIMEOUT seconds, so neither reaches the database. With
+NFC_SCAN_USE_REPLICAS the lookup reads from a replica, except for tags
+invalidated in the last DB_REPLICA_PIN_SECONDS: a lagging replica would
+otherwise put the old row (e.g. a profile still public) back in the cache.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.authentication.models import User
+from apps.core.local_cache import LocalCache
+from apps.core.metrics import record_cache_lookup
+from apps.core.replicas import read_alias
+from .models import NFCTag, checksum_matches
+from .revocation import arevoked_tag, revoked_tag
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_FIELDS = {
+    'id': 'id',
+    'tag_uid': 'tag_uid',
+    'status': 'status',
+    'checksum': 'checksum',
+    'public_key_id': 'public_key_id',
+    'user_id': 'user_id',
+    'user_first_name': 'user__first_name',
+    'user_last_name': 'user__last_name',
+    'user_middle_name': 'user__middle_name',
+    'profile_id': 'user__medical_profile__id',
+    'is_public': 'user__medical_profile__is_public',
+}
+
+STATUS_DISPLAY = dict(NFCTag.STATUS_CHOICES)
+
+# Cached in place of resolution data for tags that do not exist
+UNKNOWN_TAG = '!unknown'
+
+
+@dataclass(frozen=True)
+class ResolvedTag:
+    """Read-only view of a tag and its owner's profile visibility"""
+
+    id: object
+    tag_uid: str
+    status: str
+    checksum: str
+    public_key_id: str
+    user_id: object
+    user_first_name: str
+    user_last_name: str
+    user_middle_name: str
+    profile_id: Optional[object]
+    is_public: Optional[bool]
+
+    @property
+    def is_active(self):
+        return self.status == 'ACTIVE'
+
+    @property
+    def has_profile(self):
+        return self.profile_id is not None
+
+    def get_status_display(self):
+        return STATUS_DISPLAY.get(self.status, self.status)
+
+    def get_user_full_name(self):
+        return User(
+            first_name=self.user_first_name,
+            last_name=self.user_last_name,
+            middle_name=self.user_middle_name,
+        ).get_full_name()
+
+    def verify_checksum(self, data):
+        return checksum_matches(data, self.checksum)
+
+
+_local = LocalCache(settings.NFC_TAG_RESOLUTION_LOCAL_MAX_SIZE)
+
+
+def _cache_key(tag_uid):
+    return f'nfc:tag_resolution:{tag_uid}'
+
+
+def _primary_key(tag_uid):
+    return f'nfc:tag_primary:{tag_uid}'
+
+
+def _scan_alias(tag_uid=None):
+    if not settings.NFC_SCAN_USE_REPLICAS:
+        return DEFAULT_DB_ALIAS
+    if tag_uid is not None:
+        try:
+            changed = cache.get(_primary_key(tag_uid)) is not None
+        except Exception as e:
+            # Unknown: reading from the primary is always correct
+            logger.warning('Tag change marker read failed: %s', e)
+            changed = True
+        if changed:
+            return DEFAULT_DB_ALIAS
+    return read_alias()
+
+
+async def _ascan_alias(tag_uid=None):
+    if not settings.NFC_SCAN_USE_REPLICAS:
+        return DEFAULT_DB_ALIAS
+    if tag_uid is not None:
+        try:
+            changed = await cache.aget(_primary_key(tag_uid)) is not None
+        except Exception as e:
+            logger.warning('Tag change marker read failed: %s', e)
+            changed = True
+        if changed:
+            return DEFAULT_DB_ALIAS
+    return read_alias()
+
+
+def _first(queryset, tag_uid=None):
+    # A tag missing on a replica may just not have replicated yet
+    alias = _scan_alias(tag_uid)
+    row = queryset.using(alias).first()
+    if row is None and alias != DEFAULT_DB_ALIAS:
+        row = queryset.using(DEFAULT_DB_ALIAS).first()
+    return row
+
+
+async def _afirst(queryset, tag_uid=None):
+    alias = await _ascan_alias(tag_uid)
+    row = await queryset.using(alias).afirst()
+    if row is None and alias != DEFAULT_DB_ALIAS:
+        row = await queryset.using(DEFAULT_DB_ALIAS).afirst()
+    return row
+
+
+def _fetch(tag_uid):
+    row = _first(NFCTag.objects.filter(tag_uid=tag_uid).values(*RESOLUTION_FIELDS.values()), tag_uid)
+    if row is None:
+        return None
+    return {name: row[lookup] for name, lookup in RESOLUTION_FIELDS.items()}
+
+
+def _remember(key, value):
+    timeout = settings.NFC_TAG_RESOLUTION_TIMEOUT if value != UNKNOWN_TAG else settings.NFC_UNKNOWN_TAG_TIMEOUT
+    try:
+        cache.set(key, value, timeout=timeout)
+    except Exception as e:
+        logger.warning('Tag resolution cache write failed: %s', e)
+
+
+def resolve_tag(tag_uid):
+    """
+    Resolve tag_uid to a ResolvedTag, or None if the tag does not exist
+
+    Inactive tags in the revoked tag set resolve to a RevokedTag instead.
+    """
+    revoked = revoked_tag(tag_uid=tag_uid)
+    if revoked is not None:
+        record_cache_lookup('nfc_tag', 'local')
+        return revoked
+
+    data = _local.get(tag_uid)
+    tier = 'local'
+
+    if data is None:
+        tier = 'shared'
+        try:
+            data = cache.get(_cache_key(tag_uid))
+        except Exception as e:
+            logger.warning('Tag resolution cache read failed: %s', e)
+
+    if data is None:
+        tier = 'miss'
+        data = _fetch(tag_uid) or UNKNOWN_TAG
+        _remember(_cache_key(tag_uid), data)
+
+    record_cache_lookup('nfc_tag', tier)
+
+    _local.set(tag_uid, data, settings.NFC_TAG_RESOLUTION_LOCAL_TIMEOUT)
+    if data == UNKNOWN_TAG:
+        return None
+    return ResolvedTag(**data)
+
+
+def _id_cache_key(tag_id):
+    return f'nfc:tag_uid_by_id:{tag_id}'
+
+
+def resolve_tag_id(tag_id):
+    """
+    Resolve a tag by primary key, or None if it does not exist
+
+    Only the id -> tag_uid mapping is cached here; it needs no invalidation
+    because the resolved tag's id is checked against the requested one, and
+    ids of deleted tags are never reused.
+    """
+    revoked = revoked_tag(tag_id=tag_id)
+    if revoked is not None:
+        return revoked
+
+    key = _id_cache_key(tag_id)
+    tag_uid = _local.get(key)
+    if tag_uid is None:
+        try:
+            tag_uid = cache.get(key)
+        except Exception as e:
+            logger.warning('Tag resolution cache read failed: %s', e)
+
+    if tag_uid == UNKNOWN_TAG:
+        _local.set(key, tag_uid, settings.NFC_TAG_RESOLUTION_LOCAL_TIMEOUT)
+        return None
+
+    if tag_uid is not None:
+        tag = resolve_tag(tag_uid)
+        if tag is not None and str(tag.id) == str(tag_id):
+            return tag
+
+    tag_uid = _first(NFCTag.objects.filter(id=tag_id).values_list('tag_uid', flat=True)) or UNKNOWN_TAG
+    _remember(key, tag_uid)
+    _local.set(key, tag_uid, settings.NFC_TAG_RESOLUTION_LOCAL_TIMEOUT)
+    if tag_uid == UNKNOWN_TAG:
+        return None
+    return resolve_tag(tag_uid)
+
+
+async def _afetch(tag_uid):
+    row = await _afirst(NFCTag.objects.filter(tag_uid=tag_uid).values(*RESOLUTION_FIELDS.values()), tag_uid)
+    if row is None:
+        return None
+    return {name: row[lookup] for name, lookup in RESOLUTION_FIELDS.items()}
+
+
+async def _aremember(key, value):
+    timeout = settings.NFC_TAG_RESOLUTION_TIMEOUT if value != UNKNOWN_TAG else settings.NFC_UNKNOWN_TAG_TIMEOUT
+    try:
+        await cache.aset(key, value, timeout=timeout)
+    except Exception as e:
+        logger.warning('Tag resolution cache write failed: %s', e)
+
+
+async def aresolve_tag(tag_uid):
+    """resolve_tag() for async views"""
+    revoked = await arevoked_tag(tag_uid=tag_uid)
+    if revoked is not None:
+        record_cache_lookup('nfc_tag', 'local')
+        return revoked
+
+    data = _local.get(tag_uid)
+    tier = 'local'
+
+    if data is None:
+        tier = 'shared'
+        try:
+            data = await cache.aget(_cache_key(tag_uid))
+        except Exception as e:
+            logger.warning('Tag resolution cache read failed: %s', e)
+
+    if data is None:
+        tier = 'miss'
+        data = await _afetch(tag_uid) or UNKNOWN_TAG
+        await _aremember(_cache_key(tag_uid), data)
+
+    record_cache_lookup('nfc_tag', tier)
+
+    _local.set(tag_uid, data, settings.NFC_TAG_RESOLUTION_LOCAL_TIMEOUT)
+    if data == UNKNOWN_TAG:
+        return None
+    return ResolvedTag(**data)
+
+
+async def aresolve_tag_id(tag_id):
+    """resolve_tag_id() for async views"""
+    revoked = await arevoked_tag(tag_id=tag_id)
+    if revoked is not None:
+        return revoked
+
+    key = _id_cache_key(tag_id)
+    tag_uid = _local.get(key)
+    if tag_uid is None:
+        try:
+            tag_uid = await cache.aget(key)
+        except Exception as e:
+            logger.warning('Tag resolution cache read failed: %s', e)
+
+    if tag_uid == UNKNOWN_TAG:
+        _local.set(key, tag_uid, settings.NFC_TAG_RESOLUTION_LOCAL_TIMEOUT)
+        return None
+
+    if tag_uid is not None:
+        tag = await aresolve_tag(tag_uid)
+        if tag is not None and str(tag.id) == str(tag_id):
+            return tag
+
+    tag_uid = await _afirst(NFCTag.objects.filter(id=tag_id).values_list('tag_uid', flat=True)) or UNKNOWN_TAG
+    await _aremember(key, tag_uid)
+    _local.set(key, tag_uid, settings.NFC_TAG_RESOLUTION_LOCAL_TIMEOUT)
+    if tag_uid == UNKNOWN_TAG:
+        return None
+    return await aresolve_tag(tag_uid)
+
+
+def invalidate_tags(tag_uids):
+    """Forget cached resolutions for the given tag UIDs"""
+    tag_uids = [uid for uid in tag_uids if uid]
+    if not tag_uids:
+        return
+
+    for tag_uid in tag_uids:
+        _local.delete(tag_uid)
+    try:
+        if settings.NFC_SCAN_USE_REPLICAS:
+            # Set before the delete, so no scan rereads the change from a lagging replica
+            cache.set_many({_primary_key(uid): 1 for uid in tag_uids}, timeout=settings.DB_REPLICA_PIN_SECONDS)
+        cache.delete_many([_cache_key(uid) for uid in tag_uids])
+    except Exception as e:
+        logger.warning('Tag resolution cache invalidation failed: %s', e)
+
+
+def invalidate_user_tags(user_id):
+    """Forget cached resolutions for every tag owned by a user"""
+    invalidate_tags(NFCTag.objects.filter(user_id=user_id).values_list('tag_uid', flat=True))
@@ -0,0 +1,276 @@
+"""
+Revoked tag set for the NFC scan path
+
+Every tag that is not ACTIVE is kept in a Redis hash next to a sequence
+number and a capped changelog. Each worker holds a local copy and, at most
+every NFC_REVOCATION_REFRESH_INTERVAL seconds, applies only the changelog
+entries it has not seen yet, so scans of revoked, lost and replaced tags
+are answered from memory. The shared copy is seeded from the database
+when Redis has none and reseeded every NFC_REVOCATION_RESEED_INTERVAL
+seconds. Changes published while a seed reads the database are kept in a
+pending hash (no shared copy yet) or the changelog (forced reseed) and
+applied over the seed. Without Redis the set is disabled and scans fall
+back to tag resolution.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from apps.core.redis import get_redis
+from .models import NFCTag
+
+logger = logging.getLogger(__name__)
+
+SEQ_KEY = 'nfc:revoked_tags:seq'
+TAGS_KEY = 'nfc:revoked_tags'
+LOG_KEY = 'nfc:revoked_tags:log'
+PENDING_KEY = 'nfc:revoked_tags:pending'
+
+LOG_MAX_LENGTH = 1000
+
+STATUS_DISPLAY = dict(NFCTag.STATUS_CHOICES)
+
+# KEYS: seq, tags, log, pending. ARGV: tag id, status, tag_uid, log length, pending ttl.
+# Without a shared copy the latest status per tag waits in the pending hash:
+# a seed already reading the database may have missed the change.
+_PUBLISH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  redis.call('HSET', KEYS[4], ARGV[1], ARGV[2] .. ' ' .. ARGV[3])
+  redis.call('EXPIRE', KEYS[4], tonumber(ARGV[5]))
+  return 0
+end
+local seq = redis.call('INCR', KEYS[1])
+if ARGV[2] == 'ACTIVE' then
+  redis.call('HDEL', KEYS[2], ARGV[1])
+else
+  redis.call('HSET', KEYS[2], ARGV[1], ARGV[2] .. ' ' .. ARGV[3])
+end
+redis.call('RPUSH', KEYS[3], seq .. ' ' .. ARGV[1] .. ' ' .. ARGV[2] .. ' ' .. ARGV[3])
+redis.call('LTRIM', KEYS[3], -tonumber(ARGV[4]), -1)
+return seq
+"""
+
+# KEYS: seq, tags, log, pending. ARGV: starting seq, ttl, 'force' or '', seq before
+# the snapshot or '', then tag id / "status tag_uid" pairs from the snapshot.
+# Changes published after the snapshot was read win over it: changelog entries
+# past the old seq (forced reseed) and the pending hash.
+_SEED_SCRIPT = """
+local force = ARGV[3] == 'force'
+if not force and redis.call('EXISTS', KEYS[1]) == 1 then
+  return 0
+end
+local newer = {}
+if force and ARGV[4] ~= '' and redis.call('EXISTS', KEYS[1]) == 1 then
+  local since = tonumber(ARGV[4])
+  for _, entry in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+    local seq, tag_id, status, tag_uid = string.match(entry, '^(%d+) (%S+) (%S+) (.*)$')
+    if seq and tonumber(seq) > since then
+      table.insert(newer, {tag_id, status .. ' ' .. tag_uid})
+    end
+  end
+end
+local pending = redis.call('HGETALL', KEYS[4])
+for i = 1, #pending, 2 do
+  table.insert(newer, {pending[i], pending[i + 1]})
+end
+redis.call('DEL', KEYS[2], KEYS[3], KEYS[4])
+for i = 5, #ARGV, 2 do
+  redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+for _, change in ipairs(newer) do
+  if string.sub(change[2], 1, 7) == 'ACTIVE ' then
+    redis.call('HDEL', KEYS[2], change[1])
+  else
+    redis.call('HSET', KEYS[2], change[1], change[2])
+  end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+return 1
+"""
+
+# KEYS: seq, tags, log. ARGV: last applied seq.
+# Returns {} without a shared copy, {seq} when current, {seq, 'delta', entries...}
+# or {seq, 'full', tag id, "status tag_uid", ...}.
+_READ_SCRIPT = """
+local seq = redis.call('GET', KEYS[1])
+if not seq then
+  return {}
+end
+seq = tonumber(seq)
+local last = tonumber(ARGV[1])
+if seq == last then
+  return {seq}
+end
+local missed = seq - last
+if last >= 0 and missed > 0 and missed <= redis.call('LLEN', KEYS[3]) then
+  local result = {seq, 'delta'}
+  for _, entry in ipairs(redis.call('LRANGE', KEYS[3], -missed, -1)) do
+    table.insert(result, entry)
+  end
+  return result
+end
+local result = {seq, 'full'}
+for _, item in ipairs(redis.call('HGETALL', KEYS[2])) do
+  table.insert(result, item)
+end
+return result
+"""
+
+
+@dataclass(frozen=True)
+class RevokedTag:
+    """Tag known to be inactive; enough for the scan path to refuse it"""
+
+    id: str
+    tag_uid: str
+    status: str
+
+    is_active = False
+
+    def get_status_display(self):
+        return STATUS_DISPLAY.get(self.status, self.status)
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class _RevocationSet:
+    """Worker-local copy of the shared revoked tag set"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = -1
+        self._by_id = {}
+        self._by_uid = {}
+        self._checked_at = None
+
+    def get(self, tag_uid=None, tag_id=None):
+        self.refresh_if_due()
+        return self.lookup(tag_uid=tag_uid, tag_id=tag_id)
+
+    def lookup(self, tag_uid=None, tag_id=None):
+        if tag_id is not None:
+            return self._by_id.get(str(tag_id))
+        return self._by_uid.get(tag_uid)
+
+    def expire(self):
+        """Check Redis on the next lookup instead of waiting for the interval"""
+        self._checked_at = None
+
+    def is_due(self):
+        checked_at = self._checked_at
+        return checked_at is None or time.monotonic() - checked_at >= settings.NFC_REVOCATION_REFRESH_INTERVAL
+
+    def refresh_if_due(self):
+        if not self.is_due():
+            return
+        now = time.monotonic()
+        checked_at = self._checked_at
+        if not self._lock.acquire(blocking=checked_at is None):
+            # Another thread is refreshing; the current copy is recent enough
+            return
+        try:
+            self._checked_at = now
+            self._refresh()
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        client = get_redis()
+        if client is None:
+            self._reset()
+            return
+
+        try:
+            result = self._read(client)
+            if not result:
+                seed(client)
+                result = self._read(client)
+        except Exception as e:
+            # A stale copy could refuse a reactivated tag; fall back to resolution instead
+            logger.warning('Revoked tag set refresh failed: %s', e)
+            self._reset()
+            return
+
+        if not result:
+            self._reset()
+            return
+
+        seq = int(result[0])
+        if len(result) > 1:
+            mode, items = _text(result[1]), [_text(item) for item in result[2:]]
+            if mode == 'delta':
+                for entry in items:
+                    _, tag_id, status, tag_uid = entry.split(' ', 3)
+                    self._apply(tag_id, status, tag_uid)
+            else:
+                self._by_id = {}
+                self._by_uid = {}
+                for tag_id, value in zip(items[::2], items[1::2]):
+                    status, tag_uid = value.split(' ', 1)
+                    self._apply(tag_id, status, tag_uid)
+        self._seq = seq
+
+    def _read(self, client):
+        return client.register_script(_READ_SCRIPT)(keys=[SEQ_KEY, TAGS_KEY, LOG_KEY], args=[self._seq])
+
+    def _apply(self, tag_id, status, tag_uid):
+        previous = self._by_id.pop(tag_id, None)
+        if previous is not None:
+            self._by_uid.pop(previous.tag_uid, None)
+        if status != 'ACTIVE':
+            tag = RevokedTag(id=tag_id, tag_uid=tag_uid, status=status)
+            self._by_id[tag_id] = tag
+            self._by_uid[tag_uid] = tag
+
+    def _reset(self):
+        self._seq = -1
+        self._by_id = {}
+        self._by_uid = {}
+
+
+_revoked = _RevocationSet()
+
+
+def revoked_tag(tag_uid=None, tag_id=None):
+    """RevokedTag if the tag is known to be inactive, None if active, unknown or the set is unavailable"""
+    return _revoked.get(tag_uid=tag_uid, tag_id=tag_id)
+
+
+async def arevoked_tag(tag_uid=None, tag_id=None):
+    """revoked_tag() for async views; the periodic Redis refresh runs in a thread"""
+    if _revoked.is_due():
+        await sync_to_async(_revoked.refresh_if_due)()
+    return _revoked.lookup(tag_uid=tag_uid, tag_id=tag_id)
+
+
+def seed(client, force=False):
+    """Load the shared set from the database; a no-op if it exists unless forced"""
+    since = client.get(SEQ_KEY) if force else None
+    args = [
+        int(time.time() * 1000), settings.NFC_REVOCATION_RESEED_INTERVAL,
+        'force' if force else '', _text(since) if since is not None else '',
+    ]
+    for tag_id, status, tag_uid in NFCTag.objects.exclude(status='ACTIVE').values_list('id', 'status', 'tag_uid'):
+        args.extend([str(tag_id), f'{status} {tag_uid}'])
+    return bool(client.register_script(_SEED_SCRIPT)(keys=[SEQ_KEY, TAGS_KEY, LOG_KEY, PENDING_KEY], args=args))
+
+
+def publish_tag_status(tag_id, status, tag_uid):
+    """Record a tag's current status in the shared set; ACTIVE (or deleted) removes it"""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.register_script(_PUBLISH_SCRIPT)(
+            keys=[SEQ_KEY, TAGS_KEY, LOG_KEY, PENDING_KEY],
+            args=[str(tag_id), status, tag_uid, LOG_MAX_LENGTH, settings.NFC_REVOCATION_RESEED_INTERVAL]
+        )
+    except Exception as e:
+        logger.warning('Revoked tag set update failed: %s', e)
+    _revoked.expire()
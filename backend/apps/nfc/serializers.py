@@ -1,8 +1,21 @@
 """
 Serializers for NFC app
 """
+from django.db import models
 from rest_framework import serializers
 from .models import NFCTag, NFCAccessLog, NFCEmergencyAccess
+from .counters import pending_scans
+from .resolution import resolve_tag, resolve_tag_id
+from .tokens import MAX_TOKEN_LENGTH, verify_scan_token
+
+
+class NFCTagListSerializer(serializers.ListSerializer):
+    """Fetches unflushed scan counters for the whole page at once"""
+
+    def to_representation(self, data):
+        tags = list(data.all() if isinstance(data, models.Manager) else data)
+        self.context['pending_scans'] = pending_scans([tag.id for tag in tags])
+        return super().to_representation(tags)
 
 
 class NFCTagSerializer(serializers.ModelSerializer):
@@ -24,6 +37,23 @@ class NFCTagSerializer(serializers.ModelSerializer):
             'last_scanned_at', 'scan_count', 'revoked_at',
             'created_at', 'updated_at'
         )
+        list_serializer_class = NFCTagListSerializer
+        select_related = ('user',)
+
+    def to_representation(self, instance):
+        """Merge scans not yet flushed from Redis into the stored statistics"""
+        data = super().to_representation(instance)
+
+        pending = self.context.get('pending_scans')
+        if pending is None:
+            pending = pending_scans([instance.id])
+
+        delta, last_scanned_at = pending.get(str(instance.id), (0, None))
+        data['scan_count'] += delta
+        if last_scanned_at and (instance.last_scanned_at is None or last_scanned_at > instance.last_scanned_at):
+            data['last_scanned_at'] = self.fields['last_scanned_at'].to_representation(last_scanned_at)
+
+        return data
 
 
 class NFCTagRegisterSerializer(serializers.Serializer):
@@ -40,11 +70,21 @@ class NFCTagRegisterSerializer(serializers.Serializer):
 
 
 class NFCTagScanSerializer(serializers.Serializer):
-    """NFC Tag scan serializer"""
+    """
+    NFC Tag scan serializer
 
-    tag_uid = serializers.CharField(max_length=255, required=True)
-    public_key_id = serializers.CharField(max_length=255, required=True)
-    checksum = serializers.CharField(max_length=255, required=True)
+    Accepts either a signed v2 token or the v1 tag_uid/public_key_id/checksum triple.
+    token_rejected is set when a token fails verification before any lookup.
+    With context defer_tag_lookup the tag is not resolved; the caller resolves
+    it (e.g. asynchronously) and passes it to check_tag().
+    """
+
+    token_rejected = False
+
+    token = serializers.CharField(max_length=MAX_TOKEN_LENGTH, required=False)
+    tag_uid = serializers.CharField(max_length=255, required=False)
+    public_key_id = serializers.CharField(max_length=255, required=False)
+    checksum = serializers.CharField(max_length=255, required=False)
 
     # Optional geolocation
     latitude = serializers.DecimalField(
@@ -62,31 +102,54 @@ class NFCTagScanSerializer(serializers.Serializer):
 
     def validate(self, attrs):
         """Validate NFC tag data"""
-        tag_uid = attrs.get('tag_uid')
-
-        try:
-            nfc_tag = NFCTag.objects.get(tag_uid=tag_uid)
+        if attrs.get('token'):
+            # Signature first: forged tokens never reach the cache or database
+            attrs['claims'] = verify_scan_token(attrs['token'])
+            if attrs['claims'] is None:
+                self.token_rejected = True
+                raise serializers.ValidationError({'token': 'Неверный токен метки'})
+        else:
+            missing = [name for name in ('tag_uid', 'public_key_id', 'checksum') if not attrs.get(name)]
+            if missing:
+                raise serializers.ValidationError({name: 'Обязательное поле.' for name in missing})
+
+        if self.context.get('defer_tag_lookup'):
+            return attrs
+
+        if attrs.get('claims'):
+            tag = resolve_tag_id(attrs['claims'].tag_id)
+        else:
+            tag = resolve_tag(attrs['tag_uid'])
+        attrs['tag'] = self.check_tag(tag, attrs)
+        return attrs
 
-            if not nfc_tag.is_active:
+    def check_tag(self, tag, attrs):
+        """Return the resolved tag (None if not found) if it matches the scan, else raise"""
+        claims = attrs.get('claims')
+        if claims:
+            # Inactive tags may come from the revoked tag set, which keeps no key id
+            if tag is None or (tag.is_active and tag.public_key_id != claims.public_key_id):
+                raise serializers.ValidationError({
+                    'token': 'Метка не найдена'
+                })
+        else:
+            if tag is None:
                 raise serializers.ValidationError({
-                    'tag_uid': f'Метка {nfc_tag.get_status_display().lower()}'
+                    'tag_uid': 'Метка не найдена'
                 })
 
             # Verify checksum
-            data_to_verify = f"{tag_uid}{attrs.get('public_key_id')}"
-            if not nfc_tag.verify_checksum(data_to_verify):
+            data_to_verify = f"{attrs['tag_uid']}{attrs['public_key_id']}"
+            if tag.is_active and not tag.verify_checksum(data_to_verify):
                 raise serializers.ValidationError({
                     'checksum': 'Неверная контрольная сумма'
                 })
 
-            attrs['nfc_tag'] = nfc_tag
-
-        except NFCTag.DoesNotExist:
+        if not tag.is_active:
             raise serializers.ValidationError({
-                'tag_uid': 'Метка не найдена'
+                'tag_uid': f'Метка {tag.get_status_display().lower()}'
             })
-
-        return attrs
+        return tag
 
 
 class NFCTagRevokeSerializer(serializers.Serializer):
@@ -96,6 +159,12 @@ class NFCTagRevokeSerializer(serializers.Serializer):
     reason = serializers.CharField(required=False, allow_blank=True)
 
 
+class NFCTagReissueSerializer(serializers.Serializer):
+    """NFC Tag key reissue serializer"""
+
+    tag_id = serializers.UUIDField(required=True)
+
+
 class NFCAccessLogSerializer(serializers.ModelSerializer):
     """NFC Access Log serializer"""
 
@@ -110,7 +179,8 @@ class NFCAccessLogSerializer(serializers.ModelSerializer):
             'ip_address', 'user_agent', 'device_info',
             'latitude', 'longitude', 'error_message', 'accessed_at'
         )
-        read_only_fields = '__all__'
+        read_only_fields = fields
+        select_related = ('nfc_tag', 'accessed_by')
 
 
 class NFCEmergencyAccessSerializer(serializers.ModelSerializer):
@@ -118,6 +188,7 @@ class NFCEmergencyAccessSerializer(serializers.ModelSerializer):
 
     nfc_tag_uid = serializers.CharField(source='nfc_tag.tag_uid', read_only=True)
     medical_worker_name = serializers.CharField(source='medical_worker.get_full_name', read_only=True)
+    data_accessed = serializers.JSONField(source='accessed_data', read_only=True)
 
     class Meta:
         model = NFCEmergencyAccess
@@ -125,6 +196,9 @@ class NFCEmergencyAccessSerializer(serializers.ModelSerializer):
             'id', 'nfc_tag', 'nfc_tag_uid', 'medical_worker',
             'medical_worker_name', 'accessed_at', 'ip_address',
             'device_info', 'latitude', 'longitude',
-            'data_accessed', 'access_notes'
+            'snapshot', 'data_accessed', 'access_notes'
         )
-        read_only_fields = '__all__'
+        read_only_fields = fields
+        select_related = ('nfc_tag', 'medical_worker')
+        # Prefetched rather than joined: each distinct snapshot is loaded once per page
+        prefetch_related = ('snapshot',)
@@ -0,0 +1,63 @@
+"""
+Signals for NFC app
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.profiles.models import MedicalProfile
+from .models import NFCTag
+from .resolution import invalidate_tags, invalidate_user_tags
+from .revocation import publish_tag_status
+
+
+@receiver(pre_save, sender=NFCTag)
+def remember_previous_tag_uid(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored tag_uid so a renamed tag stops resolving under it"""
+    if update_fields is not None and 'tag_uid' not in update_fields:
+        return
+    instance._previous_tag_uid = sender.objects.filter(pk=instance.pk).values_list('tag_uid', flat=True).first()
+
+
+@receiver(post_save, sender=NFCTag)
+@receiver(post_delete, sender=NFCTag)
+def invalidate_tag_resolution(sender, instance, **kwargs):
+    """Drop cached resolution when a tag changes"""
+    tag_uids = [instance.tag_uid, getattr(instance, '_previous_tag_uid', None)]
+    transaction.on_commit(lambda: invalidate_tags(tag_uids))
+
+
+@receiver(post_save, sender=NFCTag)
+def publish_tag_revocation(sender, instance, created=False, update_fields=None, **kwargs):
+    """Keep the shared revoked tag set in step with tag status"""
+    if created and instance.is_active:
+        return
+    if update_fields is not None and not {'status', 'tag_uid'} & set(update_fields):
+        return
+    tag_id, tag_status, tag_uid = instance.id, instance.status, instance.tag_uid
+    transaction.on_commit(lambda: publish_tag_status(tag_id, tag_status, tag_uid))
+
+
+@receiver(post_delete, sender=NFCTag)
+def unpublish_deleted_tag(sender, instance, **kwargs):
+    """A deleted tag is unknown rather than revoked"""
+    tag_id, tag_uid = instance.id, instance.tag_uid
+    transaction.on_commit(lambda: publish_tag_status(tag_id, 'ACTIVE', tag_uid))
+
+
+@receiver(post_save, sender=MedicalProfile)
+@receiver(post_delete, sender=MedicalProfile)
+def invalidate_profile_tag_resolution(sender, instance, **kwargs):
+    """Resolution carries profile id and is_public"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_tags(user_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tag_resolution(sender, instance, update_fields=None, **kwargs):
+    """Resolution carries the owner's name"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    user_id = instance.id
+    transaction.on_commit(lambda: invalidate_user_tags(user_id))
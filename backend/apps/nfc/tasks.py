@@ -0,0 +1,12 @@
+"""
+Celery tasks for NFC app
+"""
+from celery import shared_task
+
+from . import counters
+
+
+@shared_task(ignore_result=True)
+def flush_scan_counters():
+    """Fold pending Redis scan counters into nfc_tags"""
+    return counters.flush_scan_counters()
@@ -0,0 +1,419 @@
+"""
+Tests for the NFC scan path, scan tokens and list endpoints
+"""
+import json
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from apps.core.testing import LOCMEM_CACHES, ConstantQueriesMixin
+from apps.profiles.cards import rebuild_card
+from apps.profiles.models import MedicalProfile
+from . import resolution
+from apps.audit.models import AuditLog
+from .models import NFCAccessLog, NFCEmergencyAccess, NFCEmergencySnapshot, NFCTag, compute_checksum
+from .revocation import _revoked
+from .tokens import ScanClaims, issue_scan_token, verify_scan_token
+
+def create_tag(user, tag_uid, **fields):
+    public_key_id = str(uuid.uuid4())
+    return NFCTag.objects.create(
+        user=user,
+        tag_uid=tag_uid,
+        public_key_id=public_key_id,
+        checksum=compute_checksum(f'{tag_uid}{public_key_id}'),
+        **fields
+    )
+
+
+def select_queries(context):
+    """Lookups only; access log, audit and counter writes are batched off the request path in production"""
+    return [query['sql'] for query in context.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False)
+class ScanQueryCountTests(TestCase):
+    """Database reads of the public scan endpoints, cold and with warm caches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='patient@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+        cls.profile = MedicalProfile.objects.create(user=cls.user, blood_type='II+', is_public=True)
+        rebuild_card(cls.profile.id)
+        cls.tag = create_tag(cls.user, 'TAG-0001')
+
+    def setUp(self):
+        cache.clear()
+        resolution._local.clear()
+        _revoked.expire()
+        self.client = APIClient()
+
+    def scan(self):
+        return self.client.post('/api/nfc/scan/', {
+            'tag_uid': self.tag.tag_uid,
+            'public_key_id': self.tag.public_key_id,
+            'checksum': self.tag.checksum,
+        }, format='json')
+
+    def scan_token(self):
+        token = issue_scan_token(self.tag.id, self.tag.public_key_id)
+        return self.client.post('/api/nfc/scan/', {'token': token}, format='json')
+
+    def emergency(self, tag_uid=None):
+        return self.client.get(f'/api/nfc/emergency/{tag_uid or self.tag.tag_uid}/')
+
+    def emergency_unknown(self):
+        return self.emergency('NO-SUCH-TAG')
+
+    def scan_unknown(self):
+        return self.client.post('/api/nfc/scan/', {
+            'tag_uid': 'NO-SUCH-TAG', 'public_key_id': 'x', 'checksum': 'x'
+        }, format='json')
+
+    def assertReads(self, count, request, status_code=200):
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertEqual(response.status_code, status_code)
+        reads = select_queries(context)
+        self.assertEqual(len(reads), count, '\n'.join(reads))
+
+    def forget_local(self):
+        # What another worker sees: the shared (Redis) cache is warm, its own memory is not
+        resolution._local.clear()
+
+    def test_scan_cold(self):
+        # Tag, owner and profile visibility in one query, then the stored card
+        self.assertReads(2, self.scan)
+
+    def test_scan_warm_local(self):
+        self.scan()
+        self.assertReads(0, self.scan)
+
+    def test_scan_warm_shared(self):
+        self.scan()
+        self.forget_local()
+        self.assertReads(0, self.scan)
+
+    def test_scan_token_cold(self):
+        # tag_uid by id, then the same lookups as a v1 scan
+        self.assertReads(3, self.scan_token)
+
+    def test_scan_token_warm(self):
+        self.scan_token()
+        self.assertReads(0, self.scan_token)
+        self.forget_local()
+        self.assertReads(0, self.scan_token)
+
+    def test_emergency_cold(self):
+        self.assertReads(2, self.emergency)
+
+    def test_emergency_warm_local(self):
+        self.emergency()
+        self.assertReads(0, self.emergency)
+
+    def test_emergency_warm_shared(self):
+        self.emergency()
+        self.forget_local()
+        self.assertReads(0, self.emergency)
+
+    def test_unknown_tag_is_cached(self):
+        self.assertReads(1, self.emergency_unknown, status_code=404)
+        self.assertReads(0, self.emergency_unknown, status_code=404)
+        self.forget_local()
+        self.assertReads(0, self.emergency_unknown, status_code=404)
+
+    def test_unknown_tag_scan_is_cached(self):
+        self.assertReads(1, self.scan_unknown, status_code=400)
+        self.assertReads(0, self.scan_unknown, status_code=400)
+        self.forget_local()
+        self.assertReads(0, self.scan_unknown, status_code=400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, NFC_SCAN_USE_REPLICAS=True, DB_REPLICA_PIN_SECONDS=10)
+class ReplicaResolutionTests(SimpleTestCase):
+    """Changed tags are reread from the primary while replicas may lag"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('apps.nfc.resolution.read_alias', return_value='replica_1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalidated_tag_reads_primary(self):
+        self.assertEqual(resolution._scan_alias('TAG-0001'), 'replica_1')
+        resolution.invalidate_tags(['TAG-0001'])
+        self.assertEqual(resolution._scan_alias('TAG-0001'), 'default')
+        self.assertEqual(resolution._scan_alias('TAG-0002'), 'replica_1')
+
+    def test_marker_expires(self):
+        resolution.invalidate_tags(['TAG-0001'])
+        # What DB_REPLICA_PIN_SECONDS later looks like
+        cache.delete(resolution._primary_key('TAG-0001'))
+        self.assertEqual(resolution._scan_alias('TAG-0001'), 'replica_1')
+
+
+KEY_RING = {1: 'first-key', 2: 'second-key'}
+
+
+@override_settings(NFC_KEY_RING=KEY_RING, NFC_ACTIVE_KEY_VERSION=2)
+class ScanTokenTests(SimpleTestCase):
+    """Signing and verification of v2 scan tokens"""
+
+    tag_id = uuid.UUID('6b1f3c2e-8a4d-4f0e-9c57-2d4b1a0e7f31')
+    public_key_id = 'a3f9c1d2-0b7e-4c5a-8e6f-1d2c3b4a5f60'
+
+    def issue(self, **kwargs):
+        return issue_scan_token(self.tag_id, self.public_key_id, **kwargs)
+
+    def test_round_trip(self):
+        token = self.issue()
+        self.assertTrue(token.startswith('2.2.'))
+        self.assertEqual(
+            verify_scan_token(token),
+            ScanClaims(key_version=2, tag_id=self.tag_id, public_key_id=self.public_key_id)
+        )
+
+    def test_tampered_payload_is_rejected(self):
+        token = self.issue()
+        other_tag = uuid.UUID('0c9e8d7f-6a5b-4c3d-8e2f-1a0b9c8d7e6f')
+        self.assertIsNone(verify_scan_token(token.replace(str(self.tag_id), str(other_tag))))
+        self.assertIsNone(verify_scan_token(token.replace(self.public_key_id, 'other-key-id')))
+        # Same signature claimed for another key version
+        self.assertIsNone(verify_scan_token('2.1.' + token[len('2.2.'):]))
+
+    def test_tampered_signature_is_rejected(self):
+        message, signature = self.issue().rsplit('.', 1)
+        flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+        self.assertIsNone(verify_scan_token(f'{message}.{flipped}'))
+        self.assertIsNone(verify_scan_token(f'{message}.'))
+        self.assertIsNone(verify_scan_token(message))
+
+    def test_malformed_tokens_are_rejected(self):
+        for token in ('', 'x', '1.2.3.4.5', self.issue() + '.extra', 'x' * 300, None, 42):
+            with self.subTest(token=token):
+                self.assertIsNone(verify_scan_token(token))
+
+    def test_unknown_key_version_is_rejected(self):
+        with override_settings(NFC_KEY_RING={**KEY_RING, 3: 'third-key'}):
+            token = self.issue(key_version=3)
+        self.assertIsNone(verify_scan_token(token))
+
+    def test_previous_key_still_verifies_after_rotation(self):
+        with override_settings(NFC_ACTIVE_KEY_VERSION=1):
+            token = self.issue()
+        self.assertEqual(verify_scan_token(token).key_version, 1)
+        self.assertTrue(self.issue().startswith('2.2.'))
+
+    def test_retired_key_no_longer_verifies(self):
+        token = self.issue(key_version=1)
+        with override_settings(NFC_KEY_RING={2: 'second-key'}):
+            self.assertIsNone(verify_scan_token(token))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, NFC_KEY_RING=KEY_RING, NFC_ACTIVE_KEY_VERSION=2)
+class ScanPayloadTests(TestCase):
+    """The scan endpoint accepts v2 tokens and the legacy v1 triple"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='patient@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+        cls.profile = MedicalProfile.objects.create(user=cls.user, blood_type='II+', is_public=True)
+        rebuild_card(cls.profile.id)
+        cls.tag = create_tag(cls.user, 'TAG-0001')
+
+    def setUp(self):
+        cache.clear()
+        resolution._local.clear()
+        _revoked.expire()
+        self.client = APIClient()
+
+    def scan(self, payload):
+        return self.client.post('/api/nfc/scan/', payload, format='json')
+
+    def test_v1_triple(self):
+        response = self.scan({
+            'tag_uid': self.tag.tag_uid, 'public_key_id': self.tag.public_key_id, 'checksum': self.tag.checksum
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_v1_wrong_public_key_id(self):
+        # The stored checksum binds tag_uid to its public key id
+        response = self.scan({
+            'tag_uid': self.tag.tag_uid, 'public_key_id': str(uuid.uuid4()), 'checksum': self.tag.checksum
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('checksum', response.json())
+
+    def test_token_signed_with_previous_key(self):
+        token = issue_scan_token(self.tag.id, self.tag.public_key_id, key_version=1)
+        self.assertEqual(self.scan({'token': token}).status_code, 200)
+
+    def test_tampered_token(self):
+        other = create_tag(self.user, 'TAG-0002')
+        token = issue_scan_token(self.tag.id, self.tag.public_key_id)
+        forged = token.replace(str(self.tag.id), str(other.id))
+        response = self.scan({'token': forged})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('token', response.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, AUDIT_LOG_READS=False)
+class ListQueryCountTests(ConstantQueriesMixin, TestCase):
+    """Queries of the NFC list endpoints do not grow with the number of rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', password='pw', first_name='Анна', last_name='Смирнова',
+            role='ADMIN', is_staff=True
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.created = 0
+
+    def next_user(self, role='PATIENT'):
+        self.created += 1
+        return User.objects.create_user(
+            email=f'user{self.created}@example.com', password='pw',
+            first_name='Иван', last_name='Петров', role=role
+        )
+
+    def next_tag(self, user=None):
+        user = user or self.next_user()
+        self.created += 1
+        return create_tag(user, f'TAG-{self.created:04d}')
+
+    def test_tags(self):
+        def add_rows(count):
+            for _ in range(count):
+                self.next_tag(self.admin)
+        self.assertConstantQueries('/api/nfc/tags/', add_rows)
+
+    def test_access_logs(self):
+        def add_rows(count):
+            for _ in range(count):
+                NFCAccessLog.objects.create(
+                    nfc_tag=self.next_tag(), accessed_by=self.next_user(),
+                    access_type='SCAN', status='SUCCESS', ip_address='127.0.0.1'
+                )
+        self.assertConstantQueries('/api/nfc/access-logs/', add_rows)
+
+    def test_emergency_accesses(self):
+        def add_rows(count):
+            for _ in range(count):
+                tag = self.next_tag()
+                snapshot = NFCEmergencySnapshot.for_data({'tag_uid': tag.tag_uid})
+                snapshot.save()
+                NFCEmergencyAccess.objects.create(
+                    nfc_tag=tag, medical_worker=self.next_user('MEDICAL_WORKER'),
+                    ip_address='127.0.0.1', snapshot=snapshot
+                )
+        self.assertConstantQueries('/api/nfc/emergency-accesses/', add_rows)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, NFC_KEY_RING={1: 'old-key', 2: 'new-key'},
+                   NFC_ACTIVE_KEY_VERSION=2)
+class ReissueTests(TestCase):
+    """Owners rewrite their tags with a new key id and a token from the active key"""
+
+    url = '/api/nfc/reissue/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='patient@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+        cls.profile = MedicalProfile.objects.create(user=cls.user, blood_type='II+', is_public=True)
+        rebuild_card(cls.profile.id)
+        cls.tag = create_tag(cls.user, 'TAG-0001')
+
+    def setUp(self):
+        cache.clear()
+        resolution._local.clear()
+        _revoked.expire()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scan(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return APIClient().post('/api/nfc/scan/', {'token': token}, format='json')
+
+    def test_reissue_replaces_old_token(self):
+        old_token = issue_scan_token(self.tag.id, self.tag.public_key_id, key_version=1)
+        self.assertEqual(self.scan(old_token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'tag_id': str(self.tag.id)}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        nfc_data = response.json()['nfc_data']
+        self.assertNotEqual(nfc_data['public_key_id'], self.tag.public_key_id)
+        self.assertTrue(nfc_data['token'].startswith('2.2.'))
+        self.assertTrue(NFCAccessLog.objects.filter(nfc_tag=self.tag, access_type='REISSUE').exists())
+
+        self.assertEqual(self.scan(nfc_data['token']).status_code, 200)
+        self.assertEqual(self.scan(old_token).status_code, 400)
+
+    def test_other_users_tag(self):
+        other = User.objects.create_user(
+            email='other@example.com', password='pw', first_name='Пётр', last_name='Иванов'
+        )
+        self.client.force_authenticate(other)
+        response = self.client.post(self.url, {'tag_id': str(self.tag.id)}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False)
+class BulkRegisterTests(TestCase):
+    """The bulk endpoint reads its upload as a stream"""
+
+    url = '/api/nfc/register/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='patient@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+        MedicalProfile.objects.create(user=cls.user, blood_type='II+')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upload_is_not_copied_to_audit_log(self):
+        response = self.client.post(self.url, [{'tag_uid': 'BULK-0001'}], format='json')
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([line['status'] for line in lines], ['created'])
+
+        entry = AuditLog.objects.get(endpoint=self.url)
+        self.assertNotIn('BULK-0001', json.dumps(entry.new_value))
+
+    def test_empty_body(self):
+        response = self.client.post(self.url, '', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_content_length(self):
+        # What a chunked upload looks like to the view
+        response = self.client.post(self.url, 'tag_uid\nBULK-0001\n', content_type='text/csv', CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(NFCTag.objects.filter(tag_uid='BULK-0001').exists())
+
+    @override_settings(NFC_BULK_REGISTER_MAX_BYTES=64)
+    def test_body_too_large(self):
+        # Checked before the body is read: a JSON array would be parsed whole
+        rows = [{'tag_uid': f'BULK-{number:04}'} for number in range(10)]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(NFCTag.objects.filter(tag_uid__startswith='BULK-').exists())
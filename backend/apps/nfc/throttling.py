@@ -0,0 +1,76 @@
+"""
+Throttles for the public scan endpoints
+
+Anonymous scans are limited per client IP and per tag. Authenticated
+users (medical workers) are only subject to the user rate, so a flood
+against one tag cannot lock paramedics out of it. Tag enumeration
+against the emergency endpoint is limited separately: every unknown
+tag_uid counts against the client IP, and once the nfc_tag_miss rate is
+used up the IP gets 429 for any tag until it recovers.
+"""
+from apps.core.throttling import AnonIPThrottle, GCRAThrottle, UserRateThrottle, limiter
+from .tokens import TOKEN_VERSION, MAX_TOKEN_LENGTH
+
+
+class ScanRateThrottle(AnonIPThrottle):
+    scope = 'nfc_scan'
+
+
+def scanned_tag(data):
+    """tag_uid or (not yet verified) token tag id a scan request is for, if any"""
+    if not hasattr(data, 'get'):
+        return None
+    token = data.get('token')
+    if isinstance(token, str) and len(token) <= MAX_TOKEN_LENGTH:
+        parts = token.split('.')
+        if len(parts) == 5 and parts[0] == TOKEN_VERSION:
+            return parts[2]
+    tag_uid = data.get('tag_uid')
+    if isinstance(tag_uid, str) and tag_uid:
+        return tag_uid
+    return None
+
+
+class ScanTagThrottle(GCRAThrottle):
+    """Anonymous scans per tag"""
+
+    scope = 'nfc_scan_tag'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        tag = scanned_tag(request.data)
+        return self.key_for(tag) if tag else None
+
+
+class EmergencyRateThrottle(AnonIPThrottle):
+    scope = 'nfc_emergency'
+
+
+class EmergencyTagThrottle(GCRAThrottle):
+    """Anonymous emergency data requests per tag_uid"""
+
+    scope = 'nfc_emergency_tag'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.key_for(view.kwargs['tag_uid'])
+
+
+class TagEnumerationThrottle(AnonIPThrottle):
+    """Refuses client IPs that asked for too many unknown tags; misses are counted with record_miss()"""
+
+    scope = 'nfc_tag_miss'
+    cost = 0
+
+    @classmethod
+    def record_miss(cls, request):
+        throttle = cls()
+        key = throttle.get_cache_key(request, None)
+        if throttle.rate is not None and key is not None:
+            limiter.check(key, *throttle.parameters())
+
+
+SCAN_THROTTLES = [ScanRateThrottle, ScanTagThrottle, UserRateThrottle]
+EMERGENCY_THROTTLES = [TagEnumerationThrottle, EmergencyRateThrottle, EmergencyTagThrottle, UserRateThrottle]
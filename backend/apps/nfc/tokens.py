@@ -0,0 +1,141 @@
+"""
+Signed scan tokens (tag payload v2)
+
+A token is "2.<key version>.<tag id>.<public key id>.<signature>" where the
+signature is HMAC-SHA256 over everything before it, base64url-encoded
+without padding. Tokens are verified against settings.NFC_KEY_RING before
+any database access; rejected tokens are counted per client IP and only
+sampled into SecurityEvents.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from apps.audit.models import SecurityEvent
+from apps.core.metrics import record_scan_outcome
+from apps.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = '2'
+MAX_TOKEN_LENGTH = 256
+
+REJECTED_SCANS_KEY = 'nfc:rejected_scans'
+
+
+@dataclass(frozen=True)
+class ScanClaims:
+    """Verified content of a scan token"""
+
+    key_version: int
+    tag_id: uuid.UUID
+    public_key_id: str
+
+
+def _sign(message, key_version):
+    key = settings.NFC_KEY_RING[key_version]
+    digest = hmac.new(key.encode(), message.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def issue_scan_token(tag_id, public_key_id, key_version=None):
+    """Token to write on a tag, signed with the active (or given) key version"""
+    key_version = key_version or settings.NFC_ACTIVE_KEY_VERSION
+    message = f'{TOKEN_VERSION}.{key_version}.{tag_id}.{public_key_id}'
+    return f'{message}.{_sign(message, key_version)}'
+
+
+def verify_scan_token(token):
+    """ScanClaims for a genuine token, None for anything else"""
+    if not isinstance(token, str) or len(token) > MAX_TOKEN_LENGTH:
+        return None
+
+    parts = token.split('.')
+    if len(parts) != 5 or parts[0] != TOKEN_VERSION:
+        return None
+    _, key_version, tag_id, public_key_id, signature = parts
+
+    try:
+        key_version = int(key_version)
+        tag_id = uuid.UUID(tag_id)
+    except ValueError:
+        return None
+    if key_version not in settings.NFC_KEY_RING:
+        return None
+
+    message = token.rsplit('.', 1)[0]
+    if not hmac.compare_digest(_sign(message, key_version), signature):
+        return None
+
+    return ScanClaims(key_version=key_version, tag_id=tag_id, public_key_id=public_key_id)
+
+
+class _LocalCounter:
+    """Per-process fallback for rejection counts when Redis is unavailable"""
+
+    def __init__(self):
+        self._window = None
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, window):
+        with self._lock:
+            if window != self._window:
+                self._window = window
+                self._counts = {}
+            self._counts[key] = self._counts.get(key, 0) + 1
+            return self._counts[key]
+
+
+_local_counter = _LocalCounter()
+
+
+def _is_sampled(count):
+    # 1st, 10th, 100th, ... rejection of a window
+    while count % 10 == 0:
+        count //= 10
+    return count == 1
+
+
+def record_rejected_scan(ip_address, reason, user_agent=''):
+    """Count a rejected token; emit a SecurityEvent only for sampled counts"""
+    record_scan_outcome('FAILED')
+    window_seconds = settings.NFC_REJECTED_SCAN_WINDOW
+    window = int(time.time() // window_seconds)
+    key = f'{REJECTED_SCANS_KEY}:{ip_address}:{window}'
+
+    count = None
+    client = get_redis()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.expire(key, window_seconds * 2)
+            count = pipe.execute()[0]
+        except Exception as e:
+            logger.warning('Rejected scan counter failed: %s', e)
+    if count is None:
+        count = _local_counter.incr(key, window)
+
+    if not _is_sampled(count):
+        return
+
+    try:
+        SecurityEvent.objects.create(
+            event_type='INVALID_TOKEN',
+            severity='WARNING' if count < 100 else 'DANGER',
+            ip_address=ip_address,
+            user_agent=user_agent[:500],
+            endpoint='/api/nfc/scan/',
+            description=f'Отклонено токенов NFC сканирования: {count} за {window_seconds} с',
+            additional_data={'reason': reason, 'count': count, 'window_seconds': window_seconds}
+        )
+    except Exception:
+        logger.exception('Could not record rejected scan event')
@@ -1,30 +1,48 @@
 """
 URLs for NFC app
 """
+from django.conf import settings
 from django.urls import path
+
+from . import async_views
 from .views import (
     NFCTagListView,
     NFCTagRegisterView,
+    NFCTagBulkRegisterView,
     NFCTagScanView,
     NFCTagRevokeView,
+    NFCTagReissueView,
     NFCAccessLogListView,
+    NFCAccessLogExportView,
     NFCEmergencyAccessListView,
+    NFCEmergencyAccessExportView,
     NFCEmergencyDataView,
 )
 
 app_name = 'nfc'
 
+if settings.NFC_ASYNC_SCAN:
+    scan_view = async_views.scan_tag
+    emergency_data_view = async_views.emergency_data
+else:
+    scan_view = NFCTagScanView.as_view()
+    emergency_data_view = NFCEmergencyDataView.as_view()
+
 urlpatterns = [
     # NFC Tags
     path('tags/', NFCTagListView.as_view(), name='tag-list'),
     path('register/', NFCTagRegisterView.as_view(), name='register'),
-    path('scan/', NFCTagScanView.as_view(), name='scan'),
+    path('register/bulk/', NFCTagBulkRegisterView.as_view(), name='register-bulk'),
+    path('scan/', scan_view, name='scan'),
     path('revoke/', NFCTagRevokeView.as_view(), name='revoke'),
+    path('reissue/', NFCTagReissueView.as_view(), name='reissue'),
 
     # Public emergency access (for QR code)
-    path('emergency/<str:tag_uid>/', NFCEmergencyDataView.as_view(), name='emergency-data'),
+    path('emergency/<str:tag_uid>/', emergency_data_view, name='emergency-data'),
 
     # Logs
     path('access-logs/', NFCAccessLogListView.as_view(), name='access-log-list'),
+    path('access-logs/export/', NFCAccessLogExportView.as_view(), name='access-log-export'),
     path('emergency-accesses/', NFCEmergencyAccessListView.as_view(), name='emergency-access-list'),
+    path('emergency-accesses/export/', NFCEmergencyAccessExportView.as_view(), name='emergency-access-export'),
 ]
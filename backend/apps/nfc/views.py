@@ -4,24 +4,38 @@ Views for NFC app
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.utils import timezone
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+import json
 import uuid
 
-from .models import NFCTag, NFCAccessLog, NFCEmergencyAccess
+from .models import NFCTag, NFCAccessLog, NFCEmergencyAccess, compute_checksum
 from .serializers import (
     NFCTagSerializer,
     NFCTagRegisterSerializer,
     NFCTagScanSerializer,
     NFCTagRevokeSerializer,
+    NFCTagReissueSerializer,
     NFCAccessLogSerializer,
     NFCEmergencyAccessSerializer
 )
-from apps.profiles.serializers import EmergencyProfileSerializer
-from apps.profiles.models import MedicalProfile
-
-
-class NFCTagListView(generics.ListAPIView):
+from .access_logs import log_access, log_emergency_access
+from .counters import record_scan
+from .provisioning import ProvisioningError, decode_lines, provision_tags, read_rows
+from .resolution import resolve_tag
+from .throttling import EMERGENCY_THROTTLES, SCAN_THROTTLES, TagEnumerationThrottle, scanned_tag
+from .tokens import issue_scan_token, record_rejected_scan
+from apps.audit.detection import record_failed_scan
+from apps.audit.exports import ExportMixin
+from apps.core.ip import get_client_ip
+from apps.core.mixins import QueryHintsMixin
+from apps.core.pagination import KeysetPagination
+from apps.core.replicas import ReplicaReadMixin
+from apps.profiles.cache import get_emergency_profile_data
+
+
+class NFCTagListView(QueryHintsMixin, generics.ListAPIView):
     """List user's NFC tags"""
 
     serializer_class = NFCTagSerializer
@@ -53,19 +67,15 @@ class NFCTagRegisterView(APIView):
         tag_uid = serializer.validated_data['tag_uid']
         tag_type = serializer.validated_data['tag_type']
 
-        # Create NFC tag
+        # Create NFC tag with its checksum in a single insert
         nfc_tag = NFCTag.objects.create(
             user=request.user,
             tag_uid=tag_uid,
             tag_type=tag_type,
             public_key_id=public_key_id,
+            checksum=compute_checksum(f"{tag_uid}{public_key_id}"),
         )
 
-        # Generate checksum
-        data = f"{tag_uid}{public_key_id}"
-        nfc_tag.checksum = nfc_tag.generate_checksum(data)
-        nfc_tag.save()
-
         # Log registration
         self._log_access(
             nfc_tag=nfc_tag,
@@ -79,14 +89,15 @@ class NFCTagRegisterView(APIView):
             'nfc_data': {
                 'tag_id': str(nfc_tag.id),
                 'public_key_id': public_key_id,
-                'checksum': nfc_tag.checksum
+                'checksum': nfc_tag.checksum,
+                'token': issue_scan_token(nfc_tag.id, public_key_id)
             },
             'message': 'NFC метка успешно зарегистрирована'
         }, status=status.HTTP_201_CREATED)
 
     def _log_access(self, nfc_tag, access_type, status, request, error_message=''):
         """Helper to log access"""
-        NFCAccessLog.objects.create(
+        log_access(
             nfc_tag=nfc_tag,
             accessed_by=request.user if request.user.is_authenticated else None,
             access_type=access_type,
@@ -98,18 +109,72 @@ class NFCTagRegisterView(APIView):
 
     def _get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip
+        return get_client_ip(request)
+
+
+class NFCTagBulkRegisterView(APIView):
+    """
+    Register many NFC tags from a CSV (text/csv) or JSON stream
+
+    Responds with one NDJSON line per input row, carrying nfc_data for every
+    created tag. Admins may assign tags to other users via user_email. The
+    body must have a Content-Length (chunked uploads reach the view empty)
+    of at most NFC_BULK_REGISTER_MAX_BYTES; request.stream stops there.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    # Rows are read while the response streams; the audit log keeps method and path only
+    audit_request_body = False
+
+    def post(self, request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length <= 0:
+            return Response(
+                {'error': 'Пустое тело запроса или не указан Content-Length'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if content_length > settings.NFC_BULK_REGISTER_MAX_BYTES:
+            return Response(
+                {'error': f'Тело запроса больше {settings.NFC_BULK_REGISTER_MAX_BYTES} байт, разделите файл'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        input_format = 'csv' if request.content_type.startswith('text/csv') else 'json'
+        rows = read_rows(decode_lines(request.stream), input_format)
+        results = provision_tags(
+            rows,
+            owner=request.user,
+            allow_other_owners=request.user.is_admin,
+            chunk_size=settings.NFC_BULK_REGISTER_CHUNK_SIZE,
+            max_rows=settings.NFC_BULK_REGISTER_MAX_ROWS,
+            log_fields={
+                'accessed_by': request.user,
+                'ip_address': self._get_client_ip(request),
+                'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+            }
+        )
+        return StreamingHttpResponse(self._stream(results), content_type='application/x-ndjson')
+
+    def _stream(self, results):
+        try:
+            for result in results:
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+        except ProvisioningError as e:
+            yield json.dumps({'status': 'error', 'errors': {'input': str(e)}}, ensure_ascii=False) + '\n'
+
+    def _get_client_ip(self, request):
+        """Get client IP address"""
+        return get_client_ip(request)
 
 
 class NFCTagScanView(APIView):
     """Scan NFC tag and get emergency medical data"""
 
     permission_classes = [permissions.AllowAny]  # Emergency access doesn't require auth
+    throttle_classes = SCAN_THROTTLES
 
     def post(self, request):
         serializer = NFCTagScanSerializer(data=request.data)
@@ -117,78 +182,82 @@ class NFCTagScanView(APIView):
         try:
             serializer.is_valid(raise_exception=True)
         except Exception as e:
-            # Log failed scan
-            self._log_failed_scan(request, str(e))
+            record_failed_scan(request, scanned_tag(request.data))
+            if serializer.token_rejected:
+                # Forged or corrupted tokens are only counted, not logged one by one
+                record_rejected_scan(
+                    self._get_client_ip(request),
+                    'invalid_signature',
+                    request.META.get('HTTP_USER_AGENT', '')
+                )
+            else:
+                # Log failed scan
+                self._log_failed_scan(request, str(e))
             raise
 
-        nfc_tag = serializer.validated_data['nfc_tag']
+        tag = serializer.validated_data['tag']
 
         # Update scan statistics
-        nfc_tag.last_scanned_at = timezone.now()
-        nfc_tag.scan_count += 1
-        nfc_tag.save(update_fields=['last_scanned_at', 'scan_count'])
+        record_scan(tag.id)
 
         # Get medical profile
-        try:
-            profile = nfc_tag.user.medical_profile
-
-            if not profile.is_public:
-                self._log_access(
-                    nfc_tag=nfc_tag,
-                    access_type='SCAN',
-                    status='DENIED',
-                    request=request,
-                    error_message='Profile is private'
-                )
-                return Response(
-                    {'error': 'Пользователь отключил экстренный доступ'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-
-            # Serialize emergency profile data
-            profile_data = EmergencyProfileSerializer(profile).data
-
-            # Log successful access
+        if not tag.has_profile:
             self._log_access(
-                nfc_tag=nfc_tag,
+                nfc_tag_id=tag.id,
                 access_type='SCAN',
-                status='SUCCESS',
-                request=request
+                status='FAILED',
+                request=request,
+                error_message='Medical profile not found'
             )
-
-            # Create emergency access record
-            NFCEmergencyAccess.objects.create(
-                nfc_tag=nfc_tag,
-                medical_worker=request.user if request.user.is_authenticated else None,
-                ip_address=self._get_client_ip(request),
-                device_info=request.META.get('HTTP_USER_AGENT', ''),
-                latitude=serializer.validated_data.get('latitude'),
-                longitude=serializer.validated_data.get('longitude'),
-                data_accessed=profile_data
+            return Response(
+                {'error': 'Медицинский профиль не найден'},
+                status=status.HTTP_404_NOT_FOUND
             )
 
-            return Response({
-                'profile': profile_data,
-                'message': 'Успешный доступ к экстренным медицинским данным'
-            }, status=status.HTTP_200_OK)
-
-        except MedicalProfile.DoesNotExist:
+        if not tag.is_public:
             self._log_access(
-                nfc_tag=nfc_tag,
+                nfc_tag_id=tag.id,
                 access_type='SCAN',
-                status='FAILED',
+                status='DENIED',
                 request=request,
-                error_message='Medical profile not found'
+                error_message='Profile is private'
             )
             return Response(
-                {'error': 'Медицинский профиль не найден'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'Пользователь отключил экстренный доступ'},
+                status=status.HTTP_403_FORBIDDEN
             )
 
-    def _log_access(self, nfc_tag, access_type, status, request, error_message=''):
+        # Serialized emergency profile data (cached)
+        profile_data = get_emergency_profile_data(tag.profile_id)
+
+        # Log successful access
+        self._log_access(
+            nfc_tag_id=tag.id,
+            access_type='SCAN',
+            status='SUCCESS',
+            request=request
+        )
+
+        # Create emergency access record
+        log_emergency_access(
+            nfc_tag_id=tag.id,
+            medical_worker=request.user if request.user.is_authenticated else None,
+            ip_address=self._get_client_ip(request),
+            device_info=request.META.get('HTTP_USER_AGENT', ''),
+            latitude=serializer.validated_data.get('latitude'),
+            longitude=serializer.validated_data.get('longitude'),
+            data_accessed=profile_data
+        )
+
+        return Response({
+            'profile': profile_data,
+            'message': 'Успешный доступ к экстренным медицинским данным'
+        }, status=status.HTTP_200_OK)
+
+    def _log_access(self, nfc_tag_id, access_type, status, request, error_message=''):
         """Helper to log access"""
-        NFCAccessLog.objects.create(
-            nfc_tag=nfc_tag,
+        log_access(
+            nfc_tag_id=nfc_tag_id,
             accessed_by=request.user if request.user.is_authenticated else None,
             access_type=access_type,
             status=status,
@@ -199,7 +268,7 @@ class NFCTagScanView(APIView):
 
     def _log_failed_scan(self, request, error_message):
         """Log failed scan attempt"""
-        NFCAccessLog.objects.create(
+        log_access(
             nfc_tag=None,
             accessed_by=request.user if request.user.is_authenticated else None,
             access_type='SCAN',
@@ -211,12 +280,7 @@ class NFCTagScanView(APIView):
 
     def _get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip
+        return get_client_ip(request)
 
 
 class NFCTagRevokeView(APIView):
@@ -242,7 +306,7 @@ class NFCTagRevokeView(APIView):
         nfc_tag.revoke(reason=reason)
 
         # Log revocation
-        NFCAccessLog.objects.create(
+        log_access(
             nfc_tag=nfc_tag,
             accessed_by=request.user,
             access_type='REVOKE',
@@ -258,107 +322,187 @@ class NFCTagRevokeView(APIView):
 
     def _get_client_ip(self, request):
         """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip
+        return get_client_ip(request)
+
 
+class NFCTagReissueView(APIView):
+    """Issue a new public key id and scan token for an own tag, e.g. after key rotation"""
 
-class NFCAccessLogListView(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = NFCTagReissueSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        nfc_tag = get_object_or_404(NFCTag, id=serializer.validated_data['tag_id'], user=request.user)
+
+        if not nfc_tag.is_active:
+            return Response(
+                {'error': 'Метка отозвана'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        nfc_tag.reissue_key()
+
+        log_access(
+            nfc_tag=nfc_tag,
+            accessed_by=request.user,
+            access_type='REISSUE',
+            status='SUCCESS',
+            ip_address=self._get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+
+        return Response({
+            'tag': NFCTagSerializer(nfc_tag).data,
+            'nfc_data': {
+                'tag_id': str(nfc_tag.id),
+                'public_key_id': nfc_tag.public_key_id,
+                'checksum': nfc_tag.checksum,
+                'token': issue_scan_token(nfc_tag.id, nfc_tag.public_key_id)
+            },
+            'message': 'Ключ NFC метки перевыпущен, перезапишите метку'
+        }, status=status.HTTP_200_OK)
+
+    def _get_client_ip(self, request):
+        """Get client IP address"""
+        return get_client_ip(request)
+
+
+class NFCAccessLogListView(ReplicaReadMixin, QueryHintsMixin, generics.ListAPIView):
     """List access logs for user's NFC tags"""
 
     serializer_class = NFCAccessLogSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = None  # Disable pagination for personal data
+    pagination_class = KeysetPagination
+    keyset_ordering_field = 'accessed_at'
 
     def get_queryset(self):
         user = self.request.user
 
         if user.is_admin:
             # Admins can see all logs
-            return NFCAccessLog.objects.all().order_by('-accessed_at')
+            return NFCAccessLog.objects.all()
         else:
             # Users can see logs for their tags
-            return NFCAccessLog.objects.filter(nfc_tag__user=user).order_by('-accessed_at')
+            return NFCAccessLog.objects.filter(nfc_tag__user=user)
 
 
-class NFCEmergencyAccessListView(generics.ListAPIView):
+class NFCEmergencyAccessListView(ReplicaReadMixin, QueryHintsMixin, generics.ListAPIView):
     """List emergency accesses for user's NFC tags"""
 
     serializer_class = NFCEmergencyAccessSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = None  # Disable pagination for personal data
+    pagination_class = KeysetPagination
+    keyset_ordering_field = 'accessed_at'
 
     def get_queryset(self):
         user = self.request.user
 
         if user.is_admin:
             # Admins can see all emergency accesses
-            return NFCEmergencyAccess.objects.all().order_by('-accessed_at')
+            return NFCEmergencyAccess.objects.all()
         else:
             # Users can see emergency accesses for their tags
-            return NFCEmergencyAccess.objects.filter(nfc_tag__user=user).order_by('-accessed_at')
+            return NFCEmergencyAccess.objects.filter(nfc_tag__user=user)
+
+
+class NFCAccessLogExportView(ExportMixin, NFCAccessLogListView):
+    """Export NFC access logs as CSV or XLSX"""
+
+    export_name = 'nfc_access_logs'
+    export_ordering_field = 'accessed_at'
+    export_columns = (
+        ('accessed_at', 'accessed_at'),
+        ('tag_uid', 'nfc_tag__tag_uid'),
+        ('accessed_by', 'accessed_by__email'),
+        ('access_type', 'access_type'),
+        ('status', 'status'),
+        ('ip_address', 'ip_address'),
+        ('user_agent', 'user_agent'),
+        ('device_info', 'device_info'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('error_message', 'error_message'),
+    )
+
+
+class NFCEmergencyAccessExportView(ExportMixin, NFCEmergencyAccessListView):
+    """Export emergency accesses as CSV or XLSX; medical data is referenced by snapshot hash only"""
+
+    export_name = 'nfc_emergency_accesses'
+    export_ordering_field = 'accessed_at'
+    export_columns = (
+        ('accessed_at', 'accessed_at'),
+        ('tag_uid', 'nfc_tag__tag_uid'),
+        ('patient', 'nfc_tag__user__email'),
+        ('medical_worker', 'medical_worker__email'),
+        ('ip_address', 'ip_address'),
+        ('device_info', 'device_info'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('snapshot', 'snapshot_id'),
+        ('access_notes', 'access_notes'),
+    )
 
 
 class NFCEmergencyDataView(APIView):
     """Get emergency medical data by NFC tag UID (for QR code access)"""
 
     permission_classes = [permissions.AllowAny]
+    throttle_classes = EMERGENCY_THROTTLES
 
     def get(self, request, tag_uid):
         """Get emergency data by tag UID"""
-        nfc_tag = get_object_or_404(NFCTag, tag_uid=tag_uid)
-
-        if not nfc_tag.is_active:
-            self._log_access(nfc_tag, "SCAN", "DENIED", request, "Tag is not active")
+        tag = resolve_tag(tag_uid)
+        if tag is None:
+            TagEnumerationThrottle.record_miss(request)
+            record_failed_scan(request, tag_uid)
+            raise Http404
+
+        if not tag.is_active:
+            self._log_access(tag.id, "SCAN", "DENIED", request, "Tag is not active")
             return Response({"error": "NFC tag inactive"}, status=status.HTTP_403_FORBIDDEN)
 
-        nfc_tag.last_scanned_at = timezone.now()
-        nfc_tag.scan_count += 1
-        nfc_tag.save(update_fields=["last_scanned_at", "scan_count"])
-
-        try:
-            profile = nfc_tag.user.medical_profile
-            if not profile.is_public:
-                self._log_access(nfc_tag, "SCAN", "DENIED", request, "Profile is private")
-                return Response({"error": "Access denied"}, status=status.HTTP_403_FORBIDDEN)
-
-            user = nfc_tag.user
-            profile_data = EmergencyProfileSerializer(profile).data
-
-            self._log_access(nfc_tag, "SCAN", "SUCCESS", request)
-            NFCEmergencyAccess.objects.create(
-                nfc_tag=nfc_tag,
-                medical_worker=request.user if request.user.is_authenticated else None,
-                ip_address=self._get_client_ip(request),
-                device_info=request.META.get("HTTP_USER_AGENT", ""),
-                data_accessed=profile_data
-            )
+        record_scan(tag.id)
 
-            return Response({
-                "user": {"full_name": user.get_full_name(), "first_name": user.first_name, "last_name": user.last_name},
-                "profile": profile_data,
-                "tag": {"name": "Tag " + nfc_tag.tag_uid[:8], "uid": str(nfc_tag.tag_uid)},
-                "allergies": profile_data.get("allergies", []),
-                "diseases": profile_data.get("chronic_diseases", []),
-                "medications": profile_data.get("medications", []),
-                "emergency_contacts": profile_data.get("emergency_contacts", []),
-            }, status=status.HTTP_200_OK)
-
-        except MedicalProfile.DoesNotExist:
-            self._log_access(nfc_tag, "SCAN", "FAILED", request, "Medical profile not found")
+        if not tag.has_profile:
+            self._log_access(tag.id, "SCAN", "FAILED", request, "Medical profile not found")
             return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    def _log_access(self, nfc_tag, access_type, log_status, request, error_message=""):
-        NFCAccessLog.objects.create(
-            nfc_tag=nfc_tag, accessed_by=request.user if request.user.is_authenticated else None,
+        if not tag.is_public:
+            self._log_access(tag.id, "SCAN", "DENIED", request, "Profile is private")
+            return Response({"error": "Access denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        profile_data = get_emergency_profile_data(tag.profile_id)
+
+        self._log_access(tag.id, "SCAN", "SUCCESS", request)
+        log_emergency_access(
+            nfc_tag_id=tag.id,
+            medical_worker=request.user if request.user.is_authenticated else None,
+            ip_address=self._get_client_ip(request),
+            device_info=request.META.get("HTTP_USER_AGENT", ""),
+            data_accessed=profile_data
+        )
+
+        return Response({
+            "user": {"full_name": tag.get_user_full_name(), "first_name": tag.user_first_name, "last_name": tag.user_last_name},
+            "profile": profile_data,
+            "tag": {"name": "Tag " + tag.tag_uid[:8], "uid": str(tag.tag_uid)},
+            "allergies": profile_data.get("allergies", []),
+            "diseases": profile_data.get("chronic_diseases", []),
+            "medications": profile_data.get("medications", []),
+            "emergency_contacts": profile_data.get("emergency_contacts", []),
+        }, status=status.HTTP_200_OK)
+
+    def _log_access(self, nfc_tag_id, access_type, log_status, request, error_message=""):
+        log_access(
+            nfc_tag_id=nfc_tag_id, accessed_by=request.user if request.user.is_authenticated else None,
             access_type=access_type, status=log_status, ip_address=self._get_client_ip(request),
             user_agent=request.META.get("HTTP_USER_AGENT", ""), error_message=error_message
         )
 
     def _get_client_ip(self, request):
-        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-        return x_forwarded_for.split(",")[0] if x_forwarded_for else request.META.get("REMOTE_ADDR", "127.0.0.1")
+        """Get client IP address"""
+        return get_client_ip(request)
 
@@ -2,13 +2,15 @@
 Admin configuration for profiles app
 """
 from django.contrib import admin
+from apps.core.replicas import ReplicaChangeListMixin
 from .models import (
     MedicalProfile,
     Allergy,
     ChronicDisease,
     Medication,
     EmergencyContact,
-    DoctorNote
+    DoctorNote,
+    EmergencyCard
 )
 
 
@@ -38,7 +40,7 @@ class DoctorNoteInline(admin.StackedInline):
 
 
 @admin.register(MedicalProfile)
-class MedicalProfileAdmin(admin.ModelAdmin):
+class MedicalProfileAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'blood_type', 'is_public', 'updated_at')
     list_filter = ('blood_type', 'is_public', 'created_at')
     search_fields = ('user__email', 'user__first_name', 'user__last_name')
@@ -69,36 +71,44 @@ class MedicalProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(Allergy)
-class AllergyAdmin(admin.ModelAdmin):
+class AllergyAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('allergen', 'profile', 'severity', 'diagnosed_date')
     list_filter = ('severity', 'diagnosed_date')
     search_fields = ('allergen', 'profile__user__email')
 
 
 @admin.register(ChronicDisease)
-class ChronicDiseaseAdmin(admin.ModelAdmin):
+class ChronicDiseaseAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('disease_name', 'profile', 'icd_code', 'is_active', 'diagnosis_date')
     list_filter = ('is_active', 'diagnosis_date')
     search_fields = ('disease_name', 'icd_code', 'profile__user__email')
 
 
 @admin.register(Medication)
-class MedicationAdmin(admin.ModelAdmin):
+class MedicationAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('medication_name', 'profile', 'dosage', 'frequency', 'is_active')
     list_filter = ('frequency', 'is_active', 'start_date')
     search_fields = ('medication_name', 'profile__user__email')
 
 
 @admin.register(EmergencyContact)
-class EmergencyContactAdmin(admin.ModelAdmin):
+class EmergencyContactAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('full_name', 'profile', 'relationship', 'phone', 'priority')
     list_filter = ('relationship', 'priority')
     search_fields = ('full_name', 'phone', 'profile__user__email')
 
 
 @admin.register(DoctorNote)
-class DoctorNoteAdmin(admin.ModelAdmin):
+class DoctorNoteAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('profile', 'doctor', 'is_emergency_visible', 'created_at')
     list_filter = ('is_emergency_visible', 'created_at')
     search_fields = ('profile__user__email', 'doctor__email', 'note')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(EmergencyCard)
+class EmergencyCardAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('profile', 'schema_version', 'is_stale', 'built_at')
+    list_filter = ('is_stale', 'schema_version')
+    search_fields = ('profile__user__email',)
+    readonly_fields = ('profile', 'payload', 'schema_version', 'is_stale', 'built_at')
@@ -0,0 +1,84 @@
+"""
+Emergency profile payload cache for NFC Medical Platform
+"""
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.metrics import record_cache_lookup
+from .cards import CARD_SCHEMA_VERSION, get_card_payload
+
+logger = logging.getLogger(__name__)
+
+
+def _version_key(profile_id):
+    return f'emergency_profile:version:{profile_id}'
+
+
+def _payload_key(profile_id, version):
+    return f'emergency_profile:v{CARD_SCHEMA_VERSION}:{profile_id}:{version}'
+
+
+def _initial_version():
+    # Time-based so an evicted counter never points back at a stale payload
+    return int(time.time() * 1000)
+
+
+def _get_version(profile_id):
+    return cache.get_or_set(_version_key(profile_id), _initial_version, timeout=None)
+
+
+def get_emergency_profile_data(profile_id):
+    """Get the emergency card payload, reading the stored card and caching it on miss"""
+    timeout = settings.EMERGENCY_PROFILE_CACHE_TIMEOUT
+
+    try:
+        version = _get_version(profile_id)
+        data = cache.get(_payload_key(profile_id, version))
+        if data is not None:
+            record_cache_lookup('emergency_profile', 'shared')
+            return data
+    except Exception as e:
+        # Never fail an emergency scan because the cache is unavailable
+        logger.warning('Emergency profile cache read failed: %s', e)
+        version = None
+
+    record_cache_lookup('emergency_profile', 'miss')
+    data = get_card_payload(profile_id)
+
+    if version is not None:
+        try:
+            cache.set(_payload_key(profile_id, version), data, timeout=timeout)
+        except Exception as e:
+            logger.warning('Emergency profile cache write failed: %s', e)
+
+    return data
+
+
+async def aget_emergency_profile_data(profile_id):
+    """get_emergency_profile_data() for async views; only a cache miss runs in a thread"""
+    try:
+        version = await cache.aget(_version_key(profile_id))
+        if version is not None:
+            data = await cache.aget(_payload_key(profile_id, version))
+            if data is not None:
+                record_cache_lookup('emergency_profile', 'shared')
+                return data
+    except Exception as e:
+        logger.warning('Emergency profile cache read failed: %s', e)
+
+    return await sync_to_async(get_emergency_profile_data)(profile_id)
+
+
+def invalidate_emergency_profile(profile_id):
+    """Invalidate cached emergency payload by bumping the profile version"""
+    try:
+        cache.incr(_version_key(profile_id))
+    except ValueError:
+        # Counter was never set or has been evicted
+        cache.set(_version_key(profile_id), _initial_version(), timeout=None)
+    except Exception as e:
+        logger.warning('Emergency profile cache invalidation failed: %s', e)
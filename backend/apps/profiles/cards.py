@@ -0,0 +1,157 @@
+"""
+Materialized emergency cards for NFC Medical Platform
+
+An EmergencyCard row holds the EmergencyProfileSerializer output of one
+profile as plain JSON. A change to a nested record rebuilds only its
+section of the card; profile and user changes rebuild the whole card.
+Scans read the row and run serializers only when a card is missing,
+stale or built for an older schema.
+"""
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import (
+    MedicalProfile,
+    Allergy,
+    ChronicDisease,
+    Medication,
+    EmergencyContact,
+    DoctorNote,
+    EmergencyCard
+)
+from .serializers import (
+    EmergencyProfileSerializer,
+    AllergySerializer,
+    ChronicDiseaseSerializer,
+    MedicationSerializer,
+    EmergencyContactSerializer,
+    DoctorNoteSerializer
+)
+
+# Bump when the shape of EmergencyProfileSerializer output changes
+CARD_SCHEMA_VERSION = 2
+
+NOTES_SECTION = 'emergency_notes_visible'
+
+# Card section -> (source model, serializer)
+SECTION_SOURCES = {
+    'allergies': (Allergy, AllergySerializer),
+    'chronic_diseases': (ChronicDisease, ChronicDiseaseSerializer),
+    'medications': (Medication, MedicationSerializer),
+    'emergency_contacts': (EmergencyContact, EmergencyContactSerializer),
+}
+
+# Source model -> card section it feeds
+MODEL_SECTIONS = {model: section for section, (model, _) in SECTION_SOURCES.items()}
+MODEL_SECTIONS[DoctorNote] = NOTES_SECTION
+
+
+def load_emergency_profile(profile_id):
+    """Load a profile with everything EmergencyProfileSerializer reads"""
+    return MedicalProfile.objects.select_related('user').prefetch_related(
+        'allergies',
+        'chronic_diseases',
+        'medications',
+        'emergency_contacts',
+        Prefetch(
+            'doctor_notes',
+            queryset=DoctorNote.objects.filter(is_emergency_visible=True).select_related('doctor'),
+            to_attr='emergency_visible_notes'
+        ),
+    ).get(id=profile_id)
+
+
+def _plain(data):
+    # Same encoding as API responses: UUIDs, dates and decimals become strings
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def build_card_payload(profile_id):
+    """Fresh serialization of a profile's emergency data"""
+    return _plain(EmergencyProfileSerializer(load_emergency_profile(profile_id)).data)
+
+
+def build_section(profile_id, section):
+    """Fresh serialization of one card section"""
+    if section == NOTES_SECTION:
+        notes = DoctorNote.objects.filter(profile_id=profile_id, is_emergency_visible=True).select_related('doctor')
+        return _plain(DoctorNoteSerializer(notes, many=True).data)
+
+    model, serializer_class = SECTION_SOURCES[section]
+    return _plain(serializer_class(model.objects.filter(profile_id=profile_id), many=True).data)
+
+
+def rebuild_card(profile_id, sections=None):
+    """
+    Rebuild a profile's card and return its payload
+
+    Only the given sections are rebuilt when the stored card is otherwise
+    current. Returns None if the profile no longer exists.
+    """
+    with transaction.atomic():
+        card = EmergencyCard.objects.select_for_update().filter(profile_id=profile_id).first()
+        current = card is not None and not card.is_stale and card.schema_version == CARD_SCHEMA_VERSION
+
+        if sections and current:
+            for section in sections:
+                card.payload[section] = build_section(profile_id, section)
+        else:
+            try:
+                payload = build_card_payload(profile_id)
+            except MedicalProfile.DoesNotExist:
+                return None
+
+            if card is None:
+                try:
+                    with transaction.atomic():
+                        EmergencyCard.objects.create(
+                            profile_id=profile_id,
+                            payload=payload,
+                            schema_version=CARD_SCHEMA_VERSION
+                        )
+                except IntegrityError:
+                    # Built concurrently from the same committed data
+                    pass
+                return payload
+
+            card.payload = payload
+
+        card.schema_version = CARD_SCHEMA_VERSION
+        card.is_stale = False
+        card.save()
+
+    return card.payload
+
+
+def mark_card_stale(profile_id):
+    """Make readers rebuild the card until the next successful rebuild"""
+    mark_cards_stale([profile_id])
+
+
+def mark_cards_stale(profile_ids):
+    EmergencyCard.objects.filter(profile_id__in=profile_ids).update(is_stale=True)
+
+
+def get_card_payload(profile_id):
+    """Stored card payload, rebuilt first if missing or out of date"""
+    row = EmergencyCard.objects.filter(profile_id=profile_id).values_list(
+        'payload', 'is_stale', 'schema_version'
+    ).first()
+    if row is not None:
+        payload, is_stale, schema_version = row
+        if not is_stale and schema_version == CARD_SCHEMA_VERSION:
+            return payload
+
+    payload = rebuild_card(profile_id)
+    if payload is None:
+        raise MedicalProfile.DoesNotExist(f'Medical profile {profile_id} does not exist')
+    return payload
+
+
+def diff_card(expected, actual):
+    """Top-level keys whose values differ between two payloads"""
+    keys = set(expected) | set(actual)
+    return sorted(key for key in keys if expected.get(key) != actual.get(key))
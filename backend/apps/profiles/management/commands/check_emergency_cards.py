@@ -0,0 +1,70 @@
+"""
+Compare materialized emergency cards with a fresh serialization
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.profiles.cache import invalidate_emergency_profile
+from apps.profiles.cards import CARD_SCHEMA_VERSION, build_card_payload, diff_card, rebuild_card
+from apps.profiles.models import MedicalProfile, EmergencyCard
+
+
+class Command(BaseCommand):
+    help = 'Report emergency cards that are missing, stale or differ from their source data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            action='append',
+            dest='profiles',
+            help='Check only this profile id (may be repeated)'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rebuild every card that does not match'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Profiles loaded per query'
+        )
+
+    def handle(self, *args, **options):
+        profile_ids = MedicalProfile.objects.order_by('id').values_list('id', flat=True)
+        if options['profiles']:
+            profile_ids = profile_ids.filter(id__in=options['profiles'])
+
+        checked = 0
+        problems = 0
+        for profile_id in profile_ids.iterator(chunk_size=options['batch_size']):
+            checked += 1
+            problem = self._check(profile_id)
+            if problem is None:
+                continue
+
+            problems += 1
+            self.stdout.write(f'{profile_id}: {problem}')
+            if options['fix']:
+                rebuild_card(profile_id)
+                invalidate_emergency_profile(profile_id)
+
+        summary = f'Checked {checked} cards, {problems} out of date'
+        if problems and not options['fix']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary + (', rebuilt' if problems else '')))
+
+    def _check(self, profile_id):
+        """Description of what is wrong with a card, or None if it is current"""
+        card = EmergencyCard.objects.filter(profile_id=profile_id).first()
+        if card is None:
+            return 'missing'
+        if card.schema_version != CARD_SCHEMA_VERSION:
+            return f'schema version {card.schema_version}, expected {CARD_SCHEMA_VERSION}'
+        if card.is_stale:
+            return 'marked stale'
+
+        differences = diff_card(build_card_payload(profile_id), card.payload)
+        if differences:
+            return f'differs in {", ".join(differences)}'
+        return None
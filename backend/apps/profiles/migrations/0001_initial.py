@@ -0,0 +1,137 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:53
+# Schema of the profiles app before emergency cards; installs created with
+# makemigrations on the server already record this migration as applied
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicalProfile',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('blood_type', models.CharField(blank=True, choices=[('I+', 'I(0) Rh+'), ('I-', 'I(0) Rh-'), ('II+', 'II(A) Rh+'), ('II-', 'II(A) Rh-'), ('III+', 'III(B) Rh+'), ('III-', 'III(B) Rh-'), ('IV+', 'IV(AB) Rh+'), ('IV-', 'IV(AB) Rh-')], max_length=4, verbose_name='Группа крови')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='Рост (см)')),
+                ('weight', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Вес (кг)')),
+                ('emergency_notes', models.TextField(blank=True, verbose_name='Экстренные заметки')),
+                ('is_public', models.BooleanField(default=True, verbose_name='Разрешить экстренный доступ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлен')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='medical_profile', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Медицинский профиль',
+                'verbose_name_plural': 'Медицинские профили',
+                'db_table': 'medical_profiles',
+            },
+        ),
+        migrations.CreateModel(
+            name='Medication',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('medication_name', models.CharField(max_length=255, verbose_name='Название препарата')),
+                ('dosage', models.CharField(max_length=100, verbose_name='Дозировка')),
+                ('frequency', models.CharField(choices=[('ONCE_DAILY', '1 раз в день'), ('TWICE_DAILY', '2 раза в день'), ('THREE_TIMES_DAILY', '3 раза в день'), ('FOUR_TIMES_DAILY', '4 раза в день'), ('AS_NEEDED', 'По необходимости'), ('WEEKLY', 'Еженедельно'), ('MONTHLY', 'Ежемесячно')], max_length=20, verbose_name='Частота приема')),
+                ('start_date', models.DateField(verbose_name='Дата начала приема')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='Дата окончания приема')),
+                ('prescribing_doctor', models.CharField(blank=True, max_length=255, verbose_name='Назначивший врач')),
+                ('notes', models.TextField(blank=True, verbose_name='Примечания')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активно')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medications', to='profiles.medicalprofile', verbose_name='Профиль')),
+            ],
+            options={
+                'verbose_name': 'Медикамент',
+                'verbose_name_plural': 'Медикаменты',
+                'db_table': 'medications',
+            },
+        ),
+        migrations.CreateModel(
+            name='EmergencyContact',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('full_name', models.CharField(max_length=255, verbose_name='ФИО')),
+                ('relationship', models.CharField(choices=[('SPOUSE', 'Супруг/Супруга'), ('PARENT', 'Родитель'), ('CHILD', 'Ребенок'), ('SIBLING', 'Брат/Сестра'), ('FRIEND', 'Друг'), ('OTHER', 'Другое')], max_length=20, verbose_name='Отношение')),
+                ('phone', models.CharField(max_length=20, verbose_name='Телефон')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='Email')),
+                ('priority', models.PositiveSmallIntegerField(default=1, verbose_name='Приоритет')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлен')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emergency_contacts', to='profiles.medicalprofile', verbose_name='Профиль')),
+            ],
+            options={
+                'verbose_name': 'Экстренный контакт',
+                'verbose_name_plural': 'Экстренные контакты',
+                'db_table': 'emergency_contacts',
+                'ordering': ['priority'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DoctorNote',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('note', models.TextField(verbose_name='Заметка')),
+                ('is_emergency_visible', models.BooleanField(default=False, verbose_name='Видимо при экстренном доступе')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('doctor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_notes', to=settings.AUTH_USER_MODEL, verbose_name='Врач')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='doctor_notes', to='profiles.medicalprofile', verbose_name='Профиль')),
+            ],
+            options={
+                'verbose_name': 'Заметка врача',
+                'verbose_name_plural': 'Заметки врачей',
+                'db_table': 'doctor_notes',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChronicDisease',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('disease_name', models.CharField(max_length=255, verbose_name='Название заболевания')),
+                ('icd_code', models.CharField(blank=True, max_length=10, verbose_name='Код МКБ-10')),
+                ('diagnosis_date', models.DateField(blank=True, null=True, verbose_name='Дата диагностирования')),
+                ('notes', models.TextField(blank=True, verbose_name='Примечания')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активно')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chronic_diseases', to='profiles.medicalprofile', verbose_name='Профиль')),
+            ],
+            options={
+                'verbose_name': 'Хроническое заболевание',
+                'verbose_name_plural': 'Хронические заболевания',
+                'db_table': 'chronic_diseases',
+            },
+        ),
+        migrations.CreateModel(
+            name='Allergy',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('allergen', models.CharField(max_length=255, verbose_name='Аллерген')),
+                ('severity', models.CharField(choices=[('MILD', 'Легкая'), ('MODERATE', 'Средняя'), ('SEVERE', 'Тяжелая'), ('LIFE_THREATENING', 'Опасная для жизни')], default='MODERATE', max_length=20, verbose_name='Тяжесть')),
+                ('reaction', models.TextField(blank=True, verbose_name='Реакция')),
+                ('notes', models.TextField(blank=True, verbose_name='Примечания')),
+                ('diagnosed_date', models.DateField(blank=True, null=True, verbose_name='Дата диагностирования')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allergies', to='profiles.medicalprofile', verbose_name='Профиль')),
+            ],
+            options={
+                'verbose_name': 'Аллергия',
+                'verbose_name_plural': 'Аллергии',
+                'db_table': 'allergies',
+            },
+        ),
+    ]
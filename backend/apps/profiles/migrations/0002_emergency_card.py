@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmergencyCard',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='emergency_card', serialize=False, to='profiles.medicalprofile', verbose_name='Профиль')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные карты')),
+                ('schema_version', models.PositiveSmallIntegerField(default=0, verbose_name='Версия схемы')),
+                ('is_stale', models.BooleanField(default=False, verbose_name='Требует пересборки')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='Собрана')),
+            ],
+            options={
+                'verbose_name': 'Экстренная карта',
+                'verbose_name_plural': 'Экстренные карты',
+                'db_table': 'emergency_cards',
+            },
+        ),
+    ]
@@ -257,3 +257,30 @@ class DoctorNote(models.Model):
 
     def __str__(self):
         return f"Заметка от {self.doctor.get_full_name() if self.doctor else 'Unknown'}"
+
+
+class EmergencyCard(models.Model):
+    """Materialized emergency payload of a profile, served by the NFC scan endpoints"""
+
+    profile = models.OneToOneField(
+        MedicalProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='emergency_card',
+        verbose_name='Профиль'
+    )
+
+    # EmergencyProfileSerializer output as plain JSON
+    payload = models.JSONField(default=dict, verbose_name='Данные карты')
+    schema_version = models.PositiveSmallIntegerField(default=0, verbose_name='Версия схемы')
+    is_stale = models.BooleanField(default=False, verbose_name='Требует пересборки')
+
+    built_at = models.DateTimeField(auto_now=True, verbose_name='Собрана')
+
+    class Meta:
+        db_table = 'emergency_cards'
+        verbose_name = 'Экстренная карта'
+        verbose_name_plural = 'Экстренные карты'
+
+    def __str__(self):
+        return f"Экстренная карта {self.profile_id}"
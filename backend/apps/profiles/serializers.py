@@ -2,6 +2,7 @@
 Serializers for profiles app
 """
 from rest_framework import serializers
+from apps.core.mixins import SparseFieldsetMixin
 from .models import (
     MedicalProfile,
     Allergy,
@@ -73,10 +74,11 @@ class DoctorNoteSerializer(serializers.ModelSerializer):
             'is_emergency_visible', 'created_at', 'updated_at'
         )
         read_only_fields = ('id', 'doctor', 'doctor_name', 'created_at', 'updated_at')
+        select_related = ('doctor',)
 
 
-class MedicalProfileSerializer(serializers.ModelSerializer):
-    """Medical profile serializer (full)"""
+class MedicalProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Medical profile serializer (full, or a sparse fieldset via fields=[...])"""
 
     allergies = AllergySerializer(many=True, read_only=True)
     chronic_diseases = ChronicDiseaseSerializer(many=True, read_only=True)
@@ -118,7 +120,9 @@ class EmergencyProfileSerializer(serializers.ModelSerializer):
 
     def get_emergency_notes_visible(self, obj):
         """Get only emergency-visible doctor notes"""
-        notes = obj.doctor_notes.filter(is_emergency_visible=True)
+        notes = getattr(obj, 'emergency_visible_notes', None)
+        if notes is None:
+            notes = obj.doctor_notes.filter(is_emergency_visible=True)
         return DoctorNoteSerializer(notes, many=True).data
 
 
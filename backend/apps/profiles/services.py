@@ -0,0 +1,81 @@
+"""
+Medical profile loading for the owner's profile endpoint
+
+MedicalProfileSerializer embeds five collections; loading the profile
+through load_medical_profile() fetches each requested collection in one
+query (doctor notes together with their doctor) instead of one query per
+collection plus one per note.
+"""
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework import serializers
+
+from .models import MedicalProfile, DoctorNote
+
+# Nested collections of MedicalProfileSerializer
+PROFILE_SECTIONS = (
+    'allergies',
+    'chronic_diseases',
+    'medications',
+    'emergency_contacts',
+    'doctor_notes',
+)
+
+
+def section_prefetches(sections=PROFILE_SECTIONS):
+    """prefetch_related lookups for the given profile sections"""
+    lookups = []
+    for section in sections:
+        if section == 'doctor_notes':
+            lookups.append(Prefetch('doctor_notes', queryset=DoctorNote.objects.select_related('doctor')))
+        else:
+            lookups.append(section)
+    return lookups
+
+
+def load_medical_profile(user, sections=PROFILE_SECTIONS, using=None):
+    """Load a user's profile with the given sections prefetched; raises MedicalProfile.DoesNotExist"""
+    return MedicalProfile.objects.db_manager(using).select_related('user').prefetch_related(
+        *section_prefetches(sections)
+    ).get(user=user)
+
+
+def prefetch_sections(profile, sections=PROFILE_SECTIONS):
+    """Prefetch sections onto an already loaded profile (e.g. one just saved)"""
+    prefetch_related_objects([profile], *section_prefetches(sections))
+    return profile
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def parse_fieldset(query_params, serializer_class):
+    """
+    Read sparse fieldset parameters for a profile response
+
+    ?fields=id,blood_type,allergies keeps only the listed fields;
+    ?expand=allergies,medications keeps every plain field but only the
+    listed sections. Without either parameter the full profile is returned.
+    Returns (field names or None, sections to load).
+    """
+    available = serializer_class.Meta.fields
+    fields = None
+
+    if 'fields' in query_params:
+        fields = _split(query_params['fields'])
+    if 'expand' in query_params:
+        expand = _split(query_params['expand'])
+        unknown_sections = [name for name in expand if name not in PROFILE_SECTIONS]
+        if unknown_sections:
+            raise serializers.ValidationError({'expand': f'Неизвестные разделы: {", ".join(unknown_sections)}'})
+        base = fields if fields is not None else [name for name in available if name not in PROFILE_SECTIONS]
+        fields = [name for name in base if name not in PROFILE_SECTIONS] + expand
+
+    if fields is None:
+        return None, PROFILE_SECTIONS
+
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise serializers.ValidationError({'fields': f'Неизвестные поля: {", ".join(unknown)}'})
+
+    return fields, [name for name in PROFILE_SECTIONS if name in fields]
@@ -0,0 +1,100 @@
+"""
+Signals for profiles app
+
+Committed changes to a profile, its nested records or the users named on
+it rebuild the materialized emergency card and drop its cached payload.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_emergency_profile
+from .cards import MODEL_SECTIONS, NOTES_SECTION, mark_card_stale, mark_cards_stale, rebuild_card
+from .models import DoctorNote, MedicalProfile
+from .tasks import rebuild_emergency_card
+
+logger = logging.getLogger(__name__)
+
+
+def _queue_rebuild(profile_id, sections=None):
+    try:
+        rebuild_emergency_card.delay(str(profile_id), sections)
+    except Exception:
+        logger.exception('Could not queue emergency card rebuild for profile %s', profile_id)
+
+
+def refresh_emergency_card(profile_id, sections=None):
+    """Bring a card up to date, in place or through Celery"""
+    if settings.EMERGENCY_CARD_ASYNC_REBUILD:
+        # Readers rebuild stale cards themselves until the task has run
+        mark_card_stale(profile_id)
+        _queue_rebuild(profile_id, sections)
+    else:
+        try:
+            rebuild_card(profile_id, sections)
+        except Exception:
+            logger.exception('Emergency card rebuild failed for profile %s', profile_id)
+            mark_card_stale(profile_id)
+
+    invalidate_emergency_profile(profile_id)
+
+
+def _queue_note_cards(profile_ids):
+    """Rebuild many cards through Celery, whatever EMERGENCY_CARD_ASYNC_REBUILD says"""
+    # One UPDATE for all of them; readers rebuild stale cards themselves until the tasks have run
+    mark_cards_stale(profile_ids)
+    for profile_id in profile_ids:
+        _queue_rebuild(profile_id, [NOTES_SECTION])
+        invalidate_emergency_profile(profile_id)
+
+
+def _refresh_on_commit(profile_id, sections=None):
+    if profile_id:
+        transaction.on_commit(lambda: refresh_emergency_card(profile_id, sections))
+
+
+@receiver(post_save, sender=MedicalProfile)
+def refresh_profile_card(sender, instance, **kwargs):
+    """Rebuild the whole card when profile fields change"""
+    _refresh_on_commit(instance.id)
+
+
+@receiver(post_delete, sender=MedicalProfile)
+def invalidate_profile(sender, instance, **kwargs):
+    """The card is deleted with the profile; only the cached payload is left"""
+    profile_id = instance.id
+    transaction.on_commit(lambda: invalidate_emergency_profile(profile_id))
+
+
+def refresh_profile_child(sender, instance, **kwargs):
+    """Rebuild the card section fed by the changed nested record"""
+    _refresh_on_commit(instance.profile_id, [MODEL_SECTIONS[sender]])
+
+
+for model in MODEL_SECTIONS:
+    post_save.connect(refresh_profile_child, sender=model, dispatch_uid=f'emergency_card_{model.__name__}_save')
+    post_delete.connect(refresh_profile_child, sender=model, dispatch_uid=f'emergency_card_{model.__name__}_delete')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_profile_user(sender, instance, update_fields=None, **kwargs):
+    """Emergency cards carry the user's name, on their own card and on the notes they wrote"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+
+    profile_id = MedicalProfile.objects.filter(user_id=instance.id).values_list('id', flat=True).first()
+    _refresh_on_commit(profile_id)
+
+    # A doctor may have written for many patients; never rebuild those cards inside the request
+    note_profile_ids = list(
+        DoctorNote.objects.filter(doctor_id=instance.id, is_emergency_visible=True)
+        .exclude(profile_id=profile_id)
+        .order_by()
+        .values_list('profile_id', flat=True)
+        .distinct()
+    )
+    if note_profile_ids:
+        transaction.on_commit(lambda: _queue_note_cards(note_profile_ids))
@@ -0,0 +1,14 @@
+"""
+Celery tasks for profiles app
+"""
+from celery import shared_task
+
+from .cache import invalidate_emergency_profile
+from .cards import rebuild_card
+
+
+@shared_task(ignore_result=True)
+def rebuild_emergency_card(profile_id, sections=None):
+    """Rebuild a materialized emergency card and drop its cached payload"""
+    rebuild_card(profile_id, sections)
+    invalidate_emergency_profile(profile_id)
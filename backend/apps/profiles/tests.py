@@ -0,0 +1,107 @@
+"""
+Tests for the profile list endpoints and emergency card signals
+"""
+import datetime
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from apps.core.testing import LOCMEM_CACHES, ConstantQueriesMixin
+from .cards import NOTES_SECTION
+from .models import Allergy, ChronicDisease, DoctorNote, EmergencyContact, MedicalProfile, Medication
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, AUDIT_LOG_READS=False)
+class ListQueryCountTests(ConstantQueriesMixin, TestCase):
+    """Queries of the profile list endpoints do not grow with the number of rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='patient@example.com', password='pw', first_name='Иван', last_name='Петров'
+        )
+        cls.profile = MedicalProfile.objects.create(user=cls.user, blood_type='II+')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.created = 0
+
+    def add(self, model, **fields):
+        def add_rows(count):
+            for _ in range(count):
+                model.objects.create(profile=self.profile, **fields)
+        return add_rows
+
+    def test_allergies(self):
+        self.assertConstantQueries(
+            '/api/profiles/allergies/', self.add(Allergy, allergen='Пенициллин', severity='SEVERE')
+        )
+
+    def test_chronic_diseases(self):
+        self.assertConstantQueries(
+            '/api/profiles/chronic-diseases/', self.add(ChronicDisease, disease_name='Астма')
+        )
+
+    def test_medications(self):
+        self.assertConstantQueries('/api/profiles/medications/', self.add(
+            Medication, medication_name='Сальбутамол', dosage='100 мкг', frequency='по необходимости',
+            start_date=datetime.date(2024, 1, 1)
+        ))
+
+    def test_emergency_contacts(self):
+        self.assertConstantQueries('/api/profiles/emergency-contacts/', self.add(
+            EmergencyContact, full_name='Мария Петрова', relationship='SPOUSE', phone='+79990000000'
+        ))
+
+    def test_doctor_notes(self):
+        def add_rows(count):
+            for _ in range(count):
+                self.created += 1
+                doctor = User.objects.create_user(
+                    email=f'doctor{self.created}@example.com', password='pw',
+                    first_name='Олег', last_name='Сидоров', role='MEDICAL_WORKER'
+                )
+                DoctorNote.objects.create(
+                    profile=self.profile, doctor=doctor, note='Осмотр', is_emergency_visible=True
+                )
+        self.assertConstantQueries('/api/profiles/doctor-notes/', add_rows)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LOG_BUFFER_ENABLED=False, EMERGENCY_CARD_ASYNC_REBUILD=False)
+class DoctorRenameTests(TestCase):
+    """Cards showing a doctor's notes are rebuilt when the doctor is renamed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(
+            email='doctor@example.com', password='pw', first_name='Олег', last_name='Сидоров', role='MEDICAL_WORKER'
+        )
+        cls.profiles = []
+        for number, visible in enumerate((True, True, False)):
+            user = User.objects.create_user(
+                email=f'patient{number}@example.com', password='pw', first_name='Иван', last_name='Петров'
+            )
+            profile = MedicalProfile.objects.create(user=user, blood_type='II+')
+            DoctorNote.objects.create(profile=profile, doctor=cls.doctor, note='Осмотр', is_emergency_visible=visible)
+            cls.profiles.append(profile)
+
+    def test_rename_queues_note_cards(self):
+        self.doctor.last_name = 'Кузнецов'
+        with mock.patch('apps.profiles.signals.rebuild_emergency_card') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.doctor.save()
+
+        queued = {call.args[0] for call in task.delay.call_args_list}
+        self.assertEqual(queued, {str(profile.id) for profile in self.profiles[:2]})
+        for call in task.delay.call_args_list:
+            self.assertEqual(call.args[1], [NOTES_SECTION])
+
+    def test_last_login_queues_nothing(self):
+        with mock.patch('apps.profiles.signals.rebuild_emergency_card') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.doctor.save(update_fields=['last_login'])
+
+        task.delay.assert_not_called()
@@ -6,6 +6,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 
+from apps.core.mixins import QueryHintsMixin
+from apps.core.replicas import read_alias
+
 from .models import (
     MedicalProfile,
     Allergy,
@@ -23,6 +26,7 @@ from .serializers import (
     EmergencyContactSerializer,
     DoctorNoteSerializer
 )
+from .services import load_medical_profile, parse_fieldset, prefetch_sections
 
 
 class MedicalProfileView(APIView):
@@ -30,12 +34,23 @@ class MedicalProfileView(APIView):
 
     permission_classes = [permissions.IsAuthenticated]
 
+    def _get_fieldset(self, request):
+        """Sparse fieldset requested with ?fields= / ?expand="""
+        return parse_fieldset(request.query_params, MedicalProfileSerializer)
+
+    def _profile_data(self, request, fieldset, profile=None):
+        fields, sections = fieldset
+        if profile is None:
+            profile = load_medical_profile(request.user, sections, using=read_alias(request.user))
+        else:
+            prefetch_sections(profile, sections)
+        return MedicalProfileSerializer(profile, fields=fields).data
+
     def get(self, request):
         """Get current user's medical profile"""
+        fieldset = self._get_fieldset(request)
         try:
-            profile = request.user.medical_profile
-            serializer = MedicalProfileSerializer(profile)
-            return Response(serializer.data)
+            return Response(self._profile_data(request, fieldset))
         except MedicalProfile.DoesNotExist:
             return Response(
                 {'error': 'Профиль не найден'},
@@ -51,6 +66,7 @@ class MedicalProfileView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        fieldset = self._get_fieldset(request)
         serializer = MedicalProfileCreateSerializer(
             data=request.data,
             context={'request': request}
@@ -59,7 +75,7 @@ class MedicalProfileView(APIView):
         profile = serializer.save()
 
         return Response(
-            MedicalProfileSerializer(profile).data,
+            self._profile_data(request, fieldset, profile),
             status=status.HTTP_201_CREATED
         )
 
@@ -73,6 +89,7 @@ class MedicalProfileView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        fieldset = self._get_fieldset(request)
         serializer = MedicalProfileSerializer(
             profile,
             data=request.data,
@@ -81,7 +98,7 @@ class MedicalProfileView(APIView):
         serializer.is_valid(raise_exception=True)
         profile = serializer.save()
 
-        return Response(MedicalProfileSerializer(profile).data)
+        return Response(self._profile_data(request, fieldset, profile))
 
     def patch(self, request):
         """Update medical profile (partial update)"""
@@ -93,6 +110,7 @@ class MedicalProfileView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        fieldset = self._get_fieldset(request)
         serializer = MedicalProfileSerializer(
             profile,
             data=request.data,
@@ -101,11 +119,11 @@ class MedicalProfileView(APIView):
         serializer.is_valid(raise_exception=True)
         profile = serializer.save()
 
-        return Response(MedicalProfileSerializer(profile).data)
+        return Response(self._profile_data(request, fieldset, profile))
 
 
 # Allergy Views
-class AllergyListCreateView(generics.ListCreateAPIView):
+class AllergyListCreateView(QueryHintsMixin, generics.ListCreateAPIView):
     """List and create allergies"""
 
     serializer_class = AllergySerializer
@@ -131,7 +149,7 @@ class AllergyDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Chronic Disease Views
-class ChronicDiseaseListCreateView(generics.ListCreateAPIView):
+class ChronicDiseaseListCreateView(QueryHintsMixin, generics.ListCreateAPIView):
     """List and create chronic diseases"""
 
     serializer_class = ChronicDiseaseSerializer
@@ -157,7 +175,7 @@ class ChronicDiseaseDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Medication Views
-class MedicationListCreateView(generics.ListCreateAPIView):
+class MedicationListCreateView(QueryHintsMixin, generics.ListCreateAPIView):
     """List and create medications"""
 
     serializer_class = MedicationSerializer
@@ -183,7 +201,7 @@ class MedicationDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Emergency Contact Views
-class EmergencyContactListCreateView(generics.ListCreateAPIView):
+class EmergencyContactListCreateView(QueryHintsMixin, generics.ListCreateAPIView):
     """List and create emergency contacts"""
 
     serializer_class = EmergencyContactSerializer
@@ -209,7 +227,7 @@ class EmergencyContactDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Doctor Note Views
-class DoctorNoteListCreateView(generics.ListCreateAPIView):
+class DoctorNoteListCreateView(QueryHintsMixin, generics.ListCreateAPIView):
     """List and create doctor notes (medical workers only)"""
 
     serializer_class = DoctorNoteSerializer
@@ -237,7 +255,7 @@ class DoctorNoteListCreateView(generics.ListCreateAPIView):
         serializer.save(doctor=self.request.user)
 
 
-class DoctorNoteDetailView(generics.RetrieveUpdateDestroyAPIView):
+class DoctorNoteDetailView(QueryHintsMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, delete doctor note"""
 
     serializer_class = DoctorNoteSerializer
@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration for NFC Medical Platform
+
+Loaded automatically from the working directory; command-line flags in the
+Dockerfile and docker-compose.yml still take precedence.
+"""
+import glob
+import os
+
+
+def on_starting(server):
+    """Drop Prometheus files left over from a previous run"""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def worker_exit(server, worker):
+    """Write buffered log and audit rows and queued log records before the worker process goes away"""
+    from apps.core.buffer import close_all
+    from apps.core.log import close_queues
+    close_all()
+    close_queues()
+
+
+def child_exit(server, worker):
+    """Stop reporting gauges of a worker that has exited"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -107,8 +107,8 @@ class NFCService {
   Future<List<NFCAccessLog>> getAccessLogs() async {
     try {
       final response = await _api.get(ApiConfig.nfcAccessLogs);
-      if (response.statusCode == 200 && response.data is List) {
-        return (response.data as List)
+      if (response.statusCode == 200 && response.data is Map) {
+        return (response.data['results'] as List)
             .map((log) => NFCAccessLog.fromJson(log))
             .toList();
       }
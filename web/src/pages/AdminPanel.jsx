@@ -92,17 +92,19 @@ function AdminPanel() {
       // In real implementation, these would be separate admin endpoints
       const [logsRes] = await Promise.all([nfcAPI.getAccessLogs()])
 
-      setAccessLogs(logsRes.data)
+      // Access logs are cursor-paginated: the first page holds the newest entries
+      const logs = logsRes.data.results
+      setAccessLogs(logs)
 
       // Calculate stats from available data
       const today = new Date()
       today.setHours(0, 0, 0, 0)
-      const todayLogs = logsRes.data.filter((log) => new Date(log.accessed_at) >= today)
+      const todayLogs = logs.filter((log) => new Date(log.accessed_at) >= today)
 
       setStats({
         totalUsers: 0, // Would come from admin API
         totalTags: 0, // Would come from admin API
-        totalAccess: logsRes.data.length,
+        totalAccess: logs.length,
         activeToday: todayLogs.length,
       })
     } catch (error) {
@@ -72,7 +72,7 @@ function NFCManagement() {
       setLoading(true)
       const [tagsRes, logsRes] = await Promise.all([nfcAPI.getTags(), nfcAPI.getAccessLogs()])
       setTags(tagsRes.data)
-      setAccessLogs(logsRes.data)
+      setAccessLogs(logsRes.data.results)
     } catch (error) {
       toast.error('Ошибка загрузки данных')
       console.error(error)